@@ -0,0 +1,317 @@
+import duckdb
+import logging
+import pyarrow as pa
+import pyarrow.parquet as pq
+from datetime import date
+from typing import List, Tuple
+
+from report import COLUMNS, update_aggregates_from_batch
+from utils.aggregation import TweetAggregates
+from utils.result_cache import file_fingerprint
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+COMPACTED_PART_ID = 0
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS ingested_files (
+    part_id INTEGER,
+    file_path VARCHAR PRIMARY KEY,
+    file_size BIGINT,
+    modified_ns BIGINT,
+    footer_hash VARCHAR,
+    compacted BOOLEAN DEFAULT false
+);
+CREATE TABLE IF NOT EXISTS date_user_counts (
+    part_id INTEGER,
+    tweet_date DATE,
+    username VARCHAR,
+    tweet_count BIGINT
+);
+CREATE TABLE IF NOT EXISTS emoji_counts (
+    part_id INTEGER,
+    emoji VARCHAR,
+    emoji_count BIGINT
+);
+CREATE TABLE IF NOT EXISTS mention_counts (
+    part_id INTEGER,
+    username VARCHAR,
+    mention_count BIGINT
+);
+"""
+
+class AggregateStore:
+    """
+    Persistent, mergeable store of the q1, q2 and q3 aggregates of many tweet files.
+
+    Each ingested Parquet file is scanned once with the single-pass engine of
+    `report` and its partial aggregates (per-day-per-user, emoji and mention
+    counts) are appended to a DuckDB database, so new hourly files can be added
+    without recomputing the old ones and the top-10 questions are answered from
+    the accumulated state. `compact` merges all the partials into one, after
+    which the contributions of the compacted files can no longer be told apart:
+    a compacted file that changes cannot be ingested again, and the store has to
+    be rebuilt from the files instead.
+
+    Parameters
+    ----------
+    database_path : str
+        Path to the DuckDB database file holding the aggregates.
+    """
+
+    def __init__(self, database_path: str):
+        self.database_path = database_path
+        self.con = duckdb.connect(database=database_path)
+        self.con.execute(SCHEMA)
+
+    def __enter__(self) -> 'AggregateStore':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """
+        Closes the connection to the database.
+        """
+        self.con.close()
+
+    def ingest(self, file_path: str) -> bool:
+        """
+        Adds the partial aggregates of a Parquet file of tweets to the store.
+
+        Files already ingested with the same fingerprint are skipped; files that
+        changed since they were ingested have their partial aggregates replaced,
+        unless they were compacted, since their aggregates are then merged with
+        those of the other files and cannot be removed.
+
+        Parameters
+        ----------
+        file_path : str
+            Path to the Parquet file.
+
+        Returns
+        -------
+        bool
+            True if the file was ingested, False if it was already up to date.
+
+        Raises
+        ------
+        FileNotFoundError
+            If the specified file does not exist.
+        ValueError
+            If the file changed after its aggregates were compacted; the store
+            must then be rebuilt by ingesting the files into a new database.
+        """
+        path, file_size, modified_ns, footer_hash = file_fingerprint(file_path)
+        previous = self.con.execute(
+            "SELECT part_id, file_size, modified_ns, footer_hash, compacted FROM ingested_files WHERE file_path = ?",
+            [path]
+        ).fetchone()
+
+        if previous and previous[1:4] == (file_size, modified_ns, footer_hash):
+            logger.info(f"File already ingested: {file_path}")
+            return False
+        if previous and previous[4]:
+            raise ValueError(f"File changed after its aggregates were compacted: {file_path}")
+
+        logger.info(f"Ingesting file: {file_path}")
+        aggregates = TweetAggregates()
+        parquet_file = pq.ParquetFile(file_path)
+        for row_group in range(parquet_file.num_row_groups):
+            update_aggregates_from_batch(parquet_file.read_row_group(row_group, columns=COLUMNS), aggregates)
+
+        self.con.execute("BEGIN TRANSACTION")
+        try:
+            # A changed file keeps its row and part_id: DuckDB rejects deleting and
+            # inserting the same primary key within one transaction.
+            if previous:
+                part_id = previous[0]
+                self._delete_part(part_id)
+                self.con.execute(
+                    "UPDATE ingested_files SET file_size = ?, modified_ns = ?, footer_hash = ? WHERE file_path = ?",
+                    [file_size, modified_ns, footer_hash, path]
+                )
+            else:
+                part_id = self.con.execute(
+                    "SELECT COALESCE(MAX(part_id), ?) + 1 FROM ingested_files", [COMPACTED_PART_ID]
+                ).fetchone()[0]
+                self.con.execute(
+                    "INSERT INTO ingested_files VALUES (?, ?, ?, ?, ?, false)",
+                    [part_id, path, file_size, modified_ns, footer_hash]
+                )
+            self._insert_part(part_id, aggregates)
+            self.con.execute("COMMIT")
+        except Exception:
+            self.con.execute("ROLLBACK")
+            raise
+
+        return True
+
+    def compact(self) -> None:
+        """
+        Merges the partial aggregates of every ingested file into a single partial,
+        keeping the results of all the questions unchanged.
+
+        The compacted files are still skipped while they do not change, but a
+        compacted file that changes makes `ingest` raise ValueError.
+        """
+        logger.info("Compacting aggregate store")
+        self.con.execute("BEGIN TRANSACTION")
+        try:
+            self.con.execute(f"""
+            CREATE TEMP TABLE compacted_date_user_counts AS
+            SELECT {COMPACTED_PART_ID} AS part_id, tweet_date, username, SUM(tweet_count) AS tweet_count
+            FROM date_user_counts
+            GROUP BY tweet_date, username;
+
+            CREATE TEMP TABLE compacted_emoji_counts AS
+            SELECT {COMPACTED_PART_ID} AS part_id, emoji, SUM(emoji_count) AS emoji_count
+            FROM emoji_counts
+            GROUP BY emoji;
+
+            CREATE TEMP TABLE compacted_mention_counts AS
+            SELECT {COMPACTED_PART_ID} AS part_id, username, SUM(mention_count) AS mention_count
+            FROM mention_counts
+            GROUP BY username;
+            """)
+            for table in ('date_user_counts', 'emoji_counts', 'mention_counts'):
+                self.con.execute(f"DELETE FROM {table}")
+                self.con.execute(f"INSERT INTO {table} SELECT * FROM compacted_{table}")
+                self.con.execute(f"DROP TABLE compacted_{table}")
+            self.con.execute("UPDATE ingested_files SET compacted = true")
+            self.con.execute("COMMIT")
+        except Exception:
+            self.con.execute("ROLLBACK")
+            raise
+
+    def q1(self, n: int = 10) -> List[Tuple[date, str]]:
+        """
+        Returns the top dates with the most tweets and, for each date, the user with
+        the highest number of tweets, over all the ingested files.
+
+        Parameters
+        ----------
+        n : int, optional
+            Number of dates to return (default is 10).
+
+        Returns
+        -------
+        List[Tuple[date, str]]
+            A list of tuples containing:
+                - Date (date)
+                - Username (str) with the highest number of tweets on that date.
+        """
+        query = f"""
+        WITH DailyUsers AS (
+            SELECT tweet_date, username, SUM(tweet_count) AS tweet_count
+            FROM date_user_counts
+            GROUP BY tweet_date, username
+        ),
+        TopDates AS (
+            SELECT tweet_date, SUM(tweet_count) AS tweet_count
+            FROM DailyUsers
+            GROUP BY tweet_date
+            ORDER BY tweet_count DESC, tweet_date ASC
+            LIMIT {int(n)}
+        ),
+        RankedUsers AS (
+            SELECT
+                tweet_date,
+                username,
+                ROW_NUMBER() OVER (PARTITION BY tweet_date ORDER BY tweet_count DESC, username ASC) AS rn
+            FROM DailyUsers
+            WHERE tweet_date IN (SELECT tweet_date FROM TopDates)
+        )
+        SELECT TD.tweet_date, RU.username
+        FROM TopDates TD
+        JOIN RankedUsers RU ON TD.tweet_date = RU.tweet_date
+        WHERE RU.rn = 1
+        ORDER BY TD.tweet_count DESC, TD.tweet_date ASC;
+        """
+        return self.con.execute(query).fetchall()
+
+    def q2(self, n: int = 10) -> List[Tuple[str, int]]:
+        """
+        Returns the most used emojis and their counts over all the ingested files,
+        breaking ties by emoji ascending, so the result does not depend on the
+        order in which the files were ingested.
+
+        Parameters
+        ----------
+        n : int, optional
+            Number of emojis to return (default is 10).
+
+        Returns
+        -------
+        List[Tuple[str, int]]
+            A list of tuples containing:
+                - Emoji (str)
+                - Count (int)
+        """
+        query = f"""
+        SELECT emoji, SUM(emoji_count)::BIGINT AS emoji_count
+        FROM emoji_counts
+        GROUP BY emoji
+        ORDER BY emoji_count DESC, emoji ASC
+        LIMIT {int(n)};
+        """
+        return self.con.execute(query).fetchall()
+
+    def q3(self, n: int = 10) -> List[Tuple[str, int]]:
+        """
+        Returns the most mentioned users and their mention counts over all the
+        ingested files, breaking ties by username ascending.
+
+        Parameters
+        ----------
+        n : int, optional
+            Number of users to return (default is 10).
+
+        Returns
+        -------
+        List[Tuple[str, int]]
+            A list of tuples containing:
+                - Username (str)
+                - Number of mentions (int)
+        """
+        query = f"""
+        SELECT username, SUM(mention_count)::BIGINT AS mention_count
+        FROM mention_counts
+        GROUP BY username
+        ORDER BY mention_count DESC, username ASC
+        LIMIT {int(n)};
+        """
+        return self.con.execute(query).fetchall()
+
+    def _delete_part(self, part_id: int) -> None:
+        for table in ('date_user_counts', 'emoji_counts', 'mention_counts'):
+            self.con.execute(f"DELETE FROM {table} WHERE part_id = ?", [part_id])
+
+    def _insert_part(self, part_id: int, aggregates: TweetAggregates) -> None:
+        date_user_counts = pa.table({
+            'tweet_date': pa.array([key[0] for key in aggregates.date_user_counts], type=pa.date32()),
+            'username': pa.array([key[1] for key in aggregates.date_user_counts], type=pa.string()),
+            'tweet_count': pa.array(list(aggregates.date_user_counts.values()), type=pa.int64()),
+        })
+        emoji_counts = pa.table({
+            'emoji': pa.array(list(aggregates.emoji_counts), type=pa.string()),
+            'emoji_count': pa.array(list(aggregates.emoji_counts.values()), type=pa.int64()),
+        })
+        mention_counts = pa.table({
+            'username': pa.array(list(aggregates.mention_counts), type=pa.string()),
+            'mention_count': pa.array(list(aggregates.mention_counts.values()), type=pa.int64()),
+        })
+
+        parts = [
+            ('date_user_counts', date_user_counts, 'tweet_date, username, tweet_count'),
+            ('emoji_counts', emoji_counts, 'emoji, emoji_count'),
+            ('mention_counts', mention_counts, 'username, mention_count'),
+        ]
+        for table, partial, columns in parts:
+            self.con.register('partial', partial)
+            try:
+                self.con.execute(f"INSERT INTO {table} SELECT ?, {columns} FROM partial", [part_id])
+            finally:
+                self.con.unregister('partial')
@@ -1,5 +1,14 @@
-from fastapi import FastAPI, HTTPException
-from typing import List, Tuple
+import asyncio
+import functools
+import inspect
+import os
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from fastapi import Depends, FastAPI, HTTPException, Query
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from pydantic import BaseModel
+from typing import Any, Awaitable, Callable, Dict, List, Literal, Optional, Set, Tuple
 from datetime import date
 
 from q1_memory import q1_memory
@@ -8,65 +17,470 @@ from q2_memory import q2_memory
 from q2_time import q2_time
 from q3_memory import q3_memory
 from q3_time import q3_time
+from report import report
+from utils import instrumentation, worker_pool
+from utils.inputs import resolve_input
+from utils.jobs import Job, JobStore, JobStoreFullError, ProgressCallback, stream_events
+from utils.result_cache import ResultCache, file_fingerprint
+from utils.worker_pool import PoolSaturatedError
 
-app = FastAPI()
+Q2_SUBMIT_TIMEOUT = 30.0
+REQUEST_TIMEOUT = float(os.environ.get('API_REQUEST_TIMEOUT', 300))
+MAX_TOP_N = int(os.environ.get('API_MAX_TOP_N', 1000))
+QUERY_THREADS = int(os.environ.get('API_QUERY_THREADS', 8))
+JOB_TIMEOUT = float(os.environ.get('API_JOB_TIMEOUT', 3600))
+JOB_EVENT_INTERVAL = float(os.environ.get('API_JOB_EVENT_INTERVAL', 0.5))
+# Jobs run under their own limit rather than the per-endpoint ones, so long jobs
+# never take the slots of the synchronous endpoints.
+JOB_CONCURRENCY = int(os.environ.get('API_JOB_CONCURRENCY', 2))
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
 
-@app.get("/q1/time", response_model=List[Tuple[date, str]])
-async def get_q1_time(file_path: str):
+ENDPOINT_CONCURRENCY = {
+    endpoint: int(os.environ.get(f'API_CONCURRENCY_{endpoint.upper()}', default))
+    for endpoint, default in {
+        'q1_time': 2,
+        'q1_memory': 2,
+        'q2_time': 1,
+        'q2_memory': 2,
+        'q3_time': 2,
+        'q3_memory': 2,
+        'report': 1,
+    }.items()
+}
+
+PROCESS_ENDPOINTS = {'q2_memory', 'report'}
+
+# Names of the DuckDB resource profiles of `utils.resource_profiles.PROFILES`.
+ProfileName = Literal['latency', 'low-memory', 'batch']
+
+# Queries that can be submitted as background jobs.
+QueryName = Literal['q1_time', 'q1_memory', 'q2_time', 'q2_memory', 'q3_time', 'q3_memory', 'report']
+JOB_QUERIES = {
+    'q1_time': q1_time,
+    'q1_memory': q1_memory,
+    'q2_time': q2_time,
+    'q2_memory': q2_memory,
+    'q3_time': q3_time,
+    'q3_memory': q3_memory,
+    'report': report,
+}
+
+query_executor = ThreadPoolExecutor(max_workers=QUERY_THREADS, thread_name_prefix='query')
+endpoint_limits = {endpoint: asyncio.Semaphore(limit) for endpoint, limit in ENDPOINT_CONCURRENCY.items()}
+job_limit = asyncio.Semaphore(JOB_CONCURRENCY)
+result_cache = ResultCache(
+    max_entries=int(os.environ.get('RESULT_CACHE_SIZE', 256)),
+    disk_dir=os.environ.get('RESULT_CACHE_DIR') or None,
+)
+job_store = JobStore(
+    max_jobs=int(os.environ.get('API_MAX_JOBS', 1000)),
+    ttl=float(os.environ.get('API_JOB_TTL', 3600)),
+)
+job_tasks: Set[asyncio.Task] = set()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # The executor and the semaphores are recreated on every startup, so the app
+    # can be started again after a shutdown, e.g. by several test clients.
+    global query_executor, endpoint_limits, job_limit
+    query_executor = ThreadPoolExecutor(max_workers=QUERY_THREADS, thread_name_prefix='query')
+    endpoint_limits = {endpoint: asyncio.Semaphore(limit) for endpoint, limit in ENDPOINT_CONCURRENCY.items()}
+    job_limit = asyncio.Semaphore(JOB_CONCURRENCY)
+    worker_pool.start_pool()
+    yield
+    for task in list(job_tasks):
+        task.cancel()
+    query_executor.shutdown(wait=False, cancel_futures=True)
+    worker_pool.shutdown_pool()
+
+app = FastAPI(lifespan=lifespan)
+
+class Report(BaseModel):
+    q1: List[Tuple[date, str]]
+    q2: List[Tuple[str, int]]
+    q3: List[Tuple[str, int]]
+
+def run_in_worker_pool(function: Callable, *args) -> Any:
+    """
+    Runs a function in the shared worker pool and waits for its result.
+
+    The metrics of the instrumented calls made by the worker are added to the
+    registry of this process, so they are reported by `/metrics`.
+
+    Parameters
+    ----------
+    function : Callable
+        Picklable function to run in a worker process.
+    *args
+        Arguments for the function.
+
+    Returns
+    -------
+    Any
+        The result of the function.
+
+    Raises
+    ------
+    PoolSaturatedError
+        If the worker pool has no free slot within Q2_SUBMIT_TIMEOUT.
+    """
+    result, calls = worker_pool.submit(instrumentation.run_recorded, function, *args,
+                                       timeout=Q2_SUBMIT_TIMEOUT).result()
+    for metrics in calls:
+        instrumentation.registry.record(metrics)
+    return result
+
+async def run_query(
+    endpoint: str,
+    function: Callable,
+    *args,
+    timeout: float = REQUEST_TIMEOUT,
+    use_worker_pool: bool = True,
+    limit: Optional[asyncio.Semaphore] = None,
+    on_start: Optional[Callable[[], None]] = None
+) -> Any:
+    """
+    Runs a blocking query in the query thread pool without blocking the event loop.
+
+    At most ENDPOINT_CONCURRENCY[endpoint] queries of the same endpoint run at once,
+    unless another `limit` is given; the slot is only released when the query
+    really finishes, even if the request timed out before. Endpoints in PROCESS_ENDPOINTS run in the shared worker pool
+    unless `use_worker_pool` is False. Errors are translated to HTTP responses.
+
+    Parameters
+    ----------
+    endpoint : str
+        Name of the endpoint, used to select its concurrency limit.
+    function : Callable
+        Blocking function to run.
+    *args
+        Arguments for the function.
+    timeout : float, optional
+        Maximum number of seconds to wait for a slot and for the query together
+        (default is REQUEST_TIMEOUT).
+    use_worker_pool : bool, optional
+        Whether endpoints in PROCESS_ENDPOINTS run in the worker pool (default is
+        True). Jobs run in a thread, so their progress callback can be called.
+    limit : asyncio.Semaphore, optional
+        Semaphore to take instead of the endpoint's, such as `job_limit` for jobs
+        (default is `endpoint_limits[endpoint]`).
+    on_start : Callable[[], None], optional
+        Called once the slot is taken, right before the query starts (default is
+        no call).
+
+    Returns
+    -------
+    Any
+        The result of the function.
+
+    Raises
+    ------
+    HTTPException
+        404 if the file does not exist, 503 if the server is saturated, 504 if the
+        query does not finish within `timeout` and 500 for any other error.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    if limit is None:
+        limit = endpoint_limits[endpoint]
     try:
-        result = q1_time(file_path)
-        return result
+        await asyncio.wait_for(limit.acquire(), timeout)
+        if on_start is not None:
+            on_start()
+        if use_worker_pool and endpoint in PROCESS_ENDPOINTS:
+            function, args = run_in_worker_pool, (function, *args)
+        try:
+            future = query_executor.submit(function, *args)
+        except BaseException:
+            limit.release()
+            raise
+        future.add_done_callback(lambda _: loop.call_soon_threadsafe(limit.release))
+        return await asyncio.wait_for(asyncio.wrap_future(future), max(deadline - loop.time(), 0))
     except FileNotFoundError:
         raise HTTPException(status_code=404, detail="File not found")
+    except PoolSaturatedError:
+        raise HTTPException(status_code=503, detail="Server busy, retry later")
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Query timed out")
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.get("/q1/memory", response_model=List[Tuple[date, str]])
-async def get_q1_memory(file_path: str):
+def cache_key(endpoint: str, file_path: List[str], args: Tuple, options: Dict[str, Any]) -> Tuple[List[str], Tuple]:
+    """
+    Resolves the input of a query and builds its result cache key.
+
+    Globbing, statting the files and hashing their footers block, so this runs in
+    a thread rather than on the event loop.
+
+    Parameters
+    ----------
+    endpoint : str
+        Name of the endpoint.
+    file_path : List[str]
+        Paths, globs or directories of the Parquet files.
+    args : Tuple
+        Remaining positional arguments of the query.
+    options : Dict[str, Any]
+        Keyword arguments of the query.
+
+    Returns
+    -------
+    Tuple[List[str], Tuple]
+        The resolved file paths and the cache key.
+
+    Raises
+    ------
+    FileNotFoundError
+        If no file matches the input.
+    """
+    file_paths = resolve_input(file_path)
+    key = (endpoint, tuple(file_fingerprint(path) for path in file_paths), args,
+           tuple((name, tuple(value) if isinstance(value, list) else value)
+                 for name, value in sorted(options.items())))
+    return file_paths, key
+
+async def run_cached_query(
+    endpoint: str,
+    function: Callable,
+    file_path: List[str],
+    *args,
+    profile: Optional[str] = None,
+    options: Optional[Dict[str, Any]] = None,
+    progress: Optional[ProgressCallback] = None,
+    on_start: Optional[Callable[[], None]] = None
+) -> Any:
+    """
+    Runs a query through the result cache.
+
+    The input is resolved to its Parquet files first, so a glob or directory is
+    expanded once per request. Results are keyed on the endpoint, the fingerprints
+    of the files (path, size, modification time and Parquet footer hash) and the
+    remaining arguments and options, so a changed, added or removed file is always
+    recomputed. The input is resolved and fingerprinted in a thread, see
+    `cache_key`. Concurrent identical requests share a single computation, but
+    jobs never share theirs: a job joining a request would get no progress and
+    the request's timeout, and a request joining a job would wait beyond its own
+    timeout. Finished results are shared by both. The
+    resource profile only changes how a result is computed, so it is not part of
+    the key.
+
+    Parameters
+    ----------
+    endpoint : str
+        Name of the endpoint.
+    function : Callable
+        Blocking function to run, taking the file paths as first argument.
+    file_path : List[str]
+        Paths, globs or directories of the Parquet files.
+    *args
+        Remaining arguments for the function.
+    profile : str, optional
+        DuckDB resource profile passed to the function (default is the
+        function's own default).
+    options : Dict[str, Any], optional
+        Keyword arguments for the function, such as those of `query_options`.
+    progress : ProgressCallback, optional
+        Receives the progress of the query, if the function reports it. Set for
+        jobs, which run in a thread under `job_limit` and may take up to
+        JOB_TIMEOUT (default is a regular request).
+    on_start : Callable[[], None], optional
+        Called when the query gets its slot, see `run_query`; not called for
+        cached results (default is no call).
+
+    Returns
+    -------
+    Any
+        The cached or freshly computed result.
+
+    Raises
+    ------
+    HTTPException
+        404 if no file matches the input, or any error raised by `run_query`.
+    """
+    options = options or {}
     try:
-        result = q1_memory(file_path)
-        return result
+        file_paths, key = await asyncio.to_thread(cache_key, endpoint, file_path, args, options)
     except FileNotFoundError:
         raise HTTPException(status_code=404, detail="File not found")
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    if profile is not None:
+        options = {**options, 'profile': profile}
+    if progress is not None and 'progress' in inspect.signature(function).parameters:
+        options = {**options, 'progress': progress}
+    if options:
+        function = functools.partial(function, **options)
+    timeout = REQUEST_TIMEOUT if progress is None else JOB_TIMEOUT
+    return await result_cache.get_or_compute(key, lambda: run_query(
+        endpoint, function, file_paths, *args, timeout=timeout, use_worker_pool=progress is None,
+        limit=job_limit if progress is not None else None, on_start=on_start),
+        single_flight=progress is None)
+
+def query_options(
+    n: int = Query(10, ge=1, le=MAX_TOP_N),
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    username: Optional[List[str]] = Query(None)
+) -> Dict[str, Any]:
+    """
+    Collects the top-N and filter parameters shared by every query endpoint.
+
+    Parameters
+    ----------
+    n : int
+        Number of items to return.
+    start_date : date, optional
+        First day of the tweets considered.
+    end_date : date, optional
+        Last day of the tweets considered.
+    username : List[str], optional
+        Only consider the tweets of these users; repeat the parameter for several.
+
+    Returns
+    -------
+    Dict[str, Any]
+        Keyword arguments for the query functions.
+
+    Raises
+    ------
+    HTTPException
+        422 if `start_date` is after `end_date`.
+    """
+    if start_date is not None and end_date is not None and start_date > end_date:
+        raise HTTPException(status_code=422, detail="start_date must not be after end_date")
+    return {'n': n, 'start_date': start_date, 'end_date': end_date, 'usernames': username}
+
+@app.get("/health")
+async def get_health():
+    return {"status": "ok"}
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    return PlainTextResponse(instrumentation.registry.render_prometheus(), media_type=PROMETHEUS_CONTENT_TYPE)
+
+@app.get("/q1/time", response_model=List[Tuple[date, str]])
+async def get_q1_time(file_path: List[str] = Query(),
+                      profile: Optional[ProfileName] = None, options: Dict = Depends(query_options)):
+    return await run_cached_query('q1_time', q1_time, file_path, profile=profile, options=options)
+
+@app.get("/q1/memory", response_model=List[Tuple[date, str]])
+async def get_q1_memory(file_path: List[str] = Query(),
+                        profile: Optional[ProfileName] = None, options: Dict = Depends(query_options)):
+    return await run_cached_query('q1_memory', q1_memory, file_path, profile=profile, options=options)
 
 @app.get("/q2/time", response_model=List[Tuple[str, int]])
-async def get_q2_time(file_path: str):
-    try:
-        result = q2_time(file_path)
-        return result
-    except FileNotFoundError:
-        raise HTTPException(status_code=404, detail="File not found")
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+async def get_q2_time(file_path: List[str] = Query(),
+                      profile: Optional[ProfileName] = None, options: Dict = Depends(query_options)):
+    return await run_cached_query('q2_time', q2_time, file_path, Q2_SUBMIT_TIMEOUT, profile=profile, options=options)
 
 @app.get("/q2/memory", response_model=List[Tuple[str, int]])
-async def get_q2_memory(file_path: str, batch_size: int = 1000):
-    try:
-        result = q2_memory(file_path, batch_size=batch_size)
-        return result
-    except FileNotFoundError:
-        raise HTTPException(status_code=404, detail="File not found")
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+async def get_q2_memory(file_path: List[str] = Query(), batch_size: Optional[int] = Query(None, ge=1),
+                        profile: Optional[ProfileName] = None, options: Dict = Depends(query_options)):
+    return await run_cached_query('q2_memory', q2_memory, file_path, batch_size, profile=profile, options=options)
 
 @app.get("/q3/time", response_model=List[Tuple[str, int]])
-async def get_q3_time(file_path: str):
+async def get_q3_time(file_path: List[str] = Query(),
+                      profile: Optional[ProfileName] = None, options: Dict = Depends(query_options)):
+    return await run_cached_query('q3_time', q3_time, file_path, profile=profile, options=options)
+
+@app.get("/q3/memory", response_model=List[Tuple[str, int]])
+async def get_q3_memory(file_path: List[str] = Query(),
+                        profile: Optional[ProfileName] = None, options: Dict = Depends(query_options)):
+    return await run_cached_query('q3_memory', q3_memory, file_path, profile=profile, options=options)
+
+@app.get("/report", response_model=Report)
+async def get_report(file_path: List[str] = Query(), options: Dict = Depends(query_options)):
+    return await run_cached_query('report', report, file_path, options=options)
+
+async def run_job(job: Job, query: Awaitable) -> None:
+    """
+    Awaits the query of a job and stores its result or error in the job.
+
+    The job is marked as running by the query itself, once it gets its slot, see
+    `run_query`.
+
+    Parameters
+    ----------
+    job : Job
+        Job to update.
+    query : Awaitable
+        Coroutine computing the result, usually `run_cached_query`.
+    """
     try:
-        result = q3_time(file_path)
-        return result
-    except FileNotFoundError:
-        raise HTTPException(status_code=404, detail="File not found")
+        job.finish(await query)
+    except HTTPException as e:
+        job.fail(str(e.detail))
+    except asyncio.CancelledError:
+        job.fail("Server shutting down")
+        raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        job.fail(str(e))
 
-@app.get("/q3/memory", response_model=List[Tuple[str, int]])
-async def get_q3_memory(file_path: str):
+def get_job_or_404(job_id: str) -> Job:
+    """
+    Returns a job by its identifier.
+
+    Parameters
+    ----------
+    job_id : str
+        Identifier of the job.
+
+    Returns
+    -------
+    Job
+        The job.
+
+    Raises
+    ------
+    HTTPException
+        404 if the job does not exist or expired.
+    """
+    job = job_store.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@app.post("/jobs/{query}", status_code=202)
+async def submit_job(query: QueryName, file_path: List[str] = Query(), batch_size: Optional[int] = Query(None, ge=1),
+                     profile: Optional[ProfileName] = None, options: Dict = Depends(query_options)):
     try:
-        result = q3_memory(file_path)
-        return result
+        await asyncio.to_thread(resolve_input, file_path)
     except FileNotFoundError:
         raise HTTPException(status_code=404, detail="File not found")
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+
+    args = {'q2_time': (Q2_SUBMIT_TIMEOUT,), 'q2_memory': (batch_size,)}.get(query, ())
+    try:
+        job = job_store.create(query)
+    except JobStoreFullError:
+        raise HTTPException(status_code=503, detail="Too many running jobs, retry later")
+    task = asyncio.create_task(run_job(job, run_cached_query(
+        query, JOB_QUERIES[query], file_path, *args,
+        profile=profile if query != 'report' else None, options=options, progress=job.report,
+        on_start=job.start)))
+    job_tasks.add(task)
+    task.add_done_callback(job_tasks.discard)
+    return {
+        'job_id': job.job_id,
+        'status': job.status,
+        'status_url': f'/jobs/{job.job_id}',
+        'events_url': f'/jobs/{job.job_id}/events',
+        'result_url': f'/jobs/{job.job_id}/result',
+    }
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    return get_job_or_404(job_id).to_dict()
+
+@app.get("/jobs/{job_id}/result")
+async def get_job_result(job_id: str):
+    job = get_job_or_404(job_id)
+    state = job.to_dict()
+    if state['status'] == 'failed':
+        raise HTTPException(status_code=500, detail=state['error'])
+    if state['status'] != 'done':
+        return JSONResponse(status_code=202, content=jsonable_encoder(state))
+    return state['result']
+
+@app.get("/jobs/{job_id}/events")
+async def get_job_events(job_id: str):
+    job = get_job_or_404(job_id)
+    return StreamingResponse(stream_events(job, JOB_EVENT_INTERVAL), media_type='text/event-stream',
+                             headers={'Cache-Control': 'no-cache'})
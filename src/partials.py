@@ -0,0 +1,218 @@
+import pyarrow.parquet as pq
+import logging
+from concurrent.futures import Executor
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from utils import worker_pool
+from utils.aggregation import QUESTIONS, TweetAggregates, merge_aggregates, top_answers
+from utils.filters import TweetFilter
+from utils.inputs import open_parquet
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# A unit of map work: a Parquet file and the indices of the row groups to read.
+Task = Tuple[str, List[int]]
+
+def split_row_groups(
+    parquet_file: pq.ParquetFile,
+    num_chunks: int,
+    row_groups: Optional[List[int]] = None
+) -> List[List[int]]:
+    """
+    Splits the row groups of a Parquet file into contiguous ranges with similar row counts.
+
+    Parameters
+    ----------
+    parquet_file : pq.ParquetFile
+        Opened Parquet file.
+    num_chunks : int
+        Maximum number of ranges to create.
+    row_groups : List[int], optional
+        Indices of the row groups to split (default is every row group).
+
+    Returns
+    -------
+    List[List[int]]
+        Row group indices of each range, in file order.
+    """
+    metadata = parquet_file.metadata
+    if row_groups is None:
+        row_groups = list(range(metadata.num_row_groups))
+    target_rows = sum(metadata.row_group(row_group).num_rows for row_group in row_groups) / num_chunks
+    chunks: List[List[int]] = [[]]
+    chunk_rows = 0
+    for row_group in row_groups:
+        if chunks[-1] and chunk_rows >= target_rows and len(chunks) < num_chunks:
+            chunks.append([])
+            chunk_rows = 0
+        chunks[-1].append(row_group)
+        chunk_rows += metadata.row_group(row_group).num_rows
+    return chunks
+
+def plan_tasks(
+    file_paths: Sequence[str],
+    num_tasks: int,
+    tweet_filter: Optional[TweetFilter] = None
+) -> List[Task]:
+    """
+    Splits a list of Parquet files into map tasks of similar row counts.
+
+    Each file gets a share of `num_tasks` proportional to its number of rows, and
+    its row groups are split into that many contiguous ranges. Tasks are returned
+    in file order, so merging their partial states in order is equivalent to a
+    sequential scan of the files. With a filter, row groups whose statistics
+    cannot match it are left out of every task.
+
+    Parameters
+    ----------
+    file_paths : Sequence[str]
+        Paths to the Parquet files, in the order they should be scanned.
+    num_tasks : int
+        Target number of tasks.
+    tweet_filter : TweetFilter, optional
+        Rows the tasks will keep (default is every row).
+
+    Returns
+    -------
+    List[Task]
+        (file path, row group indices) of each task.
+
+    Raises
+    ------
+    FileNotFoundError
+        If any of the files does not exist.
+    """
+    tweet_filter = tweet_filter or TweetFilter()
+    parquet_files = [pq.ParquetFile(file_path) for file_path in file_paths]
+    selected = [tweet_filter.row_groups(parquet_file) for parquet_file in parquet_files]
+    file_rows = [sum(parquet_file.metadata.row_group(row_group).num_rows for row_group in row_groups)
+                 for parquet_file, row_groups in zip(parquet_files, selected)]
+    total_rows = sum(file_rows) or 1
+
+    tasks: List[Task] = []
+    for file_path, parquet_file, row_groups, num_rows in zip(file_paths, parquet_files, selected, file_rows):
+        if not row_groups:
+            continue
+        share = max(1, round(num_tasks * num_rows / total_rows))
+        tasks.extend((file_path, chunk) for chunk in split_row_groups(parquet_file, share, row_groups))
+    return tasks
+
+def map_partial(
+    file_path: str,
+    row_groups: Optional[List[int]] = None,
+    questions: Iterable[str] = tuple(QUESTIONS),
+    tweet_filter: Optional[TweetFilter] = None,
+    memory_map: Optional[bool] = None
+) -> TweetAggregates:
+    """
+    Computes the partial state of some questions over a range of row groups of a file.
+
+    Only the columns needed by the questions and the filter are read, and only the
+    row groups whose statistics may match the filter. The result is picklable and
+    can be converted to JSON with `utils.aggregation.aggregates_to_dict`, so it can
+    be computed in another process or machine and merged with `reduce_partials`.
+
+    Parameters
+    ----------
+    file_path : str
+        Path to the Parquet file.
+    row_groups : List[int], optional
+        Indices of the row groups to read (default is every row group).
+    questions : Iterable[str], optional
+        Questions to aggregate, among 'q1', 'q2' and 'q3' (default is all of them).
+    tweet_filter : TweetFilter, optional
+        Rows to aggregate (default is every row).
+    memory_map : bool, optional
+        Whether to memory-map the file, see `utils.inputs.open_parquet`
+        (default is the PARQUET_MEMORY_MAP setting).
+
+    Returns
+    -------
+    TweetAggregates
+        Partial aggregates of the row groups.
+
+    Raises
+    ------
+    FileNotFoundError
+        If the specified file does not exist.
+    """
+    questions = list(questions)
+    tweet_filter = tweet_filter or TweetFilter()
+    columns = [column for question in questions for column in QUESTIONS[question][0]]
+    columns += [column for column in tweet_filter.columns() if column not in columns]
+    updaters = [QUESTIONS[question][1] for question in questions]
+
+    aggregates = TweetAggregates()
+    parquet_file = open_parquet(file_path, memory_map)
+    for row_group in tweet_filter.row_groups(parquet_file, row_groups):
+        batch = tweet_filter.apply(parquet_file.read_row_group(row_group, columns=columns))
+        for update in updaters:
+            update(batch, aggregates)
+    return aggregates
+
+def reduce_partials(partials: Iterable[TweetAggregates]) -> TweetAggregates:
+    """
+    Merges partial states, given in task order, into the state of the whole input.
+
+    Parameters
+    ----------
+    partials : Iterable[TweetAggregates]
+        Partial states returned by `map_partial`, in the order of their tasks.
+
+    Returns
+    -------
+    TweetAggregates
+        The merged state.
+    """
+    return merge_aggregates(partials)
+
+def map_reduce(
+    file_paths: Sequence[str],
+    questions: Iterable[str] = tuple(QUESTIONS),
+    num_tasks: Optional[int] = None,
+    executor: Optional[Executor] = None,
+    n: int = 10,
+    tweet_filter: Optional[TweetFilter] = None
+) -> Dict[str, List[Tuple]]:
+    """
+    Answers some questions over several Parquet files by mapping row group ranges
+    to partial states in parallel and reducing them in order.
+
+    Parameters
+    ----------
+    file_paths : Sequence[str]
+        Paths to the Parquet files.
+    questions : Iterable[str], optional
+        Questions to answer, among 'q1', 'q2' and 'q3' (default is all of them).
+    num_tasks : int, optional
+        Target number of map tasks (default is the size of the worker pool).
+    executor : Executor, optional
+        Executor running the map tasks (default is the shared worker pool).
+    n : int, optional
+        Number of items per answer (default is 10).
+    tweet_filter : TweetFilter, optional
+        Rows to aggregate (default is every row).
+
+    Returns
+    -------
+    Dict[str, List[Tuple]]
+        The answer of each question, as in `q1_time`, `q2_time` and `q3_time`.
+
+    Raises
+    ------
+    FileNotFoundError
+        If any of the files does not exist.
+    """
+    questions = list(questions)
+    tasks = plan_tasks(file_paths, num_tasks or worker_pool.pool_size(), tweet_filter)
+    logger.info(f"Running {len(tasks)} map tasks over {len(file_paths)} files")
+
+    if executor is None:
+        futures = [worker_pool.submit(map_partial, file_path, row_groups, questions, tweet_filter)
+                   for file_path, row_groups in tasks]
+    else:
+        futures = [executor.submit(map_partial, file_path, row_groups, questions, tweet_filter)
+                   for file_path, row_groups in tasks]
+
+    return top_answers(reduce_partials(future.result() for future in futures), questions, n)
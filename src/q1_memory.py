@@ -1,138 +1,311 @@
 import duckdb
 import logging
-from typing import List, Tuple, Optional
+import pyarrow as pa
+import pyarrow.compute as pc
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple, Union
 from datetime import date
 
+from utils import duckdb_pool
+from utils.filters import DateInput, TweetFilter, iter_filtered_batches, resolve_filter
+from utils.inputs import FileInput, prune_files_for_top_dates, resolve_input
+from utils.instrumentation import duckdb_profile, instrumented, stage, timed_batches
+from utils.jobs import PROGRESS_INTERVAL, ProgressCallback
+from utils.resource_profiles import ResourceProfile, resolve_profile
+from utils.sketches import DEFAULT_EPSILON, SpaceSaving, capacity_for_error
+
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-def get_top_user_for_date(
-   con: duckdb.DuckDBPyConnection, 
-   file_path: str, 
-   tweet_date: date
-) -> Tuple[Optional[str], int]:
+def create_date_user_counts(
+   con: duckdb.DuckDBPyConnection,
+   file_path: Union[str, List[str]],
+   tweet_filter: Optional[TweetFilter] = None
+) -> None:
    """
-   Processes a specific date to identify the user with the highest number of tweets.
+   Creates a temporary table with the number of tweets per (day, username) pair,
+   scanning the Parquet file exactly once. Tweets without a date are skipped, as
+   in `q1_time`.
+
+   The table lives in DuckDB's buffer manager, so when it grows beyond the
+   connection's memory limit it is spilled to the temporary directory instead
+   of growing the process memory.
 
    Parameters
    ----------
    con : duckdb.DuckDBPyConnection
        Active connection to DuckDB.
-   file_path : str
-       Path to the Parquet file containing tweet data.
-   tweet_date : date
-       The date for which to process tweets.
+   file_path : str or List[str]
+       Path to the Parquet file containing tweet data, or a list of paths.
+   tweet_filter : TweetFilter, optional
+       Tweets to count, pushed down to the Parquet scan (default is every tweet).
+
+   Raises
+   ------
+   duckdb.Error
+       If there is an error in the DuckDB operations.
+   """
+   tweet_filter = tweet_filter or TweetFilter()
+   query = f"""
+   CREATE OR REPLACE TEMP TABLE date_user_counts AS
+   SELECT
+       date_trunc('day', date) AS tweet_date,
+       username,
+       COUNT(*) AS tweet_count
+   FROM read_parquet(?, union_by_name = true)
+   WHERE date IS NOT NULL AND {tweet_filter.sql_predicate()}
+   GROUP BY tweet_date, username;
+   """
+   con.execute(query, [file_path])
+
+def get_top_users_for_top_dates(
+   con: duckdb.DuckDBPyConnection,
+   limit: int = 10
+) -> List[Tuple[date, str]]:
+   """
+   Retrieves the top dates by tweet count and the user with the most tweets on each
+   of them from the `date_user_counts` temporary table.
+
+   Dates are ordered by tweet count descending and date ascending, and ties between
+   users are broken by username ascending.
+
+   Parameters
+   ----------
+   con : duckdb.DuckDBPyConnection
+       Active connection to DuckDB.
+   limit : int, optional
+       Number of dates to return (default is 10).
 
    Returns
    -------
-   Tuple[Optional[str], int]
-       A tuple containing:
-           - Username with the highest tweet count (None if no tweets found)
-           - The count of tweets made by the user (0 if no tweets found)
+   List[Tuple[date, str]]
+       A list of tuples containing:
+           - Date (date)
+           - Username (str) with the highest number of tweets on that date.
 
    Raises
    ------
    duckdb.Error
        If there is an error in the DuckDB operations.
-   Exception
-       If an unexpected error occurs during processing.
    """
-   try:
-       query = f"""
-       WITH RankedUsers AS (
-           SELECT
-               username,
-               COUNT(*) AS tweet_count,
-               ROW_NUMBER() OVER (ORDER BY COUNT(*) DESC, username ASC) as rn
-           FROM read_parquet('{file_path}')
-           WHERE date_trunc('day', date) = '{tweet_date}'
-           GROUP BY username
-           ORDER BY tweet_count DESC, username ASC
-       )
-       SELECT username, tweet_count
-       FROM RankedUsers
-       WHERE rn = 1
-       """
-       result = con.execute(query).fetchone()
-
-       if result:
-           logger.debug(f"Top user for {tweet_date}: {result[0]} with {result[1]} tweets.")
-           return result[0], result[1]
-       logger.debug(f"No tweets found for date {tweet_date}.")
-       return None, 0
+   query = f"""
+   WITH TopDates AS (
+       SELECT
+           tweet_date,
+           SUM(tweet_count) AS tweet_count
+       FROM date_user_counts
+       GROUP BY tweet_date
+       ORDER BY tweet_count DESC, tweet_date ASC
+       LIMIT {int(limit)}
+   ),
+   RankedUsers AS (
+       SELECT
+           DUC.tweet_date,
+           DUC.username,
+           ROW_NUMBER() OVER (PARTITION BY DUC.tweet_date ORDER BY DUC.tweet_count DESC, DUC.username ASC) AS rn
+       FROM date_user_counts DUC
+       WHERE DUC.tweet_date IN (SELECT tweet_date FROM TopDates)
+   )
+   SELECT TD.tweet_date, RU.username
+   FROM TopDates TD
+   JOIN RankedUsers RU ON TD.tweet_date = RU.tweet_date
+   WHERE RU.rn = 1
+   ORDER BY TD.tweet_count DESC, TD.tweet_date ASC;
+   """
+   return con.execute(query).fetchall()
 
-   except Exception as e:
-       logger.error(f"Error processing date {tweet_date}: {e}")
-       raise
+def approximate_top_users_for_top_dates(
+   file_path: Union[str, List[str]],
+   epsilon: float = DEFAULT_EPSILON,
+   limit: int = 10,
+   batch_size: int = 100_000,
+   tweet_filter: Optional[TweetFilter] = None,
+   progress: Optional[ProgressCallback] = None
+) -> List[Tuple[date, str, int, int]]:
+   """
+   Retrieves the top dates by tweet count and an approximate top user for each of
+   them, keeping one fixed-size Space-Saving sketch of users per day.
+
+   Days are few, so tweets per day are counted exactly; the users of each day are
+   pre-aggregated per batch with Arrow and fed to the sketch of that day, so memory
+   is bounded by the number of days times the sketch capacity instead of the
+   number of distinct users.
+
+   Parameters
+   ----------
+   file_path : str or List[str]
+       Path to the Parquet file containing tweet data, or a list of paths.
+   epsilon : float, optional
+       Maximum overestimation of a user's count, as a fraction of the tweets of
+       that day (default is 1e-4).
+   limit : int, optional
+       Number of dates to return (default is 10).
+   batch_size : int, optional
+       Number of rows read per batch (default is 100000).
+   tweet_filter : TweetFilter, optional
+       Tweets to count (default is every tweet).
+   progress : ProgressCallback, optional
+       Receives the rows processed and the answer so far every PROGRESS_INTERVAL
+       batches (default is no reports).
+
+   Returns
+   -------
+   List[Tuple[date, str, int, int]]
+       A list of tuples containing:
+           - Date (date)
+           - Username (str) with the highest estimated number of tweets on that date
+           - Estimated number of tweets of the user (int)
+           - Error (int): the true number is between estimate - error and estimate
+   """
+   capacity = capacity_for_error(epsilon)
+   date_counts: Counter = Counter()
+   user_sketches: Dict[date, SpaceSaving] = {}
+
+   processed_rows = 0
+   batches = timed_batches(iter_filtered_batches(file_path, ['date', 'username'], tweet_filter, batch_size))
+   for batch_number, batch in enumerate(batches, 1):
+       with stage('aggregate'):
+           grouped = pa.table({'tweet_date': pc.cast(batch.column('date'), pa.date32()),
+                               'username': batch.column('username')}) \
+               .group_by(['tweet_date', 'username']) \
+               .aggregate([('tweet_date', 'count')])
+
+           for tweet_date, username, tweet_count in zip(grouped['tweet_date'].to_pylist(),
+                                                        grouped['username'].to_pylist(),
+                                                        grouped['tweet_date_count'].to_pylist()):
+               if tweet_date is None:
+                   continue
+               date_counts[tweet_date] += tweet_count
+               if tweet_date not in user_sketches:
+                   user_sketches[tweet_date] = SpaceSaving(capacity)
+               user_sketches[tweet_date].update(username, tweet_count)
+
+       processed_rows += batch.num_rows
+       if progress is not None and batch_number % PROGRESS_INTERVAL == 0:
+           progress({'rows': processed_rows, 'total_rows': None,
+                     'partial': _rank_dates(date_counts, user_sketches, limit)})
+
+   with stage('rank'):
+       return _rank_dates(date_counts, user_sketches, limit)
+
+def _rank_dates(date_counts: Counter, user_sketches: Dict[date, SpaceSaving], limit: int) -> List[Tuple]:
+   results = []
+   for tweet_date, _ in sorted(date_counts.items(), key=lambda item: (-item[1], item[0]))[:limit]:
+       sketch = user_sketches[tweet_date]
+       username, count = min(sketch.counts.items(),
+                             key=lambda item: (-item[1], sketch.errors[item[0]], item[0] is None, item[0] or ''))
+       if username:
+           results.append((tweet_date, username, count, sketch.errors[username]))
+   return results
 
-def q1_memory(file_path: str, num_threads: int = 1) -> List[Tuple[date, str]]:
+@instrumented
+def q1_memory(
+   file_path: FileInput,
+   num_threads: Optional[int] = None,
+   memory_limit: Optional[str] = None,
+   profile: Union[str, ResourceProfile, None] = None,
+   approximate: bool = False,
+   epsilon: float = DEFAULT_EPSILON,
+   n: int = 10,
+   start_date: DateInput = None,
+   end_date: DateInput = None,
+   usernames: Union[str, Iterable[str], None] = None,
+   progress: Optional[ProgressCallback] = None
+) -> List[Tuple]:
    """
-   Processes a Parquet file of tweets to identify the top 10 dates with the most tweets
+   Processes a Parquet file of tweets to identify the top `n` dates with the most tweets
    and, for each date, the user with the highest number of tweets.
 
-   This function processes with temporary views instead of loading the entire file into memory.
+   This function reads the file once, aggregating tweets per (day, username) into a
+   temporary table that DuckDB spills to disk once `memory_limit` is reached, so the
+   peak memory stays flat regardless of the file size. The query runs on a pooled
+   cursor of the shared DuckDB database configured with these settings. Multi-file
+   inputs are scanned together, after dropping the files whose date statistics
+   show they cannot contain any of the top dates. The date and username filters
+   are pushed down to the Parquet scan.
 
    Parameters
    ----------
-   file_path : str
-       Path to the Parquet file.
+   file_path : FileInput
+       Path to the Parquet file, or a glob, directory or list of them.
    num_threads : int, optional
-       Number of threads to use for parallel processing (default is 1).
+       Number of threads to use for parallel processing (default is the number of
+       threads of the profile, 1 for 'low-memory').
+   memory_limit : str, optional
+       Maximum memory DuckDB may use before spilling to disk (default is the limit
+       of the profile, '256MB' for 'low-memory').
+   profile : str or ResourceProfile, optional
+       DuckDB resource profile, see `utils.resource_profiles` (default is 'low-memory').
+   approximate : bool, optional
+       Whether to rank the users of each day with fixed-size Space-Saving sketches
+       instead of exact counts, see `approximate_top_users_for_top_dates`
+       (default is False).
+   epsilon : float, optional
+       Maximum overestimation of a user's count in approximate mode, as a fraction
+       of the tweets of that day (default is 1e-4).
+   n : int, optional
+       Number of dates to return (default is 10).
+   start_date : datetime.date or str, optional
+       First day of the tweets considered (default is no lower bound).
+   end_date : datetime.date or str, optional
+       Last day of the tweets considered (default is no upper bound).
+   usernames : str or Iterable[str], optional
+       Only count the tweets of these users (default is every user).
+   progress : ProgressCallback, optional
+       Receives the rows processed and the partial answer while the sketches
+       are filled in approximate mode, see `utils.jobs.ProgressCallback`. The
+       exact mode runs as a single DuckDB query and reports nothing (default is
+       no reports).
 
    Returns
    -------
-   List[Tuple[date, str]]
+   List[Tuple]
        A list of tuples containing:
            - Date (date): The date of the tweets
            - Username (str): The user with the most tweets on that date
-       Returns an empty list if no data is found or in case of error.
+       In approximate mode, each tuple also holds the estimated number of tweets of
+       the user and its error, see `approximate_top_users_for_top_dates`.
+       Returns an empty list if no data is found.
 
    Raises
    ------
    FileNotFoundError
        If the specified file does not exist.
+   ValueError
+       If `start_date` is after `end_date`.
    duckdb.Error
        If there is an error in the DuckDB operations.
    Exception
        If an unexpected error occurs during processing.
    """
-   con = None
    try:
-       logger.info(f"Starting processing for file: {file_path} with {num_threads} threads")
-       con = duckdb.connect(database=':memory:')
-       con.execute(f"PRAGMA threads={num_threads};")
-
-       con.execute(f"""
-           CREATE TEMP VIEW top_dates AS
-           SELECT 
-               date_trunc('day', date) AS tweet_date,
-               COUNT(*) AS tweet_count
-           FROM read_parquet('{file_path}')
-           GROUP BY tweet_date
-           ORDER BY tweet_count DESC
-           LIMIT 10;
-       """)
-
-       top_dates = con.execute("SELECT * FROM top_dates;").fetchall()
-
-       if not top_dates:
-           logger.warning(f"No tweet dates found in the file: {file_path}")
+       tweet_filter = resolve_filter(start_date, end_date, usernames)
+       with stage('plan'):
+           file_paths = prune_files_for_top_dates(resolve_input(file_path), n, tweet_filter)
+       if not file_paths:
+           logger.warning(f"No file matches the filters: {file_path}")
            return []
+       if approximate:
+           return approximate_top_users_for_top_dates(file_paths, epsilon, n, tweet_filter=tweet_filter,
+                                                      progress=progress)
 
-       results = []
-       for tweet_date, _ in top_dates:
+       resources = resolve_profile(profile, 'low-memory', threads=num_threads, memory_limit=memory_limit)
+       logger.info(f"Starting processing for file: {file_path} with {resources.threads} threads")
+       with duckdb_pool.connection(**resources.settings()) as con:
            try:
-               top_user, _ = get_top_user_for_date(con, file_path, tweet_date)
-               if top_user:
-                   results.append((tweet_date, top_user))
-           except Exception as e:
-               logger.error(f"Failed to retrieve top user for date {tweet_date}: {e}")
+               with stage('aggregate'), duckdb_profile(con):
+                   create_date_user_counts(con, file_paths, tweet_filter)
+               with stage('rank'), duckdb_profile(con):
+                   top_users = get_top_users_for_top_dates(con, n)
+           finally:
+               con.execute("DROP TABLE IF EXISTS date_user_counts;")
+
+       if not top_users:
+           logger.warning(f"No tweet dates found in the file: {file_path}")
+           return []
 
-       return results
+       return [(tweet_date, top_user) for tweet_date, top_user in top_users if top_user]
 
    except Exception as e:
        logger.error(f"Error during processing: {e}")
        raise
-   finally:
-       if con:
-           con.close()
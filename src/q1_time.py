@@ -1,24 +1,54 @@
-import duckdb
 import logging
-from typing import List, Tuple
+from typing import Iterable, List, Optional, Tuple, Union
 from datetime import date
 
+from utils import duckdb_pool
+from utils.filters import DateInput, resolve_filter
+from utils.inputs import FileInput, prune_files_for_top_dates, resolve_input
+from utils.instrumentation import duckdb_profile, instrumented, stage
+from utils.resource_profiles import ResourceProfile, resolve_profile
+
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-def q1_time(file_path: str, num_threads: int = 4) -> List[Tuple[date, str]]:
+@instrumented
+def q1_time(
+    file_path: FileInput,
+    num_threads: Optional[int] = None,
+    profile: Union[str, ResourceProfile, None] = None,
+    n: int = 10,
+    start_date: DateInput = None,
+    end_date: DateInput = None,
+    usernames: Union[str, Iterable[str], None] = None
+) -> List[Tuple[date, str]]:
     """
-    Processes a Parquet file of tweets to identify the top 10 dates with the most tweets
+    Processes a Parquet file of tweets to identify the top `n` dates with the most tweets
     and, for each date, the user with the highest number of tweets.
 
-    This function prioritizes execution time by processing the entire file in a single query.
+    This function prioritizes execution time by processing the entire file in a single query,
+    run on a pooled cursor of the shared DuckDB database with the file paths bound as a parameter.
+    Multi-file inputs are scanned in parallel by DuckDB, after dropping the files whose date
+    statistics show they cannot contain any of the top dates. The date and username filters
+    are pushed down to the Parquet scan, so row groups outside them are not read.
+    Tweets without a date are not counted, as in every other q1 implementation.
 
     Parameters
     ----------
-    file_path : str
-        Path to the Parquet file.
+    file_path : FileInput
+        Path to the Parquet file, or a glob, directory or list of them.
     num_threads : int, optional
-        Number of threads to use for parallel processing (default is 1).
+        Number of threads to use for parallel processing (default is the
+        number of threads of the profile).
+    profile : str or ResourceProfile, optional
+        DuckDB resource profile, see `utils.resource_profiles` (default is 'latency').
+    n : int, optional
+        Number of dates to return (default is 10).
+    start_date : datetime.date or str, optional
+        First day of the tweets considered (default is no lower bound).
+    end_date : datetime.date or str, optional
+        Last day of the tweets considered (default is no upper bound).
+    usernames : str or Iterable[str], optional
+        Only count the tweets of these users (default is every user).
 
     Returns
     -------
@@ -31,24 +61,26 @@ def q1_time(file_path: str, num_threads: int = 4) -> List[Tuple[date, str]]:
     ------
     FileNotFoundError
         If the specified file does not exist.
+    ValueError
+        If `start_date` is after `end_date`.
     Exception
         If an unexpected error occurs during processing.
     """
-    con = None
     try:
-        logger.info(f"Starting processing for file: {file_path} with {num_threads} threads")
-        con = duckdb.connect(database=':memory:')
-        con.execute(f"PRAGMA threads={num_threads};")
+        resources = resolve_profile(profile, 'latency', threads=num_threads)
+        tweet_filter = resolve_filter(start_date, end_date, usernames)
+        logger.info(f"Starting processing for file: {file_path} with {resources.threads} threads")
 
         query = f"""
         WITH TopDates AS (
             SELECT 
                 date_trunc('day', date) AS tweet_date,
                 COUNT(*) AS tweet_count
-            FROM read_parquet('{file_path}')
+            FROM read_parquet($1, union_by_name = true)
+            WHERE date IS NOT NULL AND {tweet_filter.sql_predicate()}
             GROUP BY tweet_date
-            ORDER BY tweet_count DESC
-            LIMIT 10
+            ORDER BY tweet_count DESC, tweet_date ASC
+            LIMIT {int(n)}
         ),
         RankedUsers AS (
             SELECT 
@@ -56,17 +88,25 @@ def q1_time(file_path: str, num_threads: int = 4) -> List[Tuple[date, str]]:
                 username,
                 COUNT(*) AS tweet_count,
                 ROW_NUMBER() OVER (PARTITION BY date_trunc('day', date) ORDER BY COUNT(*) DESC, username ASC) AS rn
-            FROM read_parquet('{file_path}')
+            FROM read_parquet($1, union_by_name = true)
+            WHERE date IS NOT NULL AND {tweet_filter.sql_predicate()}
             GROUP BY tweet_date, username
         )
         SELECT TD.tweet_date, RU.username
         FROM TopDates TD
         JOIN RankedUsers RU ON TD.tweet_date = RU.tweet_date
         WHERE RU.rn = 1
-        ORDER BY TD.tweet_count DESC;
+        ORDER BY TD.tweet_count DESC, TD.tweet_date ASC;
         """
 
-        results = con.execute(query).fetchall()
+        with stage('plan'):
+            file_paths = prune_files_for_top_dates(resolve_input(file_path), n, tweet_filter)
+        if not file_paths:
+            logger.warning(f"No file matches the filters: {file_path}")
+            return []
+        with duckdb_pool.connection(**resources.settings()) as con:
+            with stage('query'), duckdb_profile(con):
+                results = con.execute(query, [file_paths]).fetchall()
 
         if not results:
             logger.warning(f"No results found in the file: {file_path}")
@@ -77,6 +117,3 @@ def q1_time(file_path: str, num_threads: int = 4) -> List[Tuple[date, str]]:
     except Exception as e:
         logger.error(f"Error during processing: {e}")
         raise
-    finally:
-        if con:
-            con.close()
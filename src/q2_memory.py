@@ -1,41 +1,358 @@
-import pyarrow.parquet as pq
-import emoji
 from collections import Counter
-from typing import List, Tuple, Generator, Iterator
+from typing import Iterable, List, Optional, Tuple, Generator, Iterator, Union
 import logging
+import queue
+import threading
 from contextlib import contextmanager
 
+import pyarrow as pa
+
+from utils.emoji_counter import count_emojis, extract_emojis as extract_emoji_list, has_emoji_column, top_precomputed_emojis
+from utils.filters import DateInput, TweetFilter, resolve_filter
+from utils.inputs import FileInput, count_rows, open_parquet, resolve_input
+from utils.instrumentation import instrumented, stage, timed_batches
+from utils.jobs import PROGRESS_INTERVAL, ProgressCallback
+from utils.resource_profiles import ResourceProfile
+from utils.sketches import DEFAULT_EPSILON, SpaceSaving, capacity_for_error
+
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Decoded size aimed at for each batch when the batch size is not fixed: large
+# enough to amortize the per-batch overhead, small enough to keep RSS flat.
+DEFAULT_TARGET_BATCH_BYTES = 16 * 1024 * 1024
+# Decoded size no batch is planned to exceed, whatever its number of rows.
+DEFAULT_MAX_BATCH_BYTES = 128 * 1024 * 1024
+# Rows per batch until the decoded size of a first batch is known, since the
+# metadata underestimates dictionary-encoded columns.
+PROBE_BATCH_ROWS = 1024
+# Batches decoded ahead of the one being counted; 0 reads in the calling thread.
+DEFAULT_PREFETCH_DEPTH = 2
+
+class BatchSizer:
+    """
+    Plans the number of rows of each batch from its expected decoded size.
+
+    The size of a row is first estimated from the uncompressed size of the column
+    chunks in the row group metadata, then corrected by the ratio between the
+    decoded size of the batches read so far and their metadata estimate, which
+    follows the actual string lengths of the file. Batches are planned at
+    `target_bytes`, or at `batch_size` rows if given, and never above
+    `max_bytes` under the largest ratio observed. Until a first batch has been
+    observed, no more than PROBE_BATCH_ROWS rows are planned.
+
+    Parameters
+    ----------
+    target_bytes : int, optional
+        Decoded size aimed at for each batch, lowered to `max_bytes` if above it
+        (default is DEFAULT_TARGET_BATCH_BYTES).
+    max_bytes : int, optional
+        Hard ceiling on the planned size of a batch (default is
+        DEFAULT_MAX_BATCH_BYTES).
+    batch_size : int, optional
+        Fixed number of rows per batch, still capped by `max_bytes` (default is
+        sizing by bytes).
+
+    Raises
+    ------
+    ValueError
+        If a size is not positive.
+    """
+
+    def __init__(self, target_bytes: int = DEFAULT_TARGET_BATCH_BYTES, max_bytes: int = DEFAULT_MAX_BATCH_BYTES,
+                 batch_size: Optional[int] = None):
+        if target_bytes <= 0 or max_bytes <= 0 or (batch_size is not None and batch_size <= 0):
+            raise ValueError("Batch sizes must be positive")
+        self.target_bytes = min(target_bytes, max_bytes)
+        self.max_bytes = max_bytes
+        self.batch_size = batch_size
+        self.estimated_bytes = 0.0
+        self.observed_bytes = 0
+        self.peak_ratio = 1.0
+
+    @property
+    def ratio(self) -> float:
+        """
+        Ratio between the decoded size of the batches read so far and their
+        metadata estimate, 1.0 before the first batch.
+        """
+        return self.observed_bytes / self.estimated_bytes if self.estimated_bytes else 1.0
+
+    @property
+    def calibrated(self) -> bool:
+        """
+        Whether a batch has been observed, so plans are no longer capped at
+        PROBE_BATCH_ROWS.
+        """
+        return self.estimated_bytes > 0
+
+    def plan(self, row_bytes: float) -> int:
+        """
+        Returns the number of rows of the next batches.
+
+        Parameters
+        ----------
+        row_bytes : float
+            Metadata estimate of the size of a row, see `metadata_row_bytes`.
+
+        Returns
+        -------
+        int
+            Number of rows, at least 1.
+        """
+        row_bytes = max(row_bytes, 1.0)
+        ceiling = int(self.max_bytes / (row_bytes * max(self.ratio, self.peak_ratio)))
+        rows = self.batch_size if self.batch_size is not None else int(self.target_bytes / (row_bytes * self.ratio))
+        if not self.calibrated:
+            rows = min(rows, PROBE_BATCH_ROWS)
+        return max(1, min(rows, ceiling))
+
+    def observe(self, batch: pa.RecordBatch, row_bytes: float) -> None:
+        """
+        Records the decoded size of a batch to correct the next plans.
+
+        Parameters
+        ----------
+        batch : pa.RecordBatch
+            Batch as read from the file, before filtering.
+        row_bytes : float
+            Metadata estimate of the size of its rows.
+        """
+        if not batch.num_rows:
+            return
+        estimated = max(row_bytes, 1.0) * batch.num_rows
+        self.estimated_bytes += estimated
+        self.observed_bytes += batch.nbytes
+        self.peak_ratio = max(self.peak_ratio, batch.nbytes / estimated)
+        if batch.nbytes > self.max_bytes:
+            logger.warning(f"Batch of {batch.num_rows:,} rows took {batch.nbytes:,} bytes, "
+                           f"above the ceiling of {self.max_bytes:,}")
+
+def metadata_row_bytes(row_group_metadata, columns: List[str]) -> float:
+    """
+    Estimates the decoded size of a row of a row group from its metadata.
+
+    Parameters
+    ----------
+    row_group_metadata : pq.RowGroupMetaData
+        Metadata of the row group.
+    columns : List[str]
+        Top-level columns read; nested columns count all their leaves.
+
+    Returns
+    -------
+    float
+        Uncompressed size of the column chunks per row, 0.0 for an empty row group.
+    """
+    if not row_group_metadata.num_rows:
+        return 0.0
+    size = sum(
+        row_group_metadata.column(index).total_uncompressed_size
+        for index in range(row_group_metadata.num_columns)
+        if row_group_metadata.column(index).path_in_schema.split('.')[0] in columns
+    )
+    return size / row_group_metadata.num_rows
+
+def iter_sized_batches(
+    file_paths: List[str],
+    columns: List[str],
+    tweet_filter: Optional[TweetFilter] = None,
+    sizer: Optional[BatchSizer] = None,
+    memory_map: Optional[bool] = None
+) -> Iterator[pa.RecordBatch]:
+    """
+    Streams the rows of Parquet files that match a filter in batches planned by a BatchSizer.
+
+    Like `utils.filters.iter_filtered_batches`, but the number of rows of the
+    batches is planned again for every row group, from its metadata and from the
+    size of the batches already read. The first row group read is sized twice:
+    once for a single probe batch, then again for its remaining rows, which are
+    read by a second scan that skips the probed rows.
+
+    Parameters
+    ----------
+    file_paths : List[str]
+        Paths of the Parquet files.
+    columns : List[str]
+        Columns to read.
+    tweet_filter : TweetFilter, optional
+        Rows to keep (default is every row).
+    sizer : BatchSizer, optional
+        Plans the batches (default is a BatchSizer with the default sizes).
+    memory_map : bool, optional
+        Whether to memory-map the files, see `utils.inputs.open_parquet`
+        (default is the PARQUET_MEMORY_MAP setting).
+
+    Yields
+    ------
+    pa.RecordBatch
+        Batches of matching rows, possibly with the filter columns added.
+    """
+    tweet_filter = tweet_filter or TweetFilter()
+    sizer = sizer or BatchSizer()
+    read_columns = columns + [column for column in tweet_filter.columns() if column not in columns]
+
+    for file_path in file_paths:
+        parquet_file = open_parquet(file_path, memory_map)
+        for row_group in tweet_filter.row_groups(parquet_file):
+            row_group_metadata = parquet_file.metadata.row_group(row_group)
+            row_bytes = metadata_row_bytes(row_group_metadata, read_columns)
+            skip = 0
+            if not sizer.calibrated:
+                probe = next(parquet_file.iter_batches(batch_size=sizer.plan(row_bytes), row_groups=[row_group],
+                                                       columns=read_columns), None)
+                if probe is None:
+                    continue
+                sizer.observe(probe, row_bytes)
+                yield tweet_filter.apply(probe)
+                skip = probe.num_rows
+                if skip >= row_group_metadata.num_rows:
+                    continue
+
+            rows = sizer.plan(row_bytes)
+            for batch in parquet_file.iter_batches(batch_size=rows, row_groups=[row_group], columns=read_columns):
+                if skip >= batch.num_rows:
+                    skip -= batch.num_rows
+                    continue
+                if skip:
+                    batch, skip = batch.slice(skip), 0
+                sizer.observe(batch, row_bytes)
+                yield tweet_filter.apply(batch)
+
+def prefetch_batches(batches: Iterator, depth: int = DEFAULT_PREFETCH_DEPTH) -> Generator:
+    """
+    Reads the upcoming batches of an iterator in a background thread.
+
+    Parquet decoding releases the GIL, so the next batches are read from disk and
+    decoded while the caller processes the current one. At most `depth` batches
+    wait in the queue, which bounds the memory to `depth` + 2 batches: those
+    queued, the one being decoded and the one being processed. Errors of the
+    reader are raised in the caller, and closing the generator stops the reader.
+
+    Parameters
+    ----------
+    batches : Iterator
+        Batches to read, consumed only by the background thread.
+    depth : int, optional
+        Number of batches read ahead (default is DEFAULT_PREFETCH_DEPTH).
+
+    Yields
+    ------
+    Any
+        The batches, in order.
+
+    Raises
+    ------
+    ValueError
+        If `depth` is not positive.
+    """
+    if depth <= 0:
+        raise ValueError("depth must be positive")
+    buffer = queue.Queue(maxsize=depth)
+    stopped = threading.Event()
+    done = object()
+
+    def put(item) -> bool:
+        while not stopped.is_set():
+            try:
+                buffer.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def read() -> None:
+        try:
+            for batch in batches:
+                if not put((batch, None)):
+                    return
+        except BaseException as e:
+            put((None, e))
+            return
+        put((done, None))
+
+    reader = threading.Thread(target=read, name='parquet-prefetch', daemon=True)
+    reader.start()
+    try:
+        while True:
+            batch, error = buffer.get()
+            if error is not None:
+                raise error
+            if batch is done:
+                return
+            yield batch
+    finally:
+        stopped.set()
+        reader.join()
+
 @contextmanager
-def create_parquet_iterator(file_path: str, batch_size: int = 10000) -> Iterator:
+def create_parquet_iterator(
+    file_path: FileInput,
+    batch_size: Optional[int] = None,
+    tweet_filter: Optional[TweetFilter] = None,
+    target_batch_bytes: int = DEFAULT_TARGET_BATCH_BYTES,
+    max_batch_bytes: int = DEFAULT_MAX_BATCH_BYTES,
+    prefetch: int = DEFAULT_PREFETCH_DEPTH,
+    memory_map: Optional[bool] = None
+) -> Iterator:
     """
     Creates an efficient memory iterator for reading Parquet files in batches.
 
+    Multi-file inputs are read one file after the other. The next `prefetch`
+    batches are read in a background thread while the current one is processed,
+    see `prefetch_batches`, so memory holds at most `prefetch` + 2 batches. Unless `batch_size` is given, batches are sized by
+    bytes rather than rows, see BatchSizer, so files of long tweets are read in
+    smaller batches and files of short tweets in larger ones. With a filter, row
+    groups whose statistics cannot match it are skipped and the remaining rows
+    are filtered batch by batch.
+
     Parameters
     ----------
-    file_path : str
-        Path to the Parquet file.
+    file_path : FileInput
+        Path to the Parquet file, or a glob, directory or list of them.
     batch_size : int, optional
-        Number of rows to read per batch (default is 1000).
+        Fixed number of rows to read per batch (default is sizing by bytes).
+    tweet_filter : TweetFilter, optional
+        Tweets to read (default is every tweet).
+    target_batch_bytes : int, optional
+        Decoded size aimed at for each batch (default is 16 MiB).
+    max_batch_bytes : int, optional
+        Decoded size no batch is planned to exceed, even with a fixed
+        `batch_size` (default is 128 MiB).
+    prefetch : int, optional
+        Number of batches read ahead in a background thread, 0 to read them in
+        the calling thread (default is 2).
+    memory_map : bool, optional
+        Whether to memory-map the files instead of reading them into buffers
+        (default is the PARQUET_MEMORY_MAP setting).
 
     Yields
     ------
     Iterator
-        Iterator over the records in the Parquet file in batches.
+        Iterator over the records in the Parquet files in batches.
 
     Raises
     ------
+    ValueError
+        If a batch size is not positive or `prefetch` is negative.
     Exception
         If the file cannot be opened or read.
     """
+    if prefetch < 0:
+        raise ValueError("prefetch must not be negative")
+    sizer = BatchSizer(target_batch_bytes, max_batch_bytes, batch_size)
+    batches = None
     try:
-        parquet_file = pq.ParquetFile(file_path)
-        yield parquet_file.iter_batches(batch_size=batch_size, columns=['content'])
+        batches = iter_sized_batches(resolve_input(file_path), ['content'], tweet_filter, sizer, memory_map)
+        if prefetch:
+            batches = prefetch_batches(batches, prefetch)
+        yield batches
     except Exception as e:
         logger.error(f"Error opening the Parquet file: {e}")
         raise
+    finally:
+        if batches is not None:
+            batches.close()
 
 def extract_emojis(content: str) -> Generator[str, None, None]:
     """
@@ -52,13 +369,15 @@ def extract_emojis(content: str) -> Generator[str, None, None]:
         Each emoji found in the content.
     """
     if content and isinstance(content, str):
-        for emoji_dict in emoji.emoji_list(content):
-            yield emoji_dict['emoji']
+        yield from extract_emoji_list(content)
 
 def update_counter_from_batch(batch, emoji_counter: Counter) -> None:
     """
     Updates the emoji counter with a batch of Parquet records.
 
+    The 'content' column is scanned directly on its Arrow buffers, so only the
+    rows that may contain an emoji are converted to Python strings.
+
     Parameters
     ----------
     batch : RecordBatch
@@ -66,33 +385,90 @@ def update_counter_from_batch(batch, emoji_counter: Counter) -> None:
     emoji_counter : Counter
         Counter to update with extracted emojis.
     """
-    for content in batch['content']:
-        if content is not None:
-            content_str = str(content.as_py())
-            emoji_counter.update(extract_emojis(content_str))
+    count_emojis(batch.column('content'), emoji_counter)
 
-def q2_memory(file_path: str, batch_size: int = 10000) -> List[Tuple[str, int]]:
+@instrumented
+def q2_memory(
+    file_path: FileInput,
+    batch_size: Optional[int] = None,
+    profile: Union[str, ResourceProfile, None] = None,
+    approximate: bool = False,
+    epsilon: float = DEFAULT_EPSILON,
+    n: int = 10,
+    start_date: DateInput = None,
+    end_date: DateInput = None,
+    usernames: Union[str, Iterable[str], None] = None,
+    progress: Optional[ProgressCallback] = None,
+    target_batch_bytes: int = DEFAULT_TARGET_BATCH_BYTES,
+    max_batch_bytes: int = DEFAULT_MAX_BATCH_BYTES,
+    prefetch: int = DEFAULT_PREFETCH_DEPTH,
+    memory_map: Optional[bool] = None
+) -> List[Tuple]:
     """
-    Returns the top 10 most used emojis and their respective counts, optimized for memory usage.
+    Returns the top `n` most used emojis and their respective counts, optimized for memory usage.
+
+    Files written with the precomputed `emojis` column are answered with an UNNEST
+    and GROUP BY in DuckDB, by default under the 'low-memory' resource profile,
+    without tokenizing the contents. In approximate mode, the emojis of each batch
+    are fed to a fixed-size Space-Saving sketch instead of an exact counter. The
+    date and username filters skip the row groups that cannot match them.
+
+    While the contents are tokenized, the rows processed and the top `n` so far
+    are reported to `progress` every PROGRESS_INTERVAL batches.
 
     Parameters
     ----------
-    file_path : str
-        Path to the Parquet file.
+    file_path : FileInput
+        Path to the Parquet file, or a glob, directory or list of them.
     batch_size : int, optional
-        Number of rows to process per batch (default is 1000).
+        Fixed number of rows to process per batch (default is sizing the batches
+        by bytes, see `create_parquet_iterator`).
+    profile : str or ResourceProfile, optional
+        DuckDB resource profile for files with the `emojis` column, see
+        `utils.resource_profiles` (default is 'low-memory').
+    approximate : bool, optional
+        Whether to count with a fixed-size Space-Saving sketch instead of exactly
+        (default is False).
+    epsilon : float, optional
+        Maximum overestimation of any count in approximate mode, as a fraction of
+        the total number of emojis (default is 1e-4).
+    n : int, optional
+        Number of emojis to return (default is 10).
+    start_date : datetime.date or str, optional
+        First day of the tweets considered (default is no lower bound).
+    end_date : datetime.date or str, optional
+        Last day of the tweets considered (default is no upper bound).
+    usernames : str or Iterable[str], optional
+        Only count the emojis of these users (default is every user).
+    progress : ProgressCallback, optional
+        Receives the progress of the scan, see `utils.jobs.ProgressCallback`
+        (default is no reports).
+    target_batch_bytes : int, optional
+        Decoded size aimed at for each batch (default is 16 MiB).
+    max_batch_bytes : int, optional
+        Decoded size no batch is planned to exceed (default is 128 MiB).
+    prefetch : int, optional
+        Number of batches decoded ahead in a background thread while the
+        current one is counted, 0 to disable (default is 2).
+    memory_map : bool, optional
+        Whether to memory-map the Parquet files, see `utils.inputs.open_parquet`
+        (default is the PARQUET_MEMORY_MAP setting).
 
     Returns
     -------
-    List[Tuple[str, int]]
+    List[Tuple]
         A list of tuples containing:
             - Emoji (str)
             - Count (int)
+        In approximate mode, each tuple also holds the error (int): the true
+        count is between count - error and count.
 
     Raises
     ------
     FileNotFoundError
         If the specified file does not exist.
+    ValueError
+        If `start_date` is after `end_date` or a batch size or `prefetch` is invalid.
     Exception
         If an unexpected error occurs during processing.
     """
@@ -101,16 +477,46 @@ def q2_memory(file_path: str, batch_size: int = 10000) -> List[Tuple[str, int]]:
     processed_rows = 0
 
     try:
-        with create_parquet_iterator(file_path, batch_size) as iterator:
-            for batch in iterator:
-                update_counter_from_batch(batch, emoji_counter)
+        tweet_filter = resolve_filter(start_date, end_date, usernames)
+        with stage('plan'):
+            file_paths = resolve_input(file_path)
+            total_rows = count_rows(file_paths) if progress is not None and tweet_filter.is_empty() else None
+
+        if approximate:
+            sketch = SpaceSaving(capacity_for_error(epsilon))
+            with create_parquet_iterator(file_paths, batch_size, tweet_filter, target_batch_bytes,
+                                         max_batch_bytes, prefetch, memory_map) as iterator:
+                for batch_number, batch in enumerate(timed_batches(iterator), 1):
+                    with stage('tokenize'):
+                        counts = count_emojis(batch.column('content'))
+                    with stage('aggregate'):
+                        sketch.update_counts(counts.items())
+                    processed_rows += batch.num_rows
+                    if progress is not None and batch_number % PROGRESS_INTERVAL == 0:
+                        progress({'rows': processed_rows, 'total_rows': total_rows, 'partial': sketch.top(n)})
+            with stage('rank'):
+                return sketch.top(n)
+
+        if all(has_emoji_column(path) for path in file_paths):
+            logger.info("Using the precomputed emojis column")
+            return top_precomputed_emojis(file_paths, n, profile=profile or 'low-memory', tweet_filter=tweet_filter)
+
+        with create_parquet_iterator(file_paths, batch_size, tweet_filter, target_batch_bytes,
+                                     max_batch_bytes, prefetch, memory_map) as iterator:
+            for batch_number, batch in enumerate(timed_batches(iterator), 1):
+                with stage('tokenize'):
+                    update_counter_from_batch(batch, emoji_counter)
                 processed_rows += batch.num_rows
 
-                if processed_rows % (batch_size * 10) == 0:
+                if batch_number % PROGRESS_INTERVAL == 0:
                     logger.info(f"Processed {processed_rows:,} records")
+                    if progress is not None:
+                        progress({'rows': processed_rows, 'total_rows': total_rows,
+                                  'partial': emoji_counter.most_common(n)})
 
         logger.info(f"Processing completed. Total records: {processed_rows:,}")
-        return emoji_counter.most_common(10)
+        with stage('rank'):
+            return emoji_counter.most_common(n)
 
     except Exception as e:
         logger.error(f"Error processing file: {e}")
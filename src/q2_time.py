@@ -1,18 +1,31 @@
+import pyarrow as pa
 import pyarrow.parquet as pq
 from collections import Counter
-import emoji
-from typing import List, Tuple
+from concurrent.futures import Future, as_completed
+from typing import Iterable, List, Optional, Tuple, Union
 import logging
-from concurrent.futures import ProcessPoolExecutor
-import multiprocessing
 import os
+import tempfile
+
+from partials import map_partial, plan_tasks
+from utils import worker_pool
+from utils.emoji_counter import count_emojis, extract_emojis, has_emoji_column, top_precomputed_emojis
+from utils.filters import DateInput, TweetFilter, resolve_filter
+from utils.inputs import FileInput, open_parquet, resolve_input
+from utils.instrumentation import add_rows, instrumented, stage
+from utils.jobs import ProgressCallback
+from utils.resource_profiles import ResourceProfile
+from utils.worker_pool import PoolSaturatedError
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+SHARED_MEMORY_DIR = '/dev/shm' if os.path.isdir('/dev/shm') else None
+MIN_ROWS_PER_TASK = 5000
+
 def extract_emojis_from_content(content: str) -> List[str]:
     """
-    Extracts emojis from a string of text.
+    Extracts emojis from a string of text with the same semantics as `emoji.emoji_list`.
 
     Parameters
     ----------
@@ -26,37 +39,169 @@ def extract_emojis_from_content(content: str) -> List[str]:
     """
     if not isinstance(content, str):
         return []
-    return [d['emoji'] for d in emoji.emoji_list(content)] if content else []
+    return extract_emojis(content)
 
-def process_chunk(contents: List[str]) -> Counter:
+def process_chunk(
+    file_path: str,
+    row_groups: List[int],
+    tweet_filter: Optional[TweetFilter] = None,
+    memory_map: Optional[bool] = None
+) -> Counter:
     """
-    Processes a chunk of tweet contents and returns an emoji counter.
+    Reads a range of row groups of a Parquet file and returns their emoji counter.
+
+    Workers receive only the file path and the row group indices, so the tweet
+    contents are decoded inside the worker instead of being pickled to it. This is
+    the q2 case of `partials.map_partial`.
 
     Parameters
     ----------
-    contents : List[str]
-        List of tweet contents to process.
+    file_path : str
+        Path to the Parquet file.
+    row_groups : List[int]
+        Indices of the row groups to process.
+    tweet_filter : TweetFilter, optional
+        Tweets whose emojis are counted (default is every tweet).
+    memory_map : bool, optional
+        Whether to memory-map the file, so the workers share its pages in the OS
+        cache (default is the PARQUET_MEMORY_MAP setting).
 
     Returns
     -------
     Counter
         A Counter object with the counts of each emoji.
     """
-    chunk_counter = Counter()
-    for content in contents:
-        if content:
-            chunk_counter.update(extract_emojis_from_content(content))
-    return chunk_counter
+    return map_partial(file_path, row_groups, ['q2'], tweet_filter, memory_map).emoji_counts
 
-def q2_time(file_path: str) -> List[Tuple[str, int]]:
+def process_slice(arrow_path: str, offset: int, length: int) -> Counter:
     """
-    Returns the top 10 most used emojis and their respective counts.
-    This version prioritizes execution speed by loading the entire file into memory.
+    Counts the emojis of a slice of a staged Arrow IPC file of tweet contents.
+
+    The file is memory-mapped, so every worker reads the same shared pages and
+    the slice is taken without copying the string buffers.
 
     Parameters
     ----------
-    file_path : str
-        Path to the Parquet file.
+    arrow_path : str
+        Path to the Arrow IPC file created by `stage_content_column`.
+    offset : int
+        First row of the slice.
+    length : int
+        Number of rows in the slice.
+
+    Returns
+    -------
+    Counter
+        A Counter object with the counts of each emoji.
+    """
+    with pa.memory_map(arrow_path) as source:
+        contents = pa.ipc.open_file(source).read_all()['content']
+        return count_emojis(contents.slice(offset, length))
+
+def stage_content_column(parquet_file: pq.ParquetFile) -> str:
+    """
+    Decodes the 'content' column batch by batch into an Arrow IPC file in shared memory.
+
+    Used when the Parquet file has fewer row groups than workers, so the rows can
+    still be split evenly without each worker decoding the same row group.
+
+    Parameters
+    ----------
+    parquet_file : pq.ParquetFile
+        Opened Parquet file.
+
+    Returns
+    -------
+    str
+        Path to the Arrow IPC file. The caller is responsible for removing it.
+    """
+    schema = parquet_file.schema_arrow
+    schema = pa.schema([schema.field('content')])
+    with tempfile.NamedTemporaryFile(suffix='.arrow', dir=SHARED_MEMORY_DIR, delete=False) as sink:
+        with pa.ipc.new_file(sink, schema) as writer:
+            for batch in parquet_file.iter_batches(columns=['content']):
+                writer.write_batch(batch)
+    return sink.name
+
+def report_progress(futures: List[Future], task_rows: List[int], n: int, progress: ProgressCallback) -> None:
+    """
+    Reports the progress of the emoji counting tasks as they finish.
+
+    The partial counters are merged in completion order into a separate counter,
+    so the final result, merged in task order, keeps its deterministic ties.
+
+    Parameters
+    ----------
+    futures : List[Future]
+        Futures of the tasks, each returning a Counter.
+    task_rows : List[int]
+        Number of rows of each task.
+    n : int
+        Number of emojis of the partial answers.
+    progress : ProgressCallback
+        Receives the rows of the finished tasks and the top `n` over them.
+    """
+    rows_of = dict(zip(futures, task_rows))
+    partial_counter = Counter()
+    processed_rows = 0
+    for future in as_completed(futures):
+        partial_counter.update(future.result())
+        processed_rows += rows_of[future]
+        progress({'rows': processed_rows, 'total_rows': sum(task_rows), 'partial': partial_counter.most_common(n)})
+
+@instrumented
+def q2_time(
+    file_path: FileInput,
+    submit_timeout: Optional[float] = None,
+    profile: Union[str, ResourceProfile, None] = None,
+    n: int = 10,
+    start_date: DateInput = None,
+    end_date: DateInput = None,
+    usernames: Union[str, Iterable[str], None] = None,
+    progress: Optional[ProgressCallback] = None,
+    memory_map: Optional[bool] = None
+) -> List[Tuple[str, int]]:
+    """
+    Returns the top `n` most used emojis and their respective counts.
+    This version prioritizes execution speed by counting emojis in parallel processes.
+
+    Workers of the shared pool in `utils.worker_pool` receive the file path and a
+    range of row groups and decode their own slice; multi-file inputs are split
+    into tasks across all their files, leaving out the row groups whose statistics
+    cannot match the date and username filters. An unfiltered single file with
+    fewer row groups than workers is staged once into a shared-memory Arrow file that workers
+    memory-map and slice without copies. Files written with the precomputed
+    `emojis` column skip the tokenization and are answered with a parallel
+    UNNEST and GROUP BY in DuckDB. Each time a worker finishes its task, the
+    rows processed and the top `n` of the finished tasks are reported to
+    `progress`. With `memory_map`, the workers memory-map the Parquet files
+    instead of reading them into their own buffers, so they share the pages of
+    the OS cache and only the decoded columns add to their RSS.
+
+    Parameters
+    ----------
+    file_path : FileInput
+        Path to the Parquet file, or a glob, directory or list of them.
+    submit_timeout : float, optional
+        Maximum number of seconds to wait for a free slot in the worker pool
+        (default is to wait until one is available).
+    profile : str or ResourceProfile, optional
+        DuckDB resource profile for files with the `emojis` column, see
+        `utils.resource_profiles` (default is 'latency').
+    n : int, optional
+        Number of emojis to return (default is 10).
+    start_date : datetime.date or str, optional
+        First day of the tweets considered (default is no lower bound).
+    end_date : datetime.date or str, optional
+        Last day of the tweets considered (default is no upper bound).
+    usernames : str or Iterable[str], optional
+        Only count the emojis of these users (default is every user).
+    progress : ProgressCallback, optional
+        Receives the progress of the workers, see `utils.jobs.ProgressCallback`
+        (default is no reports).
+    memory_map : bool, optional
+        Whether to memory-map the Parquet files, see `utils.inputs.open_parquet`
+        (default is the PARQUET_MEMORY_MAP setting).
 
     Returns
     -------
@@ -70,41 +215,77 @@ def q2_time(file_path: str) -> List[Tuple[str, int]]:
     FileNotFoundError
         If the specified file does not exist.
     ValueError
-        If the file is empty or has incorrect formatting.
+        If the file is empty or has incorrect formatting, or `start_date` is
+        after `end_date`.
+    PoolSaturatedError
+        If the worker pool has no free slot within `submit_timeout`.
     RuntimeError
         For unexpected errors during processing.
     """
     logger.info(f"Starting time-optimized processing for file: {file_path}")
 
-    if not isinstance(file_path, str):
-        raise TypeError("File path must be a string")
+    if not isinstance(file_path, (str, os.PathLike, list, tuple)):
+        raise TypeError("File path must be a string or a list of strings")
 
-    if not os.path.exists(file_path):
-        raise FileNotFoundError(f"File not found: {file_path}")
+    with stage('plan'):
+        file_paths = resolve_input(file_path)
+    tweet_filter = resolve_filter(start_date, end_date, usernames)
 
+    arrow_path = None
     try:
-        table = pq.read_table(file_path, columns=['content'])
+        with stage('plan'):
+            parquet_files = [open_parquet(path, memory_map) for path in file_paths]
+            num_rows = sum(parquet_file.metadata.num_rows for parquet_file in parquet_files)
 
-        if table.num_rows == 0:
+        if num_rows == 0:
             logger.warning(f"File is empty: {file_path}")
             return []
 
-        contents = table['content'].to_pandas().astype(str).tolist()
+        if all(has_emoji_column(path) for path in file_paths):
+            logger.info("Using the precomputed emojis column")
+            return top_precomputed_emojis(file_paths, n, profile=profile, tweet_filter=tweet_filter)
 
-        num_cpus = multiprocessing.cpu_count()
-        num_processes = min(num_cpus * 2, 16)
+        num_processes = worker_pool.pool_size()
+        num_tasks = max(1, min(num_processes, num_rows // MIN_ROWS_PER_TASK))
+        num_row_groups = sum(parquet_file.num_row_groups for parquet_file in parquet_files)
 
-        chunk_size = max(1, len(contents) // num_processes)
-        chunks = [contents[i:i + chunk_size] for i in range(0, len(contents), chunk_size)]
+        if len(file_paths) > 1 or num_tasks == 1 or num_row_groups >= num_tasks or not tweet_filter.is_empty():
+            with stage('plan'):
+                planned = plan_tasks(file_paths, num_tasks, tweet_filter)
+            metadata = {path: parquet_file.metadata for path, parquet_file in zip(file_paths, parquet_files)}
+            task_rows = [sum(metadata[path].row_group(row_group).num_rows for row_group in row_groups)
+                         for path, row_groups in planned]
+            tasks = [(process_chunk, path, row_groups, tweet_filter, memory_map) for path, row_groups in planned]
+        else:
+            parquet_file = parquet_files[0]
+            with stage('decode'):
+                arrow_path = stage_content_column(parquet_file)
+            chunk_size = -(-num_rows // num_tasks)
+            task_rows = [min(chunk_size, num_rows - offset) for offset in range(0, num_rows, chunk_size)]
+            tasks = [(process_slice, arrow_path, offset, chunk_size)
+                     for offset in range(0, num_rows, chunk_size)]
+        add_rows(sum(task_rows))
 
-        with ProcessPoolExecutor(max_workers=num_processes) as executor:
-            counters = list(executor.map(process_chunk, chunks))
+        with stage('map'):
+            if len(tasks) == 1:
+                function, *args = tasks[0]
+                counters = [function(*args)]
+                if progress is not None:
+                    progress({'rows': task_rows[0], 'total_rows': task_rows[0], 'partial': counters[0].most_common(n)})
+            else:
+                futures = [worker_pool.submit(function, *args, timeout=submit_timeout)
+                           for function, *args in tasks]
+                if progress is not None:
+                    report_progress(futures, task_rows, n, progress)
+                counters = [future.result() for future in futures]
 
-        final_counter = Counter()
-        for counter in counters:
-            final_counter.update(counter)
+        with stage('aggregate'):
+            final_counter = Counter()
+            for counter in counters:
+                final_counter.update(counter)
 
-        result = final_counter.most_common(10)
+        with stage('rank'):
+            result = final_counter.most_common(n)
 
         for emoji_char, count in result:
             if not isinstance(emoji_char, str) or not isinstance(count, int):
@@ -113,9 +294,15 @@ def q2_time(file_path: str) -> List[Tuple[str, int]]:
         logger.info("Processing completed successfully")
         return result
 
-    except pq.lib.ArrowInvalid:
+    except PoolSaturatedError:
+        logger.warning(f"Worker pool saturated while processing: {file_path}")
+        raise
+    except pa.lib.ArrowInvalid:
         logger.error(f"Invalid Parquet file: {file_path}")
         raise ValueError("Invalid or corrupted Parquet file")
     except Exception as e:
         logger.error(f"Error during processing: {e}")
         raise RuntimeError(f"Unexpected error: {e}")
+    finally:
+        if arrow_path:
+            os.remove(arrow_path)
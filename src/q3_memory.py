@@ -1,37 +1,54 @@
 import duckdb
 import logging
-from typing import List, Tuple
+import pyarrow.compute as pc
+from typing import Iterable, List, Optional, Tuple, Union
 from collections import Counter
 
+from utils import duckdb_pool
+from utils.filters import DateInput, TweetFilter, iter_filtered_batches, resolve_filter
+from utils.inputs import FileInput, resolve_input, sql_file_list
+from utils.instrumentation import duckdb_profile, instrumented, stage, timed_batches
+from utils.resource_profiles import ResourceProfile, resolve_profile
+from utils.sketches import DEFAULT_EPSILON, SpaceSaving, capacity_for_error
+
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-def get_flattened_mentions(con: duckdb.DuckDBPyConnection, file_path: str) -> None:
+def get_flattened_mentions(
+    con: duckdb.DuckDBPyConnection,
+    file_path: Union[str, List[str]],
+    tweet_filter: Optional[TweetFilter] = None
+) -> None:
     """
-    Creates a temporary view of flattened mentions from the Parquet file.
+    Creates a temporary view of flattened mentions from the Parquet files.
 
     Parameters
     ----------
     con : duckdb.DuckDBPyConnection
         Active DuckDB connection.
-    file_path : str
-        Path to the Parquet file.
+    file_path : str or List[str]
+        Path to the Parquet file, or a list of paths.
+    tweet_filter : TweetFilter, optional
+        Tweets whose mentions are flattened, pushed down to the Parquet scan
+        (default is every tweet).
 
     Raises
     ------
     Exception
         If an unexpected error occurs during view creation.
     """
+    file_paths = [file_path] if isinstance(file_path, str) else file_path
+    tweet_filter = tweet_filter or TweetFilter()
     query = f"""
-    CREATE TEMP VIEW flattened_mentions AS
+    CREATE OR REPLACE TEMP VIEW flattened_mentions AS
     SELECT 
         UNNEST(mentionedUsers) AS username
-    FROM read_parquet('{file_path}')
-    WHERE mentionedUsers IS NOT NULL;
+    FROM read_parquet({sql_file_list(file_paths)}, union_by_name = true)
+    WHERE mentionedUsers IS NOT NULL AND {tweet_filter.sql_predicate()};
     """
     con.execute(query)
 
-def get_mention_counts(con: duckdb.DuckDBPyConnection) -> List[Tuple[str, int]]:
+def get_mention_counts(con: duckdb.DuckDBPyConnection, n: int = 10) -> List[Tuple[str, int]]:
     """
     Retrieves mention counts per user, ordered by the most mentioned users.
 
@@ -39,6 +56,8 @@ def get_mention_counts(con: duckdb.DuckDBPyConnection) -> List[Tuple[str, int]]:
     ----------
     con : duckdb.DuckDBPyConnection
         Active DuckDB connection.
+    n : int, optional
+        Number of users to return (default is 10).
 
     Returns
     -------
@@ -52,38 +71,109 @@ def get_mention_counts(con: duckdb.DuckDBPyConnection) -> List[Tuple[str, int]]:
     Exception
         If an unexpected error occurs during query execution.
     """
-    query = """
+    query = f"""
     SELECT 
         username,
         COUNT(*) AS mention_count
     FROM flattened_mentions
     GROUP BY username
     ORDER BY mention_count DESC, username ASC
-    LIMIT 10;
+    LIMIT {int(n)};
     """
     return con.execute(query).fetchall()
 
-def q3_memory(file_path: str) -> List[Tuple[str, int]]:
+def approximate_mention_counts(file_path: Union[str, List[str]], epsilon: float = DEFAULT_EPSILON,
+                               batch_size: int = 100_000,
+                               tweet_filter: Optional[TweetFilter] = None) -> SpaceSaving:
     """
-    Processes a Parquet file to identify the top 10 most mentioned users,
-    optimizing memory usage by using temporary views and modular queries.
+    Streams the mentions of Parquet files into a Space-Saving sketch of fixed size.
+
+    Each batch is pre-aggregated with Arrow's `value_counts` and its distinct users
+    are fed to the sketch as weighted updates, so memory is bounded by the batch
+    size and the sketch capacity instead of the number of distinct users.
 
     Parameters
     ----------
-    file_path : str
-        Path to the Parquet file.
+    file_path : str or List[str]
+        Path to the Parquet file, or a list of paths.
+    epsilon : float, optional
+        Maximum overestimation of any count, as a fraction of the total number of
+        mentions (default is 1e-4).
+    batch_size : int, optional
+        Number of rows read per batch (default is 100000).
+    tweet_filter : TweetFilter, optional
+        Tweets whose mentions are counted (default is every tweet).
 
     Returns
     -------
-    List[Tuple[str, int]]
+    SpaceSaving
+        Sketch of the most mentioned users.
+    """
+    sketch = SpaceSaving(capacity_for_error(epsilon))
+    for batch in timed_batches(iter_filtered_batches(file_path, ['mentionedUsers'], tweet_filter, batch_size)):
+        with stage('aggregate'):
+            mentions = pc.drop_null(pc.list_flatten(batch.column('mentionedUsers')))
+            if len(mentions) == 0:
+                continue
+            counts = pc.value_counts(mentions)
+            sketch.update_counts(zip(counts.field('values').to_pylist(), counts.field('counts').to_pylist()))
+    return sketch
+
+@instrumented
+def q3_memory(
+    file_path: FileInput,
+    profile: Union[str, ResourceProfile, None] = None,
+    approximate: bool = False,
+    epsilon: float = DEFAULT_EPSILON,
+    n: int = 10,
+    start_date: DateInput = None,
+    end_date: DateInput = None,
+    usernames: Union[str, Iterable[str], None] = None
+) -> List[Tuple]:
+    """
+    Processes a Parquet file to identify the top `n` most mentioned users,
+    optimizing memory usage by using temporary views and modular queries on a
+    pooled cursor of the shared DuckDB database. The default 'low-memory' profile
+    caps DuckDB's memory and spills to disk beyond it. Multi-file inputs are read
+    through a single view over all the files. The date and username filters
+    select the tweets whose mentions are counted and are pushed down to the scan.
+
+    Parameters
+    ----------
+    file_path : FileInput
+        Path to the Parquet file, or a glob, directory or list of them.
+    profile : str or ResourceProfile, optional
+        DuckDB resource profile, see `utils.resource_profiles` (default is 'low-memory').
+    approximate : bool, optional
+        Whether to count with a fixed-size Space-Saving sketch instead of exactly
+        (default is False).
+    epsilon : float, optional
+        Maximum overestimation of any count in approximate mode, as a fraction of
+        the total number of mentions (default is 1e-4).
+    n : int, optional
+        Number of users to return (default is 10).
+    start_date : datetime.date or str, optional
+        First day of the tweets considered (default is no lower bound).
+    end_date : datetime.date or str, optional
+        Last day of the tweets considered (default is no upper bound).
+    usernames : str or Iterable[str], optional
+        Only count the mentions made by these users (default is every user).
+
+    Returns
+    -------
+    List[Tuple]
         A list of tuples containing:
             - Username (str)
             - Number of mentions (int)
+        In approximate mode, each tuple also holds the error (int): the true
+        number of mentions is between count - error and count.
 
     Raises
     ------
     FileNotFoundError
         If the specified file does not exist.
+    ValueError
+        If `start_date` is after `end_date`.
     duckdb.BinderException
         If there is an error in the Parquet file structure or SQL query.
     Exception
@@ -92,12 +182,25 @@ def q3_memory(file_path: str) -> List[Tuple[str, int]]:
     try:
         logger.info(f"Starting processing for file: {file_path}")
 
-        with duckdb.connect(database=':memory:') as con:            
-            get_flattened_mentions(con, file_path)
-            results = get_mention_counts(con)
+        tweet_filter = resolve_filter(start_date, end_date, usernames)
+        with stage('plan'):
+            file_paths = resolve_input(file_path)
+        if approximate:
+            sketch = approximate_mention_counts(file_paths, epsilon, tweet_filter=tweet_filter)
+            with stage('rank'):
+                return sketch.top(n)
+
+        resources = resolve_profile(profile, 'low-memory')
+        with duckdb_pool.connection(**resources.settings()) as con:
+            try:
+                get_flattened_mentions(con, file_paths, tweet_filter)
+                with stage('query'), duckdb_profile(con):
+                    results = get_mention_counts(con, n)
+            finally:
+                con.execute("DROP VIEW IF EXISTS flattened_mentions;")
 
             mention_counts = Counter({username: count for username, count in results})
-            top_mentions = mention_counts.most_common(10)
+            top_mentions = mention_counts.most_common(n)
 
             logger.info("Processing completed successfully")
             return top_mentions
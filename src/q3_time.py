@@ -1,19 +1,46 @@
 import duckdb
 import logging
-from typing import List, Tuple
+from typing import Iterable, List, Tuple, Union
+
+from utils import duckdb_pool
+from utils.filters import DateInput, resolve_filter
+from utils.inputs import FileInput, resolve_input
+from utils.instrumentation import duckdb_profile, instrumented, stage
+from utils.resource_profiles import ResourceProfile, resolve_profile
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-def q3_time(file_path: str) -> List[Tuple[str, int]]:
+@instrumented
+def q3_time(
+    file_path: FileInput,
+    profile: Union[str, ResourceProfile, None] = None,
+    n: int = 10,
+    start_date: DateInput = None,
+    end_date: DateInput = None,
+    usernames: Union[str, Iterable[str], None] = None
+) -> List[Tuple[str, int]]:
     """
-    Processes a Parquet file to identify the top 10 most mentioned users,
-    prioritizing execution time by flattening and counting mentions in a single query.
+    Processes a Parquet file to identify the top `n` most mentioned users,
+    prioritizing execution time by flattening and counting mentions in a single query
+    on a pooled cursor of the shared DuckDB database. Multi-file inputs are scanned
+    in parallel by DuckDB. The date and username filters select the tweets whose
+    mentions are counted and are pushed down to the Parquet scan.
 
     Parameters
     ----------
-    file_path : str
-        Path to the Parquet file.
+    file_path : FileInput
+        Path to the Parquet file, or a glob, directory or list of them.
+    profile : str or ResourceProfile, optional
+        DuckDB resource profile, see `utils.resource_profiles` (default is 'latency').
+    n : int, optional
+        Number of users to return (default is 10).
+    start_date : datetime.date or str, optional
+        First day of the tweets considered (default is no lower bound).
+    end_date : datetime.date or str, optional
+        Last day of the tweets considered (default is no upper bound).
+    usernames : str or Iterable[str], optional
+        Only count the mentions made by these users (default is every user).
 
     Returns
     -------
@@ -26,6 +53,8 @@ def q3_time(file_path: str) -> List[Tuple[str, int]]:
     ------
     FileNotFoundError
         If the specified file does not exist.
+    ValueError
+        If `start_date` is after `end_date`.
     duckdb.BinderException
         If there is an error in the Parquet file structure or SQL query.
     Exception
@@ -34,23 +63,28 @@ def q3_time(file_path: str) -> List[Tuple[str, int]]:
     try:
         logger.info(f"Starting processing for file: {file_path}")
 
-        with duckdb.connect(database=':memory:') as con:
-            query = """
+        resources = resolve_profile(profile, 'latency')
+        tweet_filter = resolve_filter(start_date, end_date, usernames)
+        with duckdb_pool.connection(**resources.settings()) as con:
+            query = f"""
             SELECT 
                 mentioned_user AS username,
                 COUNT(*) AS mention_count
             FROM (
                 SELECT 
                     UNNEST(mentionedUsers) AS mentioned_user
-                FROM read_parquet(?)
-                WHERE mentionedUsers IS NOT NULL
+                FROM read_parquet(?, union_by_name = true)
+                WHERE mentionedUsers IS NOT NULL AND {tweet_filter.sql_predicate()}
             )
             GROUP BY username
             ORDER BY mention_count DESC, username ASC
-            LIMIT 10;
+            LIMIT {int(n)};
             """
 
-            results = con.execute(query, [file_path]).fetchall()
+            with stage('plan'):
+                file_paths = resolve_input(file_path)
+            with stage('query'), duckdb_profile(con):
+                results = con.execute(query, [file_paths]).fetchall()
 
         logger.info("Processing completed successfully")
         return results
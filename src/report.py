@@ -0,0 +1,133 @@
+import pyarrow.parquet as pq
+import logging
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+from utils.aggregation import (
+    QUESTIONS,
+    TweetAggregates,
+    top_answers,
+    update_date_user_counts,
+    update_emoji_counts,
+    update_mention_counts,
+)
+from utils.filters import DateInput, TweetFilter, resolve_filter
+from utils.inputs import FileInput, open_parquet, resolve_input
+from utils.instrumentation import add_rows, instrumented, stage
+from utils.jobs import PROGRESS_INTERVAL, ProgressCallback
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+COLUMNS = ['date', 'username', 'content', 'mentionedUsers']
+
+def update_aggregates_from_batch(batch, aggregates: TweetAggregates) -> None:
+    """
+    Feeds one decoded batch to the q1, q2 and q3 aggregations.
+
+    Parameters
+    ----------
+    batch : RecordBatch or Table
+        Batch containing the 'date', 'username', 'content' and 'mentionedUsers' columns.
+    aggregates : TweetAggregates
+        Aggregates to update.
+    """
+    update_date_user_counts(batch, aggregates)
+    update_emoji_counts(batch, aggregates)
+    update_mention_counts(batch, aggregates)
+
+@instrumented
+def report(
+    file_path: FileInput,
+    n: int = 10,
+    start_date: DateInput = None,
+    end_date: DateInput = None,
+    usernames: Union[str, Iterable[str], None] = None,
+    progress: Optional[ProgressCallback] = None,
+    memory_map: Optional[bool] = None
+) -> Dict[str, List[Tuple]]:
+    """
+    Answers q1, q2 and q3 from a single scan of the Parquet files of tweets.
+
+    Each row group is read and decoded once, and the same batch feeds the
+    date/username aggregation, the emoji counter and the mention counter.
+    Multi-file inputs are scanned one file after the other, and row groups whose
+    statistics cannot match the date and username filters are skipped. Every
+    PROGRESS_INTERVAL row groups, the rows read and the three answers so far are
+    reported to `progress`.
+
+    Parameters
+    ----------
+    file_path : FileInput
+        Path to the Parquet file, or a glob, directory or list of them.
+    n : int, optional
+        Number of items per answer (default is 10).
+    start_date : datetime.date or str, optional
+        First day of the tweets considered (default is no lower bound).
+    end_date : datetime.date or str, optional
+        Last day of the tweets considered (default is no upper bound).
+    usernames : str or Iterable[str], optional
+        Only consider the tweets of these users (default is every user).
+    progress : ProgressCallback, optional
+        Receives the progress of the scan, see `utils.jobs.ProgressCallback`
+        (default is no reports).
+    memory_map : bool, optional
+        Whether to memory-map the Parquet files instead of reading them into
+        buffers, see `utils.inputs.open_parquet` (default is the
+        PARQUET_MEMORY_MAP setting).
+
+    Returns
+    -------
+    Dict[str, List[Tuple]]
+        A dictionary containing:
+            - 'q1': Top `n` dates with the user with most tweets on each, as in `q1_time`.
+            - 'q2': Top `n` emojis with their counts, as in `q2_time`.
+            - 'q3': Top `n` most mentioned users with their counts, as in `q3_time`.
+
+    Raises
+    ------
+    FileNotFoundError
+        If the specified file does not exist.
+    ValueError
+        If `start_date` is after `end_date`.
+    Exception
+        If an unexpected error occurs during processing.
+    """
+    try:
+        logger.info(f"Starting single-pass report for file: {file_path}")
+        tweet_filter = resolve_filter(start_date, end_date, usernames)
+        aggregates = TweetAggregates()
+        file_paths = resolve_input(file_path)
+        total_rows = None
+        if progress is not None:
+            with stage('plan'):
+                total_rows = sum(_row_group_rows(pq.ParquetFile(path), tweet_filter) for path in file_paths)
+
+        processed_rows = processed_row_groups = 0
+        for path in file_paths:
+            parquet_file = open_parquet(path, memory_map)
+            for row_group in tweet_filter.row_groups(parquet_file):
+                with stage('read'):
+                    batch = parquet_file.read_row_group(row_group, columns=COLUMNS)
+                add_rows(batch.num_rows, batch.nbytes)
+                with stage('filter'):
+                    filtered = tweet_filter.apply(batch)
+                with stage('aggregate'):
+                    update_aggregates_from_batch(filtered, aggregates)
+
+                processed_rows += batch.num_rows
+                processed_row_groups += 1
+                if progress is not None and processed_row_groups % PROGRESS_INTERVAL == 0:
+                    progress({'rows': processed_rows, 'total_rows': total_rows,
+                              'partial': top_answers(aggregates, QUESTIONS, n)})
+
+        logger.info("Processing completed successfully")
+        with stage('rank'):
+            return top_answers(aggregates, QUESTIONS, n)
+
+    except Exception as e:
+        logger.error(f"Error during processing: {e}")
+        raise
+
+def _row_group_rows(parquet_file: pq.ParquetFile, tweet_filter: TweetFilter) -> int:
+    metadata = parquet_file.metadata
+    return sum(metadata.row_group(row_group).num_rows for row_group in tweet_filter.row_groups(parquet_file))
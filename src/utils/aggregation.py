@@ -0,0 +1,248 @@
+import pyarrow as pa
+import pyarrow.compute as pc
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import date
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from utils.emoji_counter import count_emojis
+
+@dataclass
+class TweetAggregates:
+    """
+    Counters backing the three challenge questions, filled from decoded batches.
+
+    Attributes
+    ----------
+    date_counts : Counter
+        Number of tweets per day (q1).
+    date_user_counts : Counter
+        Number of tweets per (day, username) pair (q1).
+    emoji_counts : Counter
+        Number of occurrences per emoji, in first-seen order (q2).
+    mention_counts : Counter
+        Number of mentions per username (q3).
+    """
+    date_counts: Counter = field(default_factory=Counter)
+    date_user_counts: Counter = field(default_factory=Counter)
+    emoji_counts: Counter = field(default_factory=Counter)
+    mention_counts: Counter = field(default_factory=Counter)
+
+def update_date_user_counts(batch, aggregates: TweetAggregates) -> None:
+    """
+    Updates the per-day and per-(day, username) counters with a batch of tweets.
+
+    Rows without a date are ignored, as they can never be part of the q1 answer.
+
+    Parameters
+    ----------
+    batch : RecordBatch or Table
+        Batch containing the 'date' and 'username' columns.
+    aggregates : TweetAggregates
+        Aggregates to update.
+    """
+    days = pc.cast(batch['date'], pa.date32())
+    grouped = pa.table({'tweet_date': days, 'username': batch['username']}) \
+        .group_by(['tweet_date', 'username']) \
+        .aggregate([('tweet_date', 'count')])
+
+    for tweet_date, username, tweet_count in zip(grouped['tweet_date'].to_pylist(),
+                                                 grouped['username'].to_pylist(),
+                                                 grouped['tweet_date_count'].to_pylist()):
+        if tweet_date is None:
+            continue
+        aggregates.date_counts[tweet_date] += tweet_count
+        aggregates.date_user_counts[(tweet_date, username)] += tweet_count
+
+def update_emoji_counts(batch, aggregates: TweetAggregates) -> None:
+    """
+    Updates the emoji counter with the 'content' column of a batch of tweets.
+
+    Parameters
+    ----------
+    batch : RecordBatch or Table
+        Batch containing the 'content' column.
+    aggregates : TweetAggregates
+        Aggregates to update.
+    """
+    count_emojis(batch['content'], aggregates.emoji_counts)
+
+def update_mention_counts(batch, aggregates: TweetAggregates) -> None:
+    """
+    Updates the mention counter with the 'mentionedUsers' column of a batch of tweets.
+
+    Parameters
+    ----------
+    batch : RecordBatch or Table
+        Batch containing the 'mentionedUsers' column.
+    aggregates : TweetAggregates
+        Aggregates to update.
+    """
+    mentions = pc.drop_null(pc.list_flatten(batch['mentionedUsers']))
+    if len(mentions) == 0:
+        return
+
+    counts = pc.value_counts(mentions)
+    for username, mention_count in zip(counts.field('values').to_pylist(),
+                                       counts.field('counts').to_pylist()):
+        aggregates.mention_counts[username] += mention_count
+
+# Columns each question reads and the function aggregating them.
+QUESTIONS: Dict[str, Tuple[List[str], Callable]] = {
+    'q1': (['date', 'username'], update_date_user_counts),
+    'q2': (['content'], update_emoji_counts),
+    'q3': (['mentionedUsers'], update_mention_counts),
+}
+
+def top_dates_with_users(aggregates: TweetAggregates, n: int = 10) -> List[Tuple[date, str]]:
+    """
+    Ranks the days with the most tweets and, for each one, the user with the most tweets.
+
+    Days are ordered by tweet count descending and date ascending; users are
+    ordered by tweet count descending and username ascending, as in `q1_time`.
+
+    Parameters
+    ----------
+    aggregates : TweetAggregates
+        Aggregates with the per-day and per-(day, username) counters filled.
+    n : int, optional
+        Number of days to return (default is 10).
+
+    Returns
+    -------
+    List[Tuple[date, str]]
+        A list of tuples containing:
+            - Date (date)
+            - Username (str) with the highest number of tweets on that date.
+    """
+    top_dates = sorted(aggregates.date_counts.items(), key=lambda item: (-item[1], item[0]))[:n]
+
+    best_users = {tweet_date: None for tweet_date, _ in top_dates}
+    for (tweet_date, username), tweet_count in aggregates.date_user_counts.items():
+        if tweet_date not in best_users:
+            continue
+        best = best_users[tweet_date]
+        if best is None or _user_rank_key(username, tweet_count) < _user_rank_key(*best):
+            best_users[tweet_date] = (username, tweet_count)
+
+    return [(tweet_date, best_users[tweet_date][0]) for tweet_date, _ in top_dates]
+
+def top_counts(counter: Counter, n: int = 10) -> List[Tuple[str, int]]:
+    """
+    Returns the `n` keys with the highest counts, breaking ties by key ascending.
+
+    Parameters
+    ----------
+    counter : Counter
+        Counter to rank.
+    n : int, optional
+        Number of items to return (default is 10).
+
+    Returns
+    -------
+    List[Tuple[str, int]]
+        A list of tuples containing:
+            - Key (str)
+            - Count (int)
+    """
+    return sorted(counter.items(), key=lambda item: (-item[1], item[0]))[:n]
+
+def merge_aggregates(parts: Iterable[TweetAggregates]) -> TweetAggregates:
+    """
+    Merges partial aggregates, e.g. of several files or row group ranges, into one.
+
+    Parts must be given in file order: emojis keep the order in which they were
+    first seen, so the q2 ties are broken as in a sequential scan.
+
+    Parameters
+    ----------
+    parts : Iterable[TweetAggregates]
+        Partial aggregates, in file order.
+
+    Returns
+    -------
+    TweetAggregates
+        The merged aggregates.
+    """
+    merged = TweetAggregates()
+    for part in parts:
+        merged.date_counts.update(part.date_counts)
+        merged.date_user_counts.update(part.date_user_counts)
+        merged.emoji_counts.update(part.emoji_counts)
+        merged.mention_counts.update(part.mention_counts)
+    return merged
+
+def aggregates_to_dict(aggregates: TweetAggregates) -> Dict[str, list]:
+    """
+    Converts aggregates to plain JSON-serializable lists, keeping their order.
+
+    Parameters
+    ----------
+    aggregates : TweetAggregates
+        Aggregates to convert.
+
+    Returns
+    -------
+    Dict[str, list]
+        One list of [key..., count] rows per counter, with dates in ISO format.
+    """
+    return {
+        'date_counts': [[day.isoformat(), count] for day, count in aggregates.date_counts.items()],
+        'date_user_counts': [[day.isoformat(), username, count]
+                             for (day, username), count in aggregates.date_user_counts.items()],
+        'emoji_counts': [[emoji, count] for emoji, count in aggregates.emoji_counts.items()],
+        'mention_counts': [[username, count] for username, count in aggregates.mention_counts.items()],
+    }
+
+def aggregates_from_dict(data: Dict[str, list]) -> TweetAggregates:
+    """
+    Rebuilds aggregates from the output of `aggregates_to_dict`.
+
+    Parameters
+    ----------
+    data : Dict[str, list]
+        Serialized aggregates.
+
+    Returns
+    -------
+    TweetAggregates
+        The aggregates.
+    """
+    aggregates = TweetAggregates()
+    for day, count in data['date_counts']:
+        aggregates.date_counts[date.fromisoformat(day)] = count
+    for day, username, count in data['date_user_counts']:
+        aggregates.date_user_counts[(date.fromisoformat(day), username)] = count
+    for emoji, count in data['emoji_counts']:
+        aggregates.emoji_counts[emoji] = count
+    for username, count in data['mention_counts']:
+        aggregates.mention_counts[username] = count
+    return aggregates
+
+def top_answers(aggregates: TweetAggregates, questions: Iterable[str], n: int = 10) -> Dict[str, List[Tuple]]:
+    """
+    Computes the top-n answer of each question from the aggregates.
+
+    Parameters
+    ----------
+    aggregates : TweetAggregates
+        Aggregates with the counters of the questions filled.
+    questions : Iterable[str]
+        Questions to answer, among 'q1', 'q2' and 'q3'.
+    n : int, optional
+        Number of items per answer (default is 10).
+
+    Returns
+    -------
+    Dict[str, List[Tuple]]
+        The answer of each question, as in `q1_time`, `q2_time` and `q3_time`.
+    """
+    answers = {
+        'q1': lambda: top_dates_with_users(aggregates, n),
+        'q2': lambda: aggregates.emoji_counts.most_common(n),
+        'q3': lambda: top_counts(aggregates.mention_counts, n),
+    }
+    return {question: answers[question]() for question in questions}
+
+def _user_rank_key(username: Optional[str], tweet_count: int) -> Tuple[int, bool, str]:
+    return -tweet_count, username is None, username or ''
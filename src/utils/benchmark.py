@@ -0,0 +1,477 @@
+import argparse
+import datetime
+import importlib
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import queue as queue_module
+import resource
+import statistics
+import sys
+import time
+import emoji
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from utils.data_conversion import DEFAULT_ROW_GROUP_SIZE, SCHEMA
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+SCALES = {
+   '10k': 10_000,
+   '100k': 100_000,
+   '1m': 1_000_000,
+   '10m': 10_000_000,
+   '100m': 100_000_000,
+}
+
+# Module and function of each benchmarked implementation.
+IMPLEMENTATIONS = {
+   'q1_time': ('q1_time', 'q1_time'),
+   'q1_memory': ('q1_memory', 'q1_memory'),
+   'q2_time': ('q2_time', 'q2_time'),
+   'q2_memory': ('q2_memory', 'q2_memory'),
+   'q3_time': ('q3_time', 'q3_time'),
+   'q3_memory': ('q3_memory', 'q3_memory'),
+}
+
+# Metrics checked for regressions, by variant: the "time" variants must not get
+# slower and the "memory" variants must not grow their peak memory.
+REGRESSION_METRICS = {
+   'time': ['wall_time', 'cpu_time'],
+   'memory': ['wall_time', 'peak_rss_mb'],
+}
+
+DEFAULT_THRESHOLD = 0.10
+
+_POOL_SIZE = 4096
+_GENERATION_BATCH = 1_000_000
+_FIRST_DAY = datetime.datetime(2021, 2, 12)
+_WORDS = ['farmers', 'protest', 'india', 'support', 'delhi', 'government', 'news', 'today', 'stand', 'with']
+
+def parse_scale(scale: str) -> int:
+   """
+   Converts a scale name such as '10k' or '2m', or a plain number, to a row count.
+
+   Parameters
+   ----------
+   scale : str
+       Name of the scale.
+
+   Returns
+   -------
+   int
+       Number of rows.
+
+   Raises
+   ------
+   ValueError
+       If the scale is not a number with an optional 'k' or 'm' suffix.
+   """
+   scale = scale.strip().lower()
+   if scale in SCALES:
+       return SCALES[scale]
+   multiplier = {'k': 1_000, 'm': 1_000_000}.get(scale[-1:], 1)
+   digits = scale[:-1] if multiplier > 1 else scale
+   if not digits.replace('_', '').isdigit():
+       raise ValueError(f"Invalid scale {scale!r}, expected e.g. '10k' or '100m'")
+   return int(digits) * multiplier
+
+def generate_dataset(
+   output_path: str,
+   num_rows: int,
+   emoji_density: float = 0.5,
+   mention_density: float = 0.5,
+   num_users: Optional[int] = None,
+   num_days: int = 30,
+   seed: int = 0,
+   row_group_size: int = DEFAULT_ROW_GROUP_SIZE
+) -> str:
+   """
+   Writes a synthetic Parquet file of tweets with the schema of `data_conversion.SCHEMA`.
+
+   Users and mentioned users follow a Zipf distribution, so a few accounts
+   dominate as in real data, and days get random weights. Contents and mention
+   lists are drawn from pools of a few thousand values built once, so millions
+   of rows are generated with vectorized `take`s. The same arguments always
+   produce the same file.
+
+   Parameters
+   ----------
+   output_path : str
+       Path of the Parquet file to write.
+   num_rows : int
+       Number of tweets.
+   emoji_density : float, optional
+       Average number of emojis per tweet (default is 0.5).
+   mention_density : float, optional
+       Average number of mentioned users per tweet (default is 0.5).
+   num_users : int, optional
+       Number of distinct users (default is one per 20 tweets, at least 10).
+   num_days : int, optional
+       Number of days the tweets are spread over (default is 30).
+   seed : int, optional
+       Seed of the random generator (default is 0).
+   row_group_size : int, optional
+       Number of rows per row group (default is 100000).
+
+   Returns
+   -------
+   str
+       The path of the written file.
+   """
+   rng = np.random.default_rng(seed)
+   num_users = num_users or max(10, num_rows // 20)
+   usernames = pa.array([f'user{index}' for index in range(num_users)])
+   emojis = sorted(emoji.EMOJI_DATA)
+
+   def zipf_indices(size: int, upper: int) -> np.ndarray:
+       return (rng.zipf(1.3, size) - 1) % upper
+
+   contents = pa.array([
+       ' '.join(list(rng.choice(_WORDS, rng.integers(3, 12)))
+                + [emojis[index] for index in zipf_indices(rng.poisson(emoji_density), len(emojis))])
+       for _ in range(_POOL_SIZE)
+   ])
+   mentions = pa.array([
+       [f'user{index}' for index in zipf_indices(rng.poisson(mention_density), num_users)]
+       for _ in range(_POOL_SIZE)
+   ], type=pa.list_(pa.string()))
+   day_weights = rng.random(num_days)
+   day_weights /= day_weights.sum()
+
+   os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+   with pq.ParquetWriter(output_path, SCHEMA) as writer:
+       for offset in range(0, num_rows, _GENERATION_BATCH):
+           size = min(_GENERATION_BATCH, num_rows - offset)
+           seconds = rng.choice(num_days, size, p=day_weights) * 86_400 + rng.integers(0, 86_400, size)
+           dates = np.datetime64(_FIRST_DAY, 'ms') + seconds.astype('timedelta64[s]')
+           batch = pa.Table.from_arrays([
+               pa.array(dates.astype('datetime64[ms]'), type=pa.timestamp('ms')),
+               usernames.take(pa.array(zipf_indices(size, num_users))),
+               contents.take(pa.array(rng.integers(0, _POOL_SIZE, size))),
+               mentions.take(pa.array(rng.integers(0, _POOL_SIZE, size))),
+           ], schema=SCHEMA)
+           writer.write_table(batch, row_group_size=row_group_size)
+
+   logger.info(f"Generated {num_rows:,} tweets in {output_path}")
+   return output_path
+
+def _process_tree() -> List[str]:
+   pids = [str(os.getpid())]
+   for pid in pids:
+       try:
+           for task in os.listdir(f'/proc/{pid}/task'):
+               with open(f'/proc/{pid}/task/{task}/children') as file:
+                   pids.extend(file.read().split())
+       except OSError:
+           continue
+   return pids
+
+def _tree_counters() -> Tuple[float, Optional[int]]:
+   # CPU seconds and bytes read of this process and its live children, e.g. the
+   # worker pool of q2_time; bytes are None where /proc is not available.
+   cpu_time = time.process_time()
+   bytes_read: Optional[int] = None
+   ticks = os.sysconf('SC_CLK_TCK') if hasattr(os, 'sysconf') else 100
+   for pid in _process_tree():
+       try:
+           if pid != str(os.getpid()):
+               with open(f'/proc/{pid}/stat') as file:
+                   fields = file.read().rsplit(')', 1)[1].split()
+               cpu_time += (int(fields[11]) + int(fields[12])) / ticks
+           with open(f'/proc/{pid}/io') as file:
+               counters = dict(line.split(': ') for line in file.read().splitlines())
+           bytes_read = (bytes_read or 0) + int(counters['rchar'])
+       except (OSError, KeyError, IndexError, ValueError):
+           continue
+   return cpu_time, bytes_read
+
+def _peak_rss_mb() -> float:
+   # Sum of the peak resident sets of this process and its live children. VmHWM
+   # is used where available because ru_maxrss survives the exec of a spawned
+   # process and would report the peak of the parent.
+   peak_kb = 0
+   for pid in _process_tree():
+       try:
+           with open(f'/proc/{pid}/status') as file:
+               peak_kb += next(int(line.split()[1]) for line in file if line.startswith('VmHWM:'))
+       except (OSError, StopIteration, IndexError, ValueError):
+           continue
+   return (peak_kb or resource.getrusage(resource.RUSAGE_SELF).ru_maxrss) / 1024
+
+def _measure(implementation: str, file_path: str, warmup: bool, queue) -> None:
+   try:
+       module_name, function_name = IMPLEMENTATIONS[implementation]
+       function = getattr(importlib.import_module(module_name), function_name)
+       if warmup:
+           function(file_path)
+
+       cpu_start, read_start = _tree_counters()
+       wall_start = time.perf_counter()
+       result = function(file_path)
+       wall_time = time.perf_counter() - wall_start
+       cpu_end, read_end = _tree_counters()
+
+       queue.put({
+           'wall_time': wall_time,
+           'cpu_time': cpu_end - cpu_start,
+           'peak_rss_mb': _peak_rss_mb(),
+           'bytes_read': read_end - read_start if read_start is not None and read_end is not None else None,
+           'num_results': len(result),
+       })
+   except Exception as e:
+       queue.put({'error': f'{type(e).__name__}: {e}'})
+
+def run_once(implementation: str, file_path: str, warmup: bool = True, timeout: float = 3600) -> Dict:
+   """
+   Runs one implementation on a file in a fresh process and measures it.
+
+   A new process per run keeps the peak memory of a run independent of the
+   previous ones. With `warmup`, the function is called once before the measured
+   call, so worker pools, DuckDB databases and the page cache are warm, as in the
+   API.
+
+   Parameters
+   ----------
+   implementation : str
+       Name of the implementation in IMPLEMENTATIONS.
+   file_path : str
+       Path to the Parquet file.
+   warmup : bool, optional
+       Whether to call the function once before measuring (default is True).
+   timeout : float, optional
+       Maximum number of seconds for the run (default is 3600).
+
+   Returns
+   -------
+   Dict
+       'wall_time' and 'cpu_time' in seconds (CPU time includes the worker
+       processes), 'peak_rss_mb' of the process and its workers, 'bytes_read' through read
+       calls by the process and its workers (None if not available) and
+       'num_results'.
+
+   Raises
+   ------
+   RuntimeError
+       If the implementation fails or does not finish within `timeout`.
+   """
+   context = multiprocessing.get_context('spawn')
+   queue = context.Queue()
+   process = context.Process(target=_measure, args=(implementation, file_path, warmup, queue))
+   process.start()
+   deadline = time.monotonic() + timeout
+   try:
+       while True:
+           try:
+               measurement = queue.get(timeout=1)
+               break
+           except queue_module.Empty:
+               if not process.is_alive():
+                   raise RuntimeError(f"{implementation} exited with code {process.exitcode} without a result")
+               if time.monotonic() > deadline:
+                   raise RuntimeError(f"{implementation} did not finish within {timeout} seconds")
+   finally:
+       if process.is_alive() and time.monotonic() > deadline:
+           process.kill()
+       process.join()
+
+   if 'error' in measurement:
+       raise RuntimeError(f"{implementation} failed: {measurement['error']}")
+   return measurement
+
+def summarize(runs: List[Dict]) -> Dict:
+   """
+   Summarizes the runs of an implementation: medians of the times and bytes read,
+   and the largest peak memory.
+
+   Parameters
+   ----------
+   runs : List[Dict]
+       Measurements returned by `run_once`.
+
+   Returns
+   -------
+   Dict
+       The summary metrics and the individual runs.
+   """
+   bytes_read = [run['bytes_read'] for run in runs if run['bytes_read'] is not None]
+   return {
+       'wall_time': statistics.median(run['wall_time'] for run in runs),
+       'cpu_time': statistics.median(run['cpu_time'] for run in runs),
+       'peak_rss_mb': max(run['peak_rss_mb'] for run in runs),
+       'bytes_read': statistics.median(bytes_read) if bytes_read else None,
+       'runs': runs,
+   }
+
+def run_benchmarks(
+   datasets: Dict[str, str],
+   implementations: Sequence[str] = tuple(IMPLEMENTATIONS),
+   repeat: int = 3,
+   warmup: bool = True
+) -> Dict:
+   """
+   Runs every implementation `repeat` times on every dataset.
+
+   Parameters
+   ----------
+   datasets : Dict[str, str]
+       Path to the Parquet file of each scale name.
+   implementations : Sequence[str], optional
+       Names of the implementations to run (default is all of them).
+   repeat : int, optional
+       Number of measured runs per implementation and dataset (default is 3).
+   warmup : bool, optional
+       Whether each run calls the function once before measuring (default is True).
+
+   Returns
+   -------
+   Dict
+       'metadata' about the machine and 'results', the summary of each
+       implementation for each scale, see `summarize`.
+   """
+   results: Dict[str, Dict[str, Dict]] = {}
+   for scale, file_path in datasets.items():
+       results[scale] = {}
+       for implementation in implementations:
+           runs = []
+           for _ in range(repeat):
+               runs.append(run_once(implementation, file_path, warmup))
+           results[scale][implementation] = summarize(runs)
+           logger.info(f"{scale} {implementation}: {results[scale][implementation]['wall_time']:.3f}s")
+
+   return {
+       'metadata': {
+           'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+           'python': sys.version.split()[0],
+           'platform': platform.platform(),
+           'cpu_count': multiprocessing.cpu_count(),
+           'repeat': repeat,
+           'warmup': warmup,
+           'datasets': dict(datasets),
+       },
+       'results': results,
+   }
+
+def save_results(results: Dict, output_path: str) -> None:
+   """
+   Writes benchmark results as JSON.
+
+   Parameters
+   ----------
+   results : Dict
+       Results returned by `run_benchmarks`.
+   output_path : str
+       Path of the JSON file.
+   """
+   os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+   with open(output_path, 'w') as file:
+       json.dump(results, file, indent=2)
+
+def load_results(input_path: str) -> Dict:
+   """
+   Reads benchmark results written by `save_results`.
+
+   Parameters
+   ----------
+   input_path : str
+       Path of the JSON file.
+
+   Returns
+   -------
+   Dict
+       The results.
+   """
+   with open(input_path) as file:
+       return json.load(file)
+
+def compare_to_baseline(current: Dict, baseline: Dict, threshold: float = DEFAULT_THRESHOLD) -> List[Dict]:
+   """
+   Finds the metrics that got worse than the baseline by more than `threshold`.
+
+   Only the scales and implementations present in both results are compared, on
+   the metrics of REGRESSION_METRICS for their variant.
+
+   Parameters
+   ----------
+   current : Dict
+       Results of the change being evaluated.
+   baseline : Dict
+       Results of the reference version.
+   threshold : float, optional
+       Allowed relative increase, e.g. 0.1 for 10% (default is 0.1).
+
+   Returns
+   -------
+   List[Dict]
+       One entry per regression with its 'scale', 'implementation', 'metric',
+       'baseline' and 'current' values and relative 'change'.
+   """
+   regressions = []
+   for scale, implementations in current['results'].items():
+       for implementation, summary in implementations.items():
+           reference = baseline['results'].get(scale, {}).get(implementation)
+           if reference is None:
+               continue
+           for metric in REGRESSION_METRICS[implementation.rsplit('_', 1)[-1]]:
+               before, after = reference.get(metric), summary.get(metric)
+               if not before or after is None:
+                   continue
+               change = after / before - 1
+               if change > threshold:
+                   regressions.append({
+                       'scale': scale,
+                       'implementation': implementation,
+                       'metric': metric,
+                       'baseline': before,
+                       'current': after,
+                       'change': change,
+                   })
+   return regressions
+
+def _dataset_path(data_dir: str, scale: str, emoji_density: float, mention_density: float) -> str:
+   return os.path.join(data_dir, f'tweets_{scale}_e{emoji_density:g}_m{mention_density:g}.parquet')
+
+if __name__ == '__main__':
+   parser = argparse.ArgumentParser(description='Benchmarks the q1, q2 and q3 implementations on synthetic data.')
+   parser.add_argument('--scales', nargs='+', default=['10k', '100k', '1m'],
+                       help=f"Dataset sizes, e.g. {' '.join(SCALES)}")
+   parser.add_argument('--implementations', nargs='+', default=list(IMPLEMENTATIONS), choices=list(IMPLEMENTATIONS))
+   parser.add_argument('--repeat', type=int, default=3)
+   parser.add_argument('--no-warmup', action='store_true', help='Measure cold runs')
+   parser.add_argument('--emoji-density', type=float, default=0.5, help='Average emojis per tweet')
+   parser.add_argument('--mention-density', type=float, default=0.5, help='Average mentions per tweet')
+   parser.add_argument('--data-dir', default=os.path.join('data', 'benchmark'))
+   parser.add_argument('--output', default=os.path.join('benchmarks', 'results.json'))
+   parser.add_argument('--baseline', default=None, help='Results JSON to compare against')
+   parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD)
+   args = parser.parse_args()
+
+   datasets = {}
+   for scale in args.scales:
+       path = _dataset_path(args.data_dir, scale, args.emoji_density, args.mention_density)
+       if not os.path.exists(path):
+           generate_dataset(path, parse_scale(scale), args.emoji_density, args.mention_density)
+       datasets[scale] = path
+
+   results = run_benchmarks(datasets, args.implementations, args.repeat, not args.no_warmup)
+   save_results(results, args.output)
+
+   print(f"{'scale':<8} {'implementation':<12} {'wall (s)':>10} {'cpu (s)':>10} {'peak RSS (MB)':>14} {'read (MB)':>10}")
+   for scale, implementations in results['results'].items():
+       for implementation, summary in implementations.items():
+           read = f"{summary['bytes_read'] / 2 ** 20:.1f}" if summary['bytes_read'] is not None else '-'
+           print(f"{scale:<8} {implementation:<12} {summary['wall_time']:>10.3f} {summary['cpu_time']:>10.3f} "
+                 f"{summary['peak_rss_mb']:>14.1f} {read:>10}")
+
+   if args.baseline:
+       regressions = compare_to_baseline(results, load_results(args.baseline), args.threshold)
+       for regression in regressions:
+           print(f"REGRESSION {regression['scale']} {regression['implementation']} {regression['metric']}: "
+                 f"{regression['baseline']:.3f} -> {regression['current']:.3f} ({regression['change']:+.1%})")
+       sys.exit(1 if regressions else 0)
@@ -1,19 +1,216 @@
+import duckdb
+import multiprocessing
+import os
+import shutil
+import tempfile
 import pyarrow as pa
 import pyarrow.parquet as pq
-import jsonlines
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
+from typing import Iterator, List, Optional, Tuple
 
-def extract_relevant_data(file_path: str, output_parquet_path: str):
+from utils.emoji_counter import EMOJIS_COLUMN, emoji_lists
+
+try:
+   import orjson
+
+   _loads = orjson.loads
+except ImportError:
+   import json
+
+   _loads = json.loads
+
+SCHEMA = pa.schema([
+   ('date', pa.timestamp('ms')),
+   ('username', pa.string()),
+   ('content', pa.string()),
+   ('mentionedUsers', pa.list_(pa.string()))
+])
+
+# Optional column with the emojis of each tweet, precomputed once at ingest time
+# so q2 does not have to tokenize the contents on every query.
+EMOJI_SCHEMA = SCHEMA.append(pa.field(EMOJIS_COLUMN, pa.list_(pa.string())))
+
+DEFAULT_ROW_GROUP_SIZE = 100_000
+
+LAYOUTS = ('default', 'sorted', 'partitioned')
+
+def parse_date(date_str: Optional[str]) -> Optional[datetime]:
+   """
+   Parses an ISO 8601 tweet date, returning None when it is missing or invalid.
+
+   Parameters
+   ----------
+   date_str : str, optional
+       Date as found in the JSONL file, e.g. '2021-02-24T09:23:35+00:00'.
+
+   Returns
+   -------
+   datetime, optional
+       The parsed date, or None.
+   """
+   try:
+       return datetime.fromisoformat(date_str.replace('Z', '+00:00')) if date_str else None
+   except (ValueError, TypeError, AttributeError):
+       return None
+
+# How each SCHEMA column is projected out of a parsed JSON tweet.
+_FIELD_EXTRACTORS = {
+   'date': lambda obj: parse_date(obj.get('date')),
+   'username': lambda obj: (obj.get('user') or {}).get('username', ''),
+   'content': lambda obj: obj.get('content', ''),
+   'mentionedUsers': lambda obj: [user.get('username', '') for user in (obj.get('mentionedUsers') or [])],
+}
+
+def iter_record_batches(
+   file_path: str,
+   batch_size: int = DEFAULT_ROW_GROUP_SIZE,
+   columns: Optional[List[str]] = None
+) -> Iterator[pa.RecordBatch]:
+   """
+   Streams a JSONL file of tweets as Arrow record batches with the relevant columns.
+
+   Only `batch_size` rows are held in memory at a time, so memory stays constant
+   regardless of the size of the file. Blank lines are skipped.
+
+   Parameters
+   ----------
+   file_path : str
+       Path to the input JSONL file.
+   batch_size : int, optional
+       Number of rows per batch (default is 100000).
+   columns : List[str], optional
+       SCHEMA columns to project, in order (default is all of them).
+
+   Yields
+   ------
+   pa.RecordBatch
+       Batches with the requested columns among `date`, `username`, `content`
+       and `mentionedUsers`.
+
+   Raises
+   ------
+   ValueError
+       If a line of the file is not valid JSON.
+   KeyError
+       If a requested column is not part of SCHEMA.
+   OSError
+       If there are file access issues.
+   """
+   with open(file_path, 'rb') as file:
+       yield from iter_lines_as_batches(file, batch_size, columns)
+
+def iter_lines_as_batches(
+   lines,
+   batch_size: int = DEFAULT_ROW_GROUP_SIZE,
+   columns: Optional[List[str]] = None
+) -> Iterator[pa.RecordBatch]:
+   """
+   Parses an iterable of JSONL lines into Arrow record batches with the relevant columns.
+
+   Parameters
+   ----------
+   lines : Iterable[bytes]
+       JSON documents, one per line.
+   batch_size : int, optional
+       Number of rows per batch (default is 100000).
+   columns : List[str], optional
+       SCHEMA columns to project, in order (default is all of them).
+
+   Yields
+   ------
+   pa.RecordBatch
+       Batches with the requested columns among `date`, `username`, `content`
+       and `mentionedUsers`.
+
+   Raises
+   ------
+   ValueError
+       If a line is not valid JSON.
+   KeyError
+       If a requested column is not part of SCHEMA.
+   """
+   schema = SCHEMA if columns is None else pa.schema([SCHEMA.field(column) for column in columns])
+   extractors = [_FIELD_EXTRACTORS[name] for name in schema.names]
+   values: List[list] = [[] for _ in extractors]
+
+   for line in lines:
+       if not line.strip():
+           continue
+       obj = _loads(line)
+
+       for extractor, column_values in zip(extractors, values):
+           column_values.append(extractor(obj))
+
+       if len(values[0]) >= batch_size:
+           yield _to_record_batch(values, schema)
+           values = [[] for _ in extractors]
+
+   if values[0]:
+       yield _to_record_batch(values, schema)
+
+def _to_record_batch(values: List[list], schema: pa.Schema = SCHEMA) -> pa.RecordBatch:
+   return pa.RecordBatch.from_arrays([pa.array(column_values, type=field.type)
+                                      for column_values, field in zip(values, schema)],
+                                     schema=schema)
+
+def add_emoji_column(batch: pa.RecordBatch) -> pa.RecordBatch:
+   """
+   Appends the `emojis` column, extracted from `content` with the same semantics
+   as `emoji.emoji_list`, to a batch of tweets.
+
+   Parameters
+   ----------
+   batch : pa.RecordBatch
+       Batch with the SCHEMA columns.
+
+   Returns
+   -------
+   pa.RecordBatch
+       Batch with the EMOJI_SCHEMA columns.
+   """
+   return pa.RecordBatch.from_arrays(batch.columns + [emoji_lists(batch.column('content'))],
+                                     schema=EMOJI_SCHEMA)
+
+def _write_batches(batches: Iterator[pa.RecordBatch], output_parquet_path: str,
+                   row_group_size: int, with_emojis: bool) -> int:
+   num_rows = 0
+   with pq.ParquetWriter(output_parquet_path, EMOJI_SCHEMA if with_emojis else SCHEMA) as writer:
+       for batch in batches:
+           writer.write_batch(add_emoji_column(batch) if with_emojis else batch, row_group_size=row_group_size)
+           num_rows += batch.num_rows
+   return num_rows
+
+def extract_relevant_data(
+   file_path: str,
+   output_parquet_path: str,
+   row_group_size: int = DEFAULT_ROW_GROUP_SIZE,
+   layout: str = 'default',
+   with_emojis: bool = False
+):
    """
    Extracts relevant data from a JSONL file and converts it to a Parquet file format.
    The function processes date, username, content and mentioned users from each JSON entry.
 
+   The file is streamed: each `row_group_size` rows are parsed and written as a row
+   group through a `ParquetWriter`, so memory stays constant regardless of the size
+   of the input. Lines are parsed with orjson when it is installed.
+
    Parameters
    ----------
    file_path : str
        Path to the input JSONL file.
    output_parquet_path : str
-       Path where the output Parquet file will be saved.
+       Path where the output Parquet file (or directory, for the 'partitioned'
+       layout) will be saved.
+   row_group_size : int, optional
+       Number of rows per row group of the output file (default is 100000).
+   layout : str, optional
+       One of LAYOUTS: 'default' keeps the input order, 'sorted' and 'partitioned'
+       are rewritten with `write_layout` (default is 'default').
+   with_emojis : bool, optional
+       Whether to also write the precomputed `emojis` column, which q2 uses instead
+       of tokenizing `content` on every query (default is False).
 
    Returns
    -------
@@ -22,46 +219,244 @@ def extract_relevant_data(file_path: str, output_parquet_path: str):
 
    Raises
    ------
-   jsonlines.Error
-       If there is an error reading the JSONL file.
+   ValueError
+       If a line of the JSONL file is not valid JSON.
    pa.lib.ArrowInvalid
-       If there is an error creating the Arrow table or schema.
+       If there is an error creating the Arrow batches or schema.
    OSError
        If there are file access or writing permission issues.
-   ValueError
-       If the date format in the JSONL file is invalid.
    TypeError
        If the data types in the JSONL file don't match the expected schema.
    """
-   dates = []
-   usernames = []
-   contents = []
-   mentioned_users = []
-
-   with jsonlines.open(file_path) as reader:
-       for obj in reader:
-           date_str = obj.get('date')
-           try:
-               date = datetime.fromisoformat(date_str.replace('Z', '+00:00')) if date_str else None
-           except (ValueError, TypeError):
-               date = None
-           dates.append(date)
-
-           usernames.append(obj.get('user', {}).get('username', ''))
-           contents.append(obj.get('content', ''))
-           mentioned_users.append([user.get('username', '') for user in (obj.get('mentionedUsers') or [])])
-
-   schema = pa.schema([
-       ('date', pa.timestamp('ms')),
-       ('username', pa.string()),
-       ('content', pa.string()),
-       ('mentionedUsers', pa.list_(pa.string()))
-   ])
-
-   table = pa.Table.from_arrays([pa.array(dates, type=pa.timestamp('ms')),
-                                 pa.array(usernames, type=pa.string()),
-                                 pa.array(contents, type=pa.string()),
-                                 pa.array(mentioned_users, type=pa.list_(pa.string()))],
-                                schema=schema)
-
-   pq.write_table(table, output_parquet_path)
+   if layout not in LAYOUTS:
+       raise ValueError(f"Unknown layout {layout!r}, expected one of {LAYOUTS}")
+
+   if layout == 'default':
+       _write_batches(iter_record_batches(file_path, row_group_size), output_parquet_path,
+                      row_group_size, with_emojis)
+       return
+
+   output_dir = os.path.dirname(os.path.abspath(output_parquet_path))
+   with tempfile.NamedTemporaryFile(suffix='.parquet', dir=output_dir) as staging:
+       extract_relevant_data(file_path, staging.name, row_group_size, with_emojis=with_emojis)
+       write_layout(staging.name, output_parquet_path, layout, row_group_size)
+
+def write_layout(
+   input_parquet_path: str,
+   output_path: str,
+   layout: str,
+   row_group_size: int = DEFAULT_ROW_GROUP_SIZE,
+   memory_limit: str = '1GB'
+) -> None:
+   """
+   Rewrites a Parquet file of tweets in a layout optimized for date-based scans.
+
+   Rows are sorted by `date`, so the min/max statistics of each row group cover a
+   narrow range of days and readers can skip the row groups outside a date filter.
+   The 'partitioned' layout additionally writes one hive-style directory per day
+   ('day=YYYY-MM-DD'), so whole files can be skipped by path. Every column,
+   including the optional `emojis` column, is kept. Strings are
+   dictionary-encoded, which keeps the repetitive `username` column small. The
+   sort runs out of core in DuckDB, spilling to disk beyond `memory_limit`.
+
+   Parameters
+   ----------
+   input_parquet_path : str
+       Path to the Parquet file to rewrite.
+   output_path : str
+       Path of the output Parquet file ('sorted') or directory ('partitioned').
+   layout : str
+       Either 'sorted' or 'partitioned'.
+   row_group_size : int, optional
+       Number of rows per row group (default is 100000).
+   memory_limit : str, optional
+       Maximum memory DuckDB may use before spilling to disk (default is '1GB').
+
+   Raises
+   ------
+   ValueError
+       If the layout is not 'sorted' or 'partitioned'.
+   duckdb.Error
+       If there is an error reading or writing the files.
+   """
+   if layout not in ('sorted', 'partitioned'):
+       raise ValueError(f"Unknown layout {layout!r}, expected 'sorted' or 'partitioned'")
+
+   input_literal = "'{}'".format(input_parquet_path.replace("'", "''"))
+   output_literal = "'{}'".format(output_path.replace("'", "''"))
+   select = f"""
+   SELECT
+       * REPLACE (date::TIMESTAMP::TIMESTAMP_MS AS date)
+       {", strftime(date, '%Y-%m-%d') AS day" if layout == 'partitioned' else ''}
+   FROM read_parquet({input_literal})
+   ORDER BY date
+   """
+   options = f"FORMAT parquet, ROW_GROUP_SIZE {int(row_group_size)}"
+   if layout == 'partitioned':
+       options += ", PARTITION_BY (day), OVERWRITE_OR_IGNORE"
+
+   with duckdb.connect(database=':memory:') as con:
+       con.execute("PRAGMA memory_limit='{}';".format(memory_limit.replace("'", "''")))
+       con.execute(f"COPY ({select}) TO {output_literal} ({options});")
+
+def split_byte_ranges(file_path: str, num_ranges: int) -> List[Tuple[int, int]]:
+   """
+   Splits a file into contiguous byte ranges of similar size that start and end on
+   line boundaries.
+
+   Parameters
+   ----------
+   file_path : str
+       Path to the input JSONL file.
+   num_ranges : int
+       Maximum number of ranges to create.
+
+   Returns
+   -------
+   List[Tuple[int, int]]
+       Start (inclusive) and end (exclusive) offsets of each range, in file order.
+   """
+   file_size = os.path.getsize(file_path)
+   boundaries = [0]
+   with open(file_path, 'rb') as file:
+       for index in range(1, num_ranges):
+           file.seek(max(file_size * index // num_ranges - 1, boundaries[-1]))
+           file.readline()
+           boundary = file.tell()
+           if boundaries[-1] < boundary < file_size:
+               boundaries.append(boundary)
+   boundaries.append(file_size)
+   return [(start, end) for start, end in zip(boundaries, boundaries[1:]) if start < end]
+
+def read_byte_range(file_path: str, start: int, end: int) -> Iterator[bytes]:
+   """
+   Yields the lines of a file between two line-aligned byte offsets.
+
+   Parameters
+   ----------
+   file_path : str
+       Path to the input file.
+   start : int
+       Offset of the first line.
+   end : int
+       Offset where the range ends.
+
+   Yields
+   ------
+   bytes
+       Each line of the range.
+   """
+   with open(file_path, 'rb') as file:
+       file.seek(start)
+       position = start
+       while position < end:
+           line = file.readline()
+           if not line:
+               break
+           position += len(line)
+           yield line
+
+def convert_byte_range(
+   file_path: str,
+   start: int,
+   end: int,
+   output_parquet_path: str,
+   row_group_size: int = DEFAULT_ROW_GROUP_SIZE,
+   with_emojis: bool = False
+) -> int:
+   """
+   Converts a line-aligned byte range of a JSONL file into its own Parquet file.
+
+   Parameters
+   ----------
+   file_path : str
+       Path to the input JSONL file.
+   start : int
+       Offset of the first line of the range.
+   end : int
+       Offset where the range ends.
+   output_parquet_path : str
+       Path where the Parquet file of the range will be saved.
+   row_group_size : int, optional
+       Number of rows per row group (default is 100000).
+   with_emojis : bool, optional
+       Whether to also write the precomputed `emojis` column (default is False).
+
+   Returns
+   -------
+   int
+       Number of rows written.
+   """
+   batches = iter_lines_as_batches(read_byte_range(file_path, start, end), row_group_size)
+   return _write_batches(batches, output_parquet_path, row_group_size, with_emojis)
+
+def extract_relevant_data_parallel(
+   file_path: str,
+   output_path: str,
+   num_workers: Optional[int] = None,
+   row_group_size: int = DEFAULT_ROW_GROUP_SIZE,
+   partitioned: bool = False,
+   with_emojis: bool = False
+) -> int:
+   """
+   Converts a JSONL file to Parquet in parallel, parsing newline-aligned byte ranges
+   of the input in a process pool.
+
+   The output order is deterministic and matches `extract_relevant_data`: ranges are
+   numbered in file order and either kept as a dataset of part files or merged, in
+   that order, into a single Parquet file.
+
+   Parameters
+   ----------
+   file_path : str
+       Path to the input JSONL file.
+   output_path : str
+       Path of the output Parquet file or, if `partitioned`, of the output directory.
+   num_workers : int, optional
+       Number of worker processes (default is the number of CPUs).
+   row_group_size : int, optional
+       Number of rows per row group (default is 100000).
+   partitioned : bool, optional
+       Whether to write a directory with one 'part-NNNNN.parquet' file per range
+       instead of a single merged file (default is False).
+   with_emojis : bool, optional
+       Whether to also write the precomputed `emojis` column (default is False).
+
+   Returns
+   -------
+   int
+       Number of rows written.
+
+   Raises
+   ------
+   ValueError
+       If a line of the JSONL file is not valid JSON.
+   OSError
+       If there are file access or writing permission issues.
+   """
+   num_workers = num_workers or multiprocessing.cpu_count()
+   ranges = split_byte_ranges(file_path, num_workers) or [(0, 0)]
+
+   if partitioned:
+       os.makedirs(output_path, exist_ok=True)
+       parts_dir = output_path
+   else:
+       parts_dir = tempfile.mkdtemp(dir=os.path.dirname(os.path.abspath(output_path)))
+
+   try:
+       part_paths = [os.path.join(parts_dir, f'part-{index:05d}.parquet') for index in range(len(ranges))]
+       with ProcessPoolExecutor(max_workers=min(num_workers, len(ranges))) as executor:
+           futures = [executor.submit(convert_byte_range, file_path, start, end, part_path,
+                                      row_group_size, with_emojis)
+                      for (start, end), part_path in zip(ranges, part_paths)]
+           num_rows = sum(future.result() for future in futures)
+
+       if not partitioned:
+           with pq.ParquetWriter(output_path, EMOJI_SCHEMA if with_emojis else SCHEMA) as writer:
+               for part_path in part_paths:
+                   for batch in pq.ParquetFile(part_path).iter_batches(batch_size=row_group_size):
+                       writer.write_batch(batch, row_group_size=row_group_size)
+       return num_rows
+   finally:
+       if not partitioned:
+           shutil.rmtree(parts_dir, ignore_errors=True)
@@ -0,0 +1,111 @@
+import atexit
+import duckdb
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Tuple
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+MAX_IDLE_CURSORS = 8
+
+# Settings applied to every database of the pool. The object cache keeps the
+# Parquet footers of recently read files, so repeated queries on the same file
+# skip re-reading and re-parsing its metadata.
+BASE_SETTINGS = {'enable_object_cache': True}
+
+_lock = threading.Lock()
+_databases: Dict[Tuple, duckdb.DuckDBPyConnection] = {}
+_idle_cursors: Dict[Tuple, List[duckdb.DuckDBPyConnection]] = {}
+
+def _settings_key(settings: Dict) -> Tuple:
+    return tuple(sorted((name, value) for name, value in settings.items() if value is not None))
+
+def get_database(**settings) -> duckdb.DuckDBPyConnection:
+    """
+    Returns the shared in-memory database configured with the given settings,
+    creating it on first use.
+
+    DuckDB settings such as `threads` and `memory_limit` apply to the whole
+    database, so each distinct combination of settings gets its own database.
+
+    Parameters
+    ----------
+    **settings
+        DuckDB configuration options, e.g. threads=4 or memory_limit='256MB'.
+        Options set to None keep DuckDB's default.
+
+    Returns
+    -------
+    duckdb.DuckDBPyConnection
+        Connection owning the shared database. Use `connection` to run queries.
+    """
+    key = _settings_key(settings)
+    with _lock:
+        database = _databases.get(key)
+        if database is None:
+            logger.info(f"Opening shared DuckDB database with settings {dict(key)}")
+            database = duckdb.connect(database=':memory:', config={**BASE_SETTINGS, **dict(key)})
+            _databases[key] = database
+            _idle_cursors[key] = []
+        return database
+
+@contextmanager
+def connection(**settings) -> Iterator[duckdb.DuckDBPyConnection]:
+    """
+    Lends a cursor of the shared database configured with the given settings.
+
+    Cursors are kept open between calls, so a query only pays for planning and
+    execution instead of opening a database and applying PRAGMAs. Each cursor
+    is used by one caller at a time; temporary tables and views are private to
+    it and must be dropped by the caller before returning it. Cursors that saw
+    an error are closed instead of being reused.
+
+    Parameters
+    ----------
+    **settings
+        DuckDB configuration options, e.g. threads=4 or memory_limit='256MB'.
+        Options set to None keep DuckDB's default.
+
+    Yields
+    ------
+    duckdb.DuckDBPyConnection
+        Cursor of the shared database.
+    """
+    key = _settings_key(settings)
+    database = get_database(**dict(key))
+    with _lock:
+        idle = _idle_cursors.get(key)
+        cursor = idle.pop() if idle else None
+    if cursor is None:
+        cursor = database.cursor()
+
+    try:
+        yield cursor
+    except BaseException:
+        cursor.close()
+        raise
+
+    with _lock:
+        idle = _idle_cursors.get(key)
+        if idle is not None and len(idle) < MAX_IDLE_CURSORS:
+            idle.append(cursor)
+            return
+    cursor.close()
+
+def close_all() -> None:
+    """
+    Closes every pooled cursor and shared database.
+    """
+    with _lock:
+        databases = list(_databases.values())
+        cursors = [cursor for idle in _idle_cursors.values() for cursor in idle]
+        _databases.clear()
+        _idle_cursors.clear()
+    for cursor in cursors:
+        cursor.close()
+    for database in databases:
+        database.close()
+
+atexit.register(close_all)
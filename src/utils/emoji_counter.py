@@ -0,0 +1,237 @@
+import re
+import emoji
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from collections import Counter
+from functools import lru_cache
+from typing import List, Optional, Tuple, Union
+
+from utils import duckdb_pool
+from utils.filters import TweetFilter
+from utils.instrumentation import duckdb_profile, stage
+from utils.resource_profiles import ResourceProfile, resolve_profile
+
+EMOJIS_COLUMN = 'emojis'
+
+# Emojis are ranked by the position where they were first seen, (row, index
+# within the row), as `Counter.most_common` does; no tweet holds 2 ** 20 emojis.
+_POSITION_STRIDE = 2 ** 20
+
+_ZWJ = '\u200d'
+_VARIATION_SELECTORS = '\ufe0e\ufe0f'
+
+def _code_point_ranges(chars) -> List[Tuple[int, int]]:
+    """
+    Collapses a set of characters into sorted, inclusive code point ranges.
+    """
+    ranges: List[List[int]] = []
+    for code_point in sorted(ord(char) for char in chars):
+        if ranges and code_point == ranges[-1][1] + 1:
+            ranges[-1][1] = code_point
+        else:
+            ranges.append([code_point, code_point])
+    return [(start, end) for start, end in ranges]
+
+# Every character that can take part in an emoji match: the characters of all
+# EMOJI_DATA sequences plus the joiner and the variation selectors. Anything
+# outside this set ends a run and can never change how the emoji tokenizer
+# splits the characters around it.
+_EMOJI_CHARS = set(''.join(emoji.EMOJI_DATA)) | set(_ZWJ) | set(_VARIATION_SELECTORS)
+_EMOJI_RANGES = _code_point_ranges(_EMOJI_CHARS)
+_NON_ASCII_EMOJI_RANGES = _code_point_ranges(char for char in _EMOJI_CHARS if not char.isascii())
+
+EMOJI_RUN_PATTERN = re.compile('[{}]+'.format(''.join(
+    re.escape(chr(start)) if start == end else f'{re.escape(chr(start))}-{re.escape(chr(end))}'
+    for start, end in _EMOJI_RANGES
+)))
+
+# RE2 flavour used by Arrow compute kernels. All EMOJI_DATA sequences contain at
+# least one non-ASCII character, so rows without one of these can be skipped.
+CANDIDATE_PATTERN = '[{}]'.format(''.join(
+    f'\\x{{{start:X}}}' if start == end else f'\\x{{{start:X}}}-\\x{{{end:X}}}'
+    for start, end in _NON_ASCII_EMOJI_RANGES
+))
+
+@lru_cache(maxsize=65536)
+def _emojis_in_run(run: str) -> Tuple[str, ...]:
+    """
+    Tokenizes a run of emoji characters with `emoji.emoji_list`, memoizing the result.
+    """
+    return tuple(match['emoji'] for match in emoji.emoji_list(run))
+
+def extract_emojis(content: str) -> List[str]:
+    """
+    Extracts emojis from a string of text with the same semantics as `emoji.emoji_list`.
+
+    The string is split into runs of characters that can take part in an emoji
+    (including ZWJ sequences, skin tones, keycaps and flags) and only those runs
+    are handed to the emoji tokenizer, so plain text never reaches the per-character
+    Python loop and repeated runs are served from a cache.
+
+    Parameters
+    ----------
+    content : str
+        Tweet content to extract emojis from.
+
+    Returns
+    -------
+    List[str]
+        A list of emojis found in the content, in order of appearance.
+    """
+    if not content or content.isascii():
+        return []
+
+    emojis: List[str] = []
+    for run in EMOJI_RUN_PATTERN.findall(content):
+        if not run.isascii():
+            emojis.extend(_emojis_in_run(run))
+    return emojis
+
+def emoji_candidates(contents: Union[pa.Array, pa.ChunkedArray]) -> List[str]:
+    """
+    Returns the non-null contents that may contain an emoji.
+
+    The filtering runs on the Arrow string buffers: an ASCII-only check first,
+    then a search for any non-ASCII emoji character on the remaining rows.
+
+    Parameters
+    ----------
+    contents : pa.Array or pa.ChunkedArray
+        Arrow array of tweet contents.
+
+    Returns
+    -------
+    List[str]
+        The contents that contain at least one candidate emoji character, in order.
+    """
+    contents = pc.drop_null(contents)
+    contents = contents.filter(pc.invert(pc.string_is_ascii(contents)))
+    if len(contents) == 0:
+        return []
+    contents = contents.filter(pc.match_substring_regex(contents, CANDIDATE_PATTERN))
+    return contents.to_pylist()
+
+def count_emojis(
+    contents: Union[pa.Array, pa.ChunkedArray],
+    counter: Optional[Counter] = None
+) -> Counter:
+    """
+    Counts the emojis of an Arrow array of tweet contents.
+
+    Parameters
+    ----------
+    contents : pa.Array or pa.ChunkedArray
+        Arrow array of tweet contents.
+    counter : Counter, optional
+        Counter to update in place (a new one is created by default).
+
+    Returns
+    -------
+    Counter
+        A Counter with the counts of each emoji, in first-seen order.
+    """
+    if counter is None:
+        counter = Counter()
+    for content in emoji_candidates(contents):
+        counter.update(extract_emojis(content))
+    return counter
+
+def emoji_lists(contents: Union[pa.Array, pa.ChunkedArray]) -> pa.ListArray:
+    """
+    Extracts the emojis of every row of an Arrow array of tweet contents.
+
+    Parameters
+    ----------
+    contents : pa.Array or pa.ChunkedArray
+        Arrow array of tweet contents.
+
+    Returns
+    -------
+    pa.ListArray
+        One list of emojis per row, in order of appearance; null contents give
+        an empty list.
+    """
+    if isinstance(contents, pa.ChunkedArray):
+        contents = contents.combine_chunks()
+    candidates = pc.and_kleene(
+        pc.invert(pc.string_is_ascii(contents)),
+        pc.match_substring_regex(contents, CANDIDATE_PATTERN)
+    ).fill_null(False)
+
+    lists: List[List[str]] = [[] for _ in range(len(contents))]
+    for index in pc.indices_nonzero(candidates).to_pylist():
+        lists[index] = extract_emojis(contents[index].as_py())
+    return pa.array(lists, type=pa.list_(pa.string()))
+
+def has_emoji_column(file_path: str) -> bool:
+    """
+    Checks whether a Parquet file of tweets has the precomputed `emojis` column.
+
+    Parameters
+    ----------
+    file_path : str
+        Path to the Parquet file.
+
+    Returns
+    -------
+    bool
+        True if the file has a list-of-strings `emojis` column.
+    """
+    schema = pq.read_schema(file_path)
+    return EMOJIS_COLUMN in schema.names and schema.field(EMOJIS_COLUMN).type == pa.list_(pa.string())
+
+def top_precomputed_emojis(
+    file_path: Union[str, List[str]],
+    n: int = 10,
+    profile: Union[str, ResourceProfile, None] = None,
+    tweet_filter: Optional[TweetFilter] = None
+) -> List[Tuple[str, int]]:
+    """
+    Returns the most used emojis of a Parquet file with the precomputed `emojis`
+    column, as a columnar UNNEST and GROUP BY in DuckDB.
+
+    Ties are broken by the position where each emoji was first seen, following the
+    order of the files, so the result is the same as `Counter.most_common` over the
+    contents.
+
+    Parameters
+    ----------
+    file_path : str or List[str]
+        Path to the Parquet file, or a list of paths.
+    n : int, optional
+        Number of emojis to return (default is 10).
+    profile : str or ResourceProfile, optional
+        DuckDB resource profile, see `utils.resource_profiles` (default is 'latency').
+    tweet_filter : TweetFilter, optional
+        Tweets whose emojis are counted, pushed down to the Parquet scan (default
+        is every tweet).
+
+    Returns
+    -------
+    List[Tuple[str, int]]
+        A list of tuples containing:
+            - Emoji (str)
+            - Count (int)
+    """
+    tweet_filter = tweet_filter or TweetFilter()
+    query = f"""
+    SELECT emoji, COUNT(*) AS emoji_count
+    FROM (
+        SELECT
+            list_position($1, filename) AS file_index,
+            file_row_number,
+            UNNEST({EMOJIS_COLUMN}) AS emoji,
+            generate_subscripts({EMOJIS_COLUMN}, 1) AS position
+        FROM read_parquet($1, filename = true, file_row_number = true, union_by_name = true)
+        WHERE {tweet_filter.sql_predicate()}
+    )
+    GROUP BY emoji
+    ORDER BY emoji_count DESC, MIN((file_index, file_row_number * {_POSITION_STRIDE} + position)) ASC
+    LIMIT {int(n)};
+    """
+    resources = resolve_profile(profile, 'latency')
+    with duckdb_pool.connection(**resources.settings()) as con:
+        file_paths = [file_path] if isinstance(file_path, str) else list(file_path)
+        with stage('query'), duckdb_profile(con):
+            return con.execute(query, [file_paths]).fetchall()
@@ -0,0 +1,283 @@
+import datetime
+import logging
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from dataclasses import dataclass
+from typing import Iterable, Iterator, List, Optional, Tuple, Union
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+DateInput = Union[datetime.date, str, None]
+
+@dataclass(frozen=True)
+class TweetFilter:
+    """
+    Restriction of a query to a range of days and a set of authors.
+
+    The same filter is pushed down to every reader: as a SQL predicate that
+    DuckDB turns into Parquet row group pruning, as a list of the row groups whose
+    statistics may match for the Arrow readers, and as a row mask applied to the
+    decoded batches.
+
+    Attributes
+    ----------
+    start_date : datetime.date, optional
+        First day included (None for no lower bound).
+    end_date : datetime.date, optional
+        Last day included (None for no upper bound).
+    usernames : Tuple[str, ...], optional
+        Sorted authors whose tweets are kept (None keeps every author).
+    """
+    start_date: Optional[datetime.date] = None
+    end_date: Optional[datetime.date] = None
+    usernames: Optional[Tuple[str, ...]] = None
+
+    def is_empty(self) -> bool:
+        """
+        Returns whether the filter keeps every tweet.
+
+        Returns
+        -------
+        bool
+            True if no bound and no username is set.
+        """
+        return self.start_date is None and self.end_date is None and self.usernames is None
+
+    def columns(self) -> List[str]:
+        """
+        Returns the columns the filter needs to evaluate its row mask.
+
+        Returns
+        -------
+        List[str]
+            Names of the columns, empty for an empty filter.
+        """
+        columns = []
+        if self.start_date is not None or self.end_date is not None:
+            columns.append('date')
+        if self.usernames is not None:
+            columns.append('username')
+        return columns
+
+    def covers_day(self, day: datetime.date) -> bool:
+        """
+        Returns whether a day is inside the date range of the filter.
+
+        Parameters
+        ----------
+        day : datetime.date
+            Day to check.
+
+        Returns
+        -------
+        bool
+            True if the day is between `start_date` and `end_date`.
+        """
+        return (self.start_date is None or day >= self.start_date) and \
+            (self.end_date is None or day <= self.end_date)
+
+    def sql_predicate(self) -> str:
+        """
+        Returns the filter as a SQL predicate on the 'date' and 'username' columns.
+
+        Bounds are written as literals, so the predicate can also be used in views,
+        which do not accept prepared parameters, and DuckDB pushes it down to the
+        Parquet scan. A range on 'username' is added to the IN list so that row
+        groups are pruned by their min/max statistics.
+
+        Returns
+        -------
+        str
+            The predicate, 'TRUE' for an empty filter.
+        """
+        conditions = []
+        if self.start_date is not None:
+            conditions.append(f"date >= TIMESTAMP '{_day_start(self.start_date).isoformat(' ')}'")
+        if self.end_date is not None:
+            conditions.append(f"date < TIMESTAMP '{_day_end(self.end_date).isoformat(' ')}'")
+        if self.usernames is not None:
+            quoted = [_quote(username) for username in self.usernames]
+            conditions.append(f"username BETWEEN {quoted[0]} AND {quoted[-1]}")
+            conditions.append(f"username IN ({', '.join(quoted)})")
+        return ' AND '.join(conditions) or 'TRUE'
+
+    def row_groups(self, parquet_file: pq.ParquetFile, row_groups: Optional[Iterable[int]] = None) -> List[int]:
+        """
+        Returns the row groups of a Parquet file whose statistics may match the filter.
+
+        Row groups without statistics for a filtered column are always kept.
+
+        Parameters
+        ----------
+        parquet_file : pq.ParquetFile
+            Opened Parquet file.
+        row_groups : Iterable[int], optional
+            Candidate row group indices (default is every row group).
+
+        Returns
+        -------
+        List[int]
+            Indices of the row groups that must be read, in file order.
+        """
+        metadata = parquet_file.metadata
+        if row_groups is None:
+            row_groups = range(metadata.num_row_groups)
+        if self.is_empty():
+            return list(row_groups)
+
+        names = [metadata.schema.column(index).path for index in range(metadata.num_columns)]
+        date_column = names.index('date') if 'date' in names else None
+        username_column = names.index('username') if 'username' in names else None
+
+        kept = []
+        for row_group in row_groups:
+            row_group_metadata = metadata.row_group(row_group)
+            if self._date_range_may_match(row_group_metadata, date_column) and \
+                    self._usernames_may_match(row_group_metadata, username_column):
+                kept.append(row_group)
+        return kept
+
+    def apply(self, batch):
+        """
+        Keeps the rows of a batch that match the filter.
+
+        Parameters
+        ----------
+        batch : RecordBatch or Table
+            Batch containing the columns returned by `columns`.
+
+        Returns
+        -------
+        RecordBatch or Table
+            The matching rows; the same batch for an empty filter.
+        """
+        if self.is_empty():
+            return batch
+
+        masks = []
+        if self.start_date is not None:
+            masks.append(pc.greater_equal(batch['date'], pa.scalar(_day_start(self.start_date))))
+        if self.end_date is not None:
+            masks.append(pc.less(batch['date'], pa.scalar(_day_end(self.end_date))))
+        if self.usernames is not None:
+            masks.append(pc.is_in(batch['username'], value_set=pa.array(self.usernames, pa.string())))
+
+        mask = masks[0]
+        for other in masks[1:]:
+            mask = pc.and_kleene(mask, other)
+        return batch.filter(mask)
+
+    def _date_range_may_match(self, row_group_metadata, column: Optional[int]) -> bool:
+        if column is None or (self.start_date is None and self.end_date is None):
+            return True
+        stats = row_group_metadata.column(column).statistics
+        if stats is None or not stats.has_min_max:
+            return stats is None or not stats.has_null_count or stats.null_count < row_group_metadata.num_rows
+        return (self.start_date is None or stats.max >= _day_start(self.start_date)) and \
+            (self.end_date is None or stats.min < _day_end(self.end_date))
+
+    def _usernames_may_match(self, row_group_metadata, column: Optional[int]) -> bool:
+        if column is None or self.usernames is None:
+            return True
+        stats = row_group_metadata.column(column).statistics
+        if stats is None or not stats.has_min_max:
+            return True
+        return any(stats.min <= username <= stats.max for username in self.usernames)
+
+def resolve_filter(
+    start_date: DateInput = None,
+    end_date: DateInput = None,
+    usernames: Union[str, Iterable[str], None] = None
+) -> TweetFilter:
+    """
+    Builds a TweetFilter from query parameters.
+
+    Parameters
+    ----------
+    start_date : datetime.date or str, optional
+        First day included, as a date or an ISO string (default is no lower bound).
+    end_date : datetime.date or str, optional
+        Last day included, as a date or an ISO string (default is no upper bound).
+    usernames : str or Iterable[str], optional
+        Author or authors whose tweets are kept (default is every author; an
+        empty list also keeps every author).
+
+    Returns
+    -------
+    TweetFilter
+        The filter.
+
+    Raises
+    ------
+    ValueError
+        If a date is not a valid ISO date or `start_date` is after `end_date`.
+    """
+    start_date = _as_date(start_date)
+    end_date = _as_date(end_date)
+    if start_date is not None and end_date is not None and start_date > end_date:
+        raise ValueError(f"start_date {start_date} is after end_date {end_date}")
+
+    if isinstance(usernames, str):
+        usernames = [usernames]
+    usernames = tuple(sorted(set(usernames))) if usernames else None
+    return TweetFilter(start_date, end_date, usernames)
+
+def iter_filtered_batches(
+    file_paths: Union[str, List[str]],
+    columns: List[str],
+    tweet_filter: Optional[TweetFilter] = None,
+    batch_size: int = 100_000
+) -> Iterator[pa.RecordBatch]:
+    """
+    Streams the rows of Parquet files that match a filter, one file after the other.
+
+    Only the row groups whose statistics may match are read, and only `columns`
+    plus the columns the filter needs are decoded.
+
+    Parameters
+    ----------
+    file_paths : str or List[str]
+        Path to the Parquet file, or a list of paths.
+    columns : List[str]
+        Columns to read.
+    tweet_filter : TweetFilter, optional
+        Rows to keep (default is every row).
+    batch_size : int, optional
+        Maximum number of rows per batch (default is 100000).
+
+    Yields
+    ------
+    pa.RecordBatch
+        Batches of matching rows, possibly with the filter columns added.
+    """
+    file_paths = [file_paths] if isinstance(file_paths, str) else file_paths
+    tweet_filter = tweet_filter or TweetFilter()
+    read_columns = columns + [column for column in tweet_filter.columns() if column not in columns]
+
+    for file_path in file_paths:
+        parquet_file = pq.ParquetFile(file_path)
+        row_groups = tweet_filter.row_groups(parquet_file)
+        if not row_groups:
+            continue
+        for batch in parquet_file.iter_batches(batch_size=batch_size, row_groups=row_groups, columns=read_columns):
+            yield tweet_filter.apply(batch)
+
+def _as_date(value: DateInput) -> Optional[datetime.date]:
+    if value is None or value == '':
+        return None
+    if isinstance(value, datetime.datetime):
+        return value.date()
+    if isinstance(value, datetime.date):
+        return value
+    return datetime.date.fromisoformat(value)
+
+def _day_start(day: datetime.date) -> datetime.datetime:
+    return datetime.datetime.combine(day, datetime.time.min)
+
+def _day_end(day: datetime.date) -> datetime.datetime:
+    return _day_start(day) + datetime.timedelta(days=1)
+
+def _quote(value: str) -> str:
+    return "'{}'".format(value.replace("'", "''"))
@@ -0,0 +1,234 @@
+import datetime
+import glob
+import logging
+import os
+import pyarrow.parquet as pq
+from collections import Counter
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+from utils.filters import TweetFilter
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# A Parquet input: a file, a glob pattern, a directory dataset or a list of them.
+FileInput = Union[str, os.PathLike, Sequence[Union[str, os.PathLike]]]
+
+GLOB_CHARACTERS = '*?['
+
+# Whether the Arrow readers memory-map the Parquet files when not told otherwise.
+MEMORY_MAP = os.environ.get('PARQUET_MEMORY_MAP', '0') == '1'
+
+def _expand(path: str) -> List[str]:
+    if any(character in path for character in GLOB_CHARACTERS):
+        return sorted(match for match in glob.glob(path, recursive=True) if os.path.isfile(match))
+    if os.path.isdir(path):
+        files = []
+        for root, dirs, names in os.walk(path):
+            dirs.sort()
+            files.extend(os.path.join(root, name) for name in sorted(names) if name.endswith('.parquet'))
+        return files
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"File not found: {path}")
+    return [path]
+
+def resolve_input(file_input: FileInput) -> List[str]:
+    """
+    Expands a Parquet input into the list of files it refers to.
+
+    Globs are expanded (with '**' matching any number of directories), directories
+    are walked for '*.parquet' files, including hive-style 'key=value'
+    subdirectories, and lists are expanded item by item. The order is
+    deterministic: list order, then sorted paths.
+
+    Parameters
+    ----------
+    file_input : FileInput
+        A file path, a glob pattern, a directory or a list of them.
+
+    Returns
+    -------
+    List[str]
+        Paths of the Parquet files, without duplicates.
+
+    Raises
+    ------
+    FileNotFoundError
+        If a path does not exist or the input matches no file.
+    """
+    paths = [file_input] if isinstance(file_input, (str, os.PathLike)) else list(file_input)
+    files = list(dict.fromkeys(file for path in paths for file in _expand(os.fspath(path))))
+    if not files:
+        raise FileNotFoundError(f"No Parquet files found for: {file_input}")
+    return files
+
+def single_file(file_input: FileInput) -> Optional[str]:
+    """
+    Returns the path of the input if it refers to exactly one file, else None.
+
+    Parameters
+    ----------
+    file_input : FileInput
+        A file path, a glob pattern, a directory or a list of them.
+
+    Returns
+    -------
+    str, optional
+        The only file of the input.
+    """
+    files = resolve_input(file_input)
+    return files[0] if len(files) == 1 else None
+
+def _file_date_range(file_path: str) -> Tuple[Optional[datetime.date], Optional[datetime.date], int, int]:
+    metadata = pq.ParquetFile(file_path).metadata
+    names = [metadata.schema.column(index).path for index in range(metadata.num_columns)]
+    if 'date' not in names:
+        return None, None, metadata.num_rows, 0
+
+    column = names.index('date')
+    minimum = maximum = None
+    null_count = 0
+    for row_group_index in range(metadata.num_row_groups):
+        row_group = metadata.row_group(row_group_index)
+        stats = row_group.column(column).statistics
+        if row_group.num_rows == 0:
+            continue
+        if stats is None or not stats.has_min_max:
+            if stats is not None and stats.has_null_count and stats.null_count == row_group.num_rows:
+                null_count += row_group.num_rows
+                continue
+            return None, None, metadata.num_rows, 0
+        minimum = stats.min if minimum is None else min(minimum, stats.min)
+        maximum = stats.max if maximum is None else max(maximum, stats.max)
+        null_count += stats.null_count if stats.has_null_count else row_group.num_rows
+
+    if minimum is None:
+        return None, None, 0, 0
+    return minimum.date(), maximum.date(), metadata.num_rows, metadata.num_rows - null_count
+
+def prune_files_for_top_dates(
+    file_paths: List[str],
+    n: int = 10,
+    tweet_filter: Optional[TweetFilter] = None
+) -> List[str]:
+    """
+    Drops the files that cannot contain any of the `n` dates with the most tweets.
+
+    From the `date` statistics of each file, every day gets an upper bound (rows of
+    all the files whose date range covers it) and, for files spanning a single day,
+    a lower bound (their non-null rows). A file is skipped when every day it covers
+    has an upper bound below the n-th largest lower bound, as such days can never
+    reach the top `n`. Files without statistics are always kept and count towards
+    every day's upper bound.
+
+    With a filter, only the days in its date range are considered, so files
+    outside the range are always dropped. Lower bounds are not used when the
+    filter selects usernames, as the rows of a file may not match it.
+
+    Parameters
+    ----------
+    file_paths : List[str]
+        Paths to the Parquet files.
+    n : int, optional
+        Number of top dates that must be preserved (default is 10).
+    tweet_filter : TweetFilter, optional
+        Filter of the query (default is every tweet).
+
+    Returns
+    -------
+    List[str]
+        The files that may affect the top `n` dates, in the original order.
+    """
+    tweet_filter = tweet_filter or TweetFilter()
+    ranges: Dict[str, Tuple] = {file_path: _file_date_range(file_path) for file_path in file_paths}
+    lower_bounds: Counter = Counter()
+    upper_bounds: Counter = Counter()
+    unknown_rows = 0
+
+    for first_day, last_day, num_rows, num_dated_rows in ranges.values():
+        if first_day is None:
+            unknown_rows += num_rows
+            continue
+        if first_day == last_day and tweet_filter.usernames is None and tweet_filter.covers_day(first_day):
+            lower_bounds[first_day] += num_dated_rows
+        for day in _days(first_day, last_day, tweet_filter):
+            upper_bounds[day] += num_rows
+
+    threshold = sorted(lower_bounds.values(), reverse=True)[n - 1] if len(lower_bounds) >= n else 0
+
+    kept = []
+    for file_path in file_paths:
+        first_day, last_day, _, _ = ranges[file_path]
+        if first_day is None or any(
+            upper_bounds[day] + unknown_rows >= threshold for day in _days(first_day, last_day, tweet_filter)
+        ):
+            kept.append(file_path)
+
+    if len(kept) < len(file_paths):
+        logger.info(f"Pruned {len(file_paths) - len(kept)} of {len(file_paths)} files for the top {n} dates")
+    return kept
+
+def _days(first_day: datetime.date, last_day: datetime.date, tweet_filter: TweetFilter) -> List[datetime.date]:
+    days = (first_day + datetime.timedelta(days=offset) for offset in range((last_day - first_day).days + 1))
+    return [day for day in days if tweet_filter.covers_day(day)]
+
+def open_parquet(file_path: str, memory_map: Optional[bool] = None) -> pq.ParquetFile:
+    """
+    Opens a Parquet file for the Arrow readers, optionally memory-mapped.
+
+    A memory-mapped file is read straight from the pages of the OS cache instead
+    of being copied into buffers of the process, so workers reading the same file
+    share its pages and only their decoded columns count towards their RSS.
+
+    Parameters
+    ----------
+    file_path : str
+        Path to the Parquet file.
+    memory_map : bool, optional
+        Whether to memory-map the file (default is MEMORY_MAP, set with the
+        PARQUET_MEMORY_MAP environment variable).
+
+    Returns
+    -------
+    pq.ParquetFile
+        The opened file.
+
+    Raises
+    ------
+    FileNotFoundError
+        If the file does not exist.
+    """
+    return pq.ParquetFile(file_path, memory_map=MEMORY_MAP if memory_map is None else memory_map)
+
+def count_rows(file_paths: List[str]) -> int:
+    """
+    Returns the number of rows of Parquet files, read from their footers.
+
+    Parameters
+    ----------
+    file_paths : List[str]
+        Paths to the Parquet files.
+
+    Returns
+    -------
+    int
+        Total number of rows.
+    """
+    return sum(pq.ParquetFile(file_path).metadata.num_rows for file_path in file_paths)
+
+def sql_file_list(file_paths: List[str]) -> str:
+    """
+    Formats a list of paths as a DuckDB list literal, for statements that cannot
+    take prepared parameters, such as views.
+
+    Parameters
+    ----------
+    file_paths : List[str]
+        Paths to the Parquet files.
+
+    Returns
+    -------
+    str
+        A literal such as ['a.parquet', 'b.parquet'].
+    """
+    return '[{}]'.format(', '.join("'{}'".format(path.replace("'", "''")) for path in file_paths))
@@ -0,0 +1,485 @@
+import contextvars
+import duckdb
+import functools
+import json
+import logging
+import os
+import random
+import resource
+import tempfile
+import threading
+import time
+import tracemalloc
+from collections import defaultdict, deque
+from contextlib import contextmanager, suppress
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Upper bounds in seconds of the buckets of the query duration histogram.
+DURATION_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+# Fraction of the DuckDB queries that write their JSON profile (the output of
+# EXPLAIN ANALYZE), and whether tracemalloc follows the Python allocations.
+# Operator timing slows down a query by up to 20%, so only a sample is profiled;
+# tracemalloc slows down every allocation, so it is opt-in.
+DUCKDB_PROFILE_RATE = float(os.environ.get('INSTRUMENTATION_DUCKDB_PROFILE_RATE', 0.1))
+TRACE_ALLOCATIONS = os.environ.get('INSTRUMENTATION_TRACEMALLOC', '0') == '1'
+
+_PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+@dataclass
+class QueryMetrics:
+    """
+    Measurements of one call of an instrumented function.
+
+    Attributes
+    ----------
+    function : str
+        Name of the function.
+    duration : float
+        Wall time of the call in seconds.
+    stages : Dict[str, float]
+        Wall time in seconds spent in each stage, e.g. 'read', 'tokenize',
+        'aggregate' or 'rank'. Time outside the stages is not attributed.
+    rows : int
+        Rows read from the Parquet files by the Arrow readers and by the DuckDB
+        queries that were profiled.
+    bytes : int
+        Bytes of decoded Arrow data, where the reader knows them.
+    peak_rss_mb : float, optional
+        Largest resident set of the process seen at the stage boundaries of the
+        call, in MB.
+    peak_traced_mb : float, optional
+        Peak of the Python allocations traced by tracemalloc during the call, in
+        MB (None unless TRACE_ALLOCATIONS is on).
+    duckdb_profiles : List[Dict]
+        JSON profiles of the DuckDB queries of the call that were sampled.
+    error : str, optional
+        Name of the exception raised by the call, if any.
+    """
+    function: str
+    duration: float = 0.0
+    stages: Dict[str, float] = field(default_factory=dict)
+    rows: int = 0
+    bytes: int = 0
+    peak_rss_mb: Optional[float] = None
+    peak_traced_mb: Optional[float] = None
+    duckdb_profiles: List[Dict] = field(default_factory=list)
+    error: Optional[str] = None
+
+    def sample_memory(self) -> None:
+        """
+        Updates `peak_rss_mb` with the current resident set of the process.
+        """
+        rss_mb = current_rss_mb()
+        if rss_mb is not None and (self.peak_rss_mb is None or rss_mb > self.peak_rss_mb):
+            self.peak_rss_mb = rss_mb
+
+    def operator_timings(self) -> Dict[str, float]:
+        """
+        Sums the time of the DuckDB operators of every profile by operator type.
+
+        Returns
+        -------
+        Dict[str, float]
+            Seconds per operator type, e.g. 'TABLE_SCAN' or 'HASH_GROUP_BY'.
+        """
+        timings: Dict[str, float] = defaultdict(float)
+        for profile in self.duckdb_profiles:
+            for operator in _operators(profile):
+                timings[operator.get('operator_type', 'UNKNOWN')] += operator.get('operator_timing', 0.0)
+        return dict(timings)
+
+class MetricsRegistry:
+    """
+    Thread-safe store of the metrics of every instrumented call of the process.
+
+    Keeps running totals per function, rendered in the Prometheus text format by
+    `render_prometheus`, and the last calls with their full details.
+
+    Parameters
+    ----------
+    max_recent : int, optional
+        Number of calls kept by `recent` (default is 100).
+    """
+
+    def __init__(self, max_recent: int = 100):
+        self._lock = threading.Lock()
+        self._recent: deque = deque(maxlen=max_recent)
+        self._totals: Dict[str, Dict[str, Any]] = {}
+
+    def record(self, metrics: QueryMetrics) -> None:
+        """
+        Adds the metrics of a call to the totals of its function.
+
+        Parameters
+        ----------
+        metrics : QueryMetrics
+            Metrics of the call.
+        """
+        with self._lock:
+            totals = self._totals.get(metrics.function)
+            if totals is None:
+                totals = self._totals[metrics.function] = {
+                    'calls': 0,
+                    'errors': 0,
+                    'duration': 0.0,
+                    'buckets': [0] * len(DURATION_BUCKETS),
+                    'stages': defaultdict(float),
+                    'stage_calls': defaultdict(int),
+                    'operators': defaultdict(float),
+                    'rows': 0,
+                    'bytes': 0,
+                    'peak_rss_mb': None,
+                    'peak_traced_mb': None,
+                }
+            totals['calls'] += 1
+            totals['errors'] += metrics.error is not None
+            totals['duration'] += metrics.duration
+            for index, bound in enumerate(DURATION_BUCKETS):
+                if metrics.duration <= bound:
+                    totals['buckets'][index] += 1
+            for name, seconds in metrics.stages.items():
+                totals['stages'][name] += seconds
+                totals['stage_calls'][name] += 1
+            for operator, seconds in metrics.operator_timings().items():
+                totals['operators'][operator] += seconds
+            totals['rows'] += metrics.rows
+            totals['bytes'] += metrics.bytes
+            totals['peak_rss_mb'] = metrics.peak_rss_mb
+            totals['peak_traced_mb'] = metrics.peak_traced_mb
+            self._recent.append(metrics)
+
+    def recent(self, function: Optional[str] = None) -> List[QueryMetrics]:
+        """
+        Returns the last recorded calls, oldest first.
+
+        Parameters
+        ----------
+        function : str, optional
+            Only return the calls of this function (default is every function).
+
+        Returns
+        -------
+        List[QueryMetrics]
+            Metrics of the calls.
+        """
+        with self._lock:
+            return [metrics for metrics in self._recent if function is None or metrics.function == function]
+
+    def clear(self) -> None:
+        """
+        Forgets every recorded call and total.
+        """
+        with self._lock:
+            self._recent.clear()
+            self._totals.clear()
+
+    def render_prometheus(self) -> str:
+        """
+        Renders the totals in the Prometheus text exposition format.
+
+        Returns
+        -------
+        str
+            The metrics, one sample per line.
+        """
+        with self._lock:
+            totals = {function: {**values, 'stages': dict(values['stages']),
+                                 'stage_calls': dict(values['stage_calls']),
+                                 'operators': dict(values['operators'])}
+                      for function, values in self._totals.items()}
+
+        lines: List[str] = []
+
+        def family(name: str, kind: str, description: str, samples: Iterable[Tuple[str, Dict[str, str], float]]):
+            lines.append(f'# HELP {name} {description}')
+            lines.append(f'# TYPE {name} {kind}')
+            for suffix, labels, value in samples:
+                lines.append(f'{name}{suffix}{_labels(labels)} {_number(value)}')
+
+        family('tweets_query_duration_seconds', 'histogram', 'Wall time of the queries.', [
+            sample
+            for function, values in sorted(totals.items())
+            for sample in [
+                *(('_bucket', {'function': function, 'le': _number(bound)}, count)
+                  for bound, count in zip(DURATION_BUCKETS, values['buckets'])),
+                ('_bucket', {'function': function, 'le': '+Inf'}, values['calls']),
+                ('_sum', {'function': function}, values['duration']),
+                ('_count', {'function': function}, values['calls']),
+            ]
+        ])
+        family('tweets_query_errors_total', 'counter', 'Queries that raised an exception.', [
+            ('', {'function': function}, values['errors']) for function, values in sorted(totals.items())
+        ])
+        family('tweets_query_stage_seconds_total', 'counter', 'Wall time spent in each stage of the queries.', [
+            ('', {'function': function, 'stage': stage}, seconds)
+            for function, values in sorted(totals.items()) for stage, seconds in sorted(values['stages'].items())
+        ])
+        family('tweets_query_stage_calls_total', 'counter', 'Queries that went through each stage.', [
+            ('', {'function': function, 'stage': stage}, calls)
+            for function, values in sorted(totals.items()) for stage, calls in sorted(values['stage_calls'].items())
+        ])
+        family('tweets_query_rows_total', 'counter', 'Rows read from the Parquet files.', [
+            ('', {'function': function}, values['rows']) for function, values in sorted(totals.items())
+        ])
+        family('tweets_query_bytes_total', 'counter', 'Bytes of decoded Arrow data.', [
+            ('', {'function': function}, values['bytes']) for function, values in sorted(totals.items())
+        ])
+        family('tweets_query_peak_rss_bytes', 'gauge', 'Peak resident set seen during the last query.', [
+            ('', {'function': function}, values['peak_rss_mb'] * 2 ** 20)
+            for function, values in sorted(totals.items()) if values['peak_rss_mb'] is not None
+        ])
+        family('tweets_query_peak_traced_bytes', 'gauge', 'Peak of the traced Python allocations of the last query.', [
+            ('', {'function': function}, values['peak_traced_mb'] * 2 ** 20)
+            for function, values in sorted(totals.items()) if values['peak_traced_mb'] is not None
+        ])
+        family('tweets_duckdb_operator_seconds_total', 'counter', 'Time of the operators of the profiled DuckDB queries by type.', [
+            ('', {'function': function, 'operator': operator}, seconds)
+            for function, values in sorted(totals.items()) for operator, seconds in sorted(values['operators'].items())
+        ])
+
+        rss_mb = current_rss_mb()
+        family('process_resident_memory_bytes', 'gauge', 'Resident memory of the process.',
+               [('', {}, rss_mb * 2 ** 20)] if rss_mb is not None else [])
+        family('process_peak_resident_memory_bytes', 'gauge', 'Peak resident memory of the process.',
+               [('', {}, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024)])
+        return '\n'.join(lines) + '\n'
+
+registry = MetricsRegistry()
+
+_current: contextvars.ContextVar = contextvars.ContextVar('query_metrics', default=None)
+_collector: contextvars.ContextVar = contextvars.ContextVar('query_metrics_collector', default=None)
+
+def instrumented(function: Callable) -> Callable:
+    """
+    Decorates a query function so that each call records a QueryMetrics.
+
+    The metrics are added to `registry` and to the lists opened by `recorded`.
+    Calls of instrumented functions nested in another one get their own metrics.
+
+    Parameters
+    ----------
+    function : Callable
+        Function to instrument.
+
+    Returns
+    -------
+    Callable
+        The wrapped function, with the same name and signature.
+    """
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        metrics = QueryMetrics(function.__name__)
+        token = _current.set(metrics)
+        if TRACE_ALLOCATIONS:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+        start = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        except Exception as e:
+            metrics.error = type(e).__name__
+            raise
+        finally:
+            metrics.duration = time.perf_counter() - start
+            metrics.sample_memory()
+            if TRACE_ALLOCATIONS and tracemalloc.is_tracing():
+                metrics.peak_traced_mb = tracemalloc.get_traced_memory()[1] / 2 ** 20
+            _current.reset(token)
+            registry.record(metrics)
+            collected = _collector.get()
+            if collected is not None:
+                collected.append(metrics)
+    return wrapper
+
+def current_metrics() -> Optional[QueryMetrics]:
+    """
+    Returns the metrics of the instrumented call running in this context.
+
+    Returns
+    -------
+    QueryMetrics, optional
+        The metrics, or None outside instrumented calls.
+    """
+    return _current.get()
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """
+    Attributes the wall time of a block to a stage of the current call.
+
+    Time accumulates when the same stage is entered several times, e.g. once
+    per batch. Outside instrumented calls the block runs unmeasured.
+
+    Parameters
+    ----------
+    name : str
+        Name of the stage.
+    """
+    metrics = _current.get()
+    if metrics is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.stages[name] = metrics.stages.get(name, 0.0) + time.perf_counter() - start
+
+def timed_batches(batches: Iterable, name: str = 'read') -> Iterator:
+    """
+    Iterates over batches, attributing the time spent producing each one to a
+    stage and counting their rows and bytes.
+
+    Parameters
+    ----------
+    batches : Iterable
+        Record batches or tables, e.g. from `filters.iter_filtered_batches`.
+    name : str, optional
+        Name of the stage (default is 'read').
+
+    Yields
+    ------
+    RecordBatch or Table
+        The same batches.
+    """
+    iterator = iter(batches)
+    while True:
+        with stage(name):
+            batch = next(iterator, None)
+        if batch is None:
+            return
+        add_rows(batch.num_rows, batch.nbytes)
+        yield batch
+
+def add_rows(rows: int, nbytes: int = 0) -> None:
+    """
+    Adds rows read, and their bytes, to the current call.
+
+    Parameters
+    ----------
+    rows : int
+        Number of rows.
+    nbytes : int, optional
+        Bytes of decoded data (default is 0).
+    """
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.rows += rows
+        metrics.bytes += nbytes
+        metrics.sample_memory()
+
+@contextmanager
+def duckdb_profile(con: duckdb.DuckDBPyConnection) -> Iterator[None]:
+    """
+    Collects the JSON profile of the DuckDB query run in the block.
+
+    A fraction DUCKDB_PROFILE_RATE of the blocks is profiled: profiling is
+    enabled on the cursor only for the block, with the profile written to a
+    temporary file and attached to the current call, which also gets the rows
+    scanned from Parquet. Only the last query of the block is profiled. Nothing
+    is done outside instrumented calls.
+
+    Parameters
+    ----------
+    con : duckdb.DuckDBPyConnection
+        Cursor that runs the query.
+    """
+    metrics = _current.get()
+    if metrics is None or random.random() >= DUCKDB_PROFILE_RATE:
+        yield
+        return
+
+    descriptor, profile_path = tempfile.mkstemp(suffix='.json', prefix='duckdb-profile-')
+    os.close(descriptor)
+    try:
+        con.execute("SET enable_profiling = 'json'")
+        con.execute("SET profiling_output = '{}'".format(profile_path.replace("'", "''")))
+        yield
+        try:
+            with open(profile_path) as file:
+                profile = json.load(file)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Could not read the DuckDB profile: {e}")
+            return
+        metrics.duckdb_profiles.append(profile)
+        metrics.rows += sum(operator.get('operator_rows_scanned', 0) for operator in _operators(profile)
+                            if operator.get('extra_info', {}).get('Function') == 'READ_PARQUET')
+        metrics.sample_memory()
+    finally:
+        with suppress(duckdb.Error):
+            con.execute("RESET enable_profiling")
+            con.execute("RESET profiling_output")
+        os.remove(profile_path)
+
+@contextmanager
+def recorded() -> Iterator[List[QueryMetrics]]:
+    """
+    Collects the metrics of the instrumented calls made in the block.
+
+    Yields
+    ------
+    List[QueryMetrics]
+        List filled with the metrics of each call when it finishes.
+    """
+    collected: List[QueryMetrics] = []
+    token = _collector.set(collected)
+    try:
+        yield collected
+    finally:
+        _collector.reset(token)
+
+def run_recorded(function: Callable, *args, **kwargs) -> Tuple[Any, List[QueryMetrics]]:
+    """
+    Calls a function and returns its result with the metrics of its instrumented
+    calls, so that a worker process can send them back to the parent's registry.
+
+    Parameters
+    ----------
+    function : Callable
+        Function to call.
+    *args, **kwargs
+        Arguments for the function.
+
+    Returns
+    -------
+    Tuple[Any, List[QueryMetrics]]
+        The result and the metrics.
+    """
+    with recorded() as collected:
+        result = function(*args, **kwargs)
+    return result, collected
+
+def current_rss_mb() -> Optional[float]:
+    """
+    Returns the current resident set of the process.
+
+    Returns
+    -------
+    float, optional
+        Resident memory in MB, None where /proc is not available.
+    """
+    try:
+        with open('/proc/self/statm') as file:
+            return int(file.read().split()[1]) * _PAGE_SIZE / 2 ** 20
+    except (OSError, IndexError, ValueError):
+        return None
+
+def _operators(profile: Dict) -> Iterator[Dict]:
+    for child in profile.get('children', []):
+        yield child
+        yield from _operators(child)
+
+def _labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join('{}="{}"'.format(name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+                          for name, value in labels.items()) + '}'
+
+def _number(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
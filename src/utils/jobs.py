@@ -0,0 +1,284 @@
+import asyncio
+import json
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Callable, Dict, Optional
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Receives the progress of a long-running query: a dict with the 'rows' processed
+# so far, the 'total_rows' to process if known (None otherwise) and the 'partial'
+# answer over the rows processed so far.
+ProgressCallback = Callable[[Dict[str, Any]], None]
+
+# Number of batches or row groups between two progress reports.
+PROGRESS_INTERVAL = 10
+
+PENDING, RUNNING, DONE, FAILED = 'pending', 'running', 'done', 'failed'
+
+class JobStoreFullError(RuntimeError):
+    """
+    Raised when a job cannot be created because `max_jobs` jobs are unfinished.
+    """
+
+@dataclass
+class Job:
+    """
+    State of a query submitted to run in the background.
+
+    Attributes
+    ----------
+    job_id : str
+        Identifier of the job.
+    query : str
+        Name of the query, e.g. 'q2_time'.
+    status : str
+        'pending', 'running', 'done' or 'failed'.
+    progress : Dict, optional
+        Last progress reported by the query, see ProgressCallback.
+    result : Any
+        Result of the query once done.
+    error : str, optional
+        Error message if the query failed.
+    created_at : float
+        Submission time, as a Unix timestamp.
+    finished_at : float, optional
+        Time the query finished or failed.
+    version : int
+        Incremented on every change, so readers can wait for new events.
+    """
+    job_id: str
+    query: str
+    status: str = PENDING
+    progress: Optional[Dict[str, Any]] = None
+    result: Any = None
+    error: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+    finished_at: Optional[float] = None
+    version: int = 0
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False, compare=False)
+
+    def start(self) -> None:
+        """
+        Marks the job as running.
+        """
+        self._update(status=RUNNING)
+
+    def report(self, progress: Dict[str, Any]) -> None:
+        """
+        Stores the progress of the query. Safe to call from any thread.
+
+        Parameters
+        ----------
+        progress : Dict[str, Any]
+            Progress reported by the query, see ProgressCallback.
+        """
+        self._update(progress=progress)
+
+    def finish(self, result: Any) -> None:
+        """
+        Stores the result of the query and marks the job as done.
+
+        Parameters
+        ----------
+        result : Any
+            Result of the query.
+        """
+        self._update(status=DONE, result=result, finished_at=time.time())
+
+    def fail(self, error: str) -> None:
+        """
+        Stores the error of the query and marks the job as failed.
+
+        Parameters
+        ----------
+        error : str
+            Error message.
+        """
+        self._update(status=FAILED, error=error, finished_at=time.time())
+
+    def is_finished(self) -> bool:
+        """
+        Returns whether the job is done or failed.
+
+        Returns
+        -------
+        bool
+            True if the job will not change anymore.
+        """
+        return self.status in (DONE, FAILED)
+
+    def to_dict(self, include_result: bool = True) -> Dict[str, Any]:
+        """
+        Returns the public state of the job.
+
+        Parameters
+        ----------
+        include_result : bool, optional
+            Whether to include the result (default is True).
+
+        Returns
+        -------
+        Dict[str, Any]
+            'job_id', 'query', 'status', 'progress', 'error', 'created_at',
+            'finished_at' and, if requested and done, 'result'.
+        """
+        with self._lock:
+            state = {
+                'job_id': self.job_id,
+                'query': self.query,
+                'status': self.status,
+                'progress': self.progress,
+                'error': self.error,
+                'created_at': self.created_at,
+                'finished_at': self.finished_at,
+            }
+            if include_result and self.status == DONE:
+                state['result'] = self.result
+        return state
+
+    def _update(self, **changes) -> None:
+        with self._lock:
+            for name, value in changes.items():
+                setattr(self, name, value)
+            self.version += 1
+
+class JobStore:
+    """
+    In-memory registry of background jobs.
+
+    Finished jobs are kept for `ttl` seconds so their result can be fetched, and
+    the oldest finished jobs are dropped once there are more than `max_jobs`.
+    Unfinished jobs are never dropped, so new jobs are refused while `max_jobs`
+    of them are pending or running.
+
+    Parameters
+    ----------
+    max_jobs : int, optional
+        Maximum number of jobs kept, finished or not (default is 1000).
+    ttl : float, optional
+        Seconds a finished job is kept (default is 3600).
+    """
+
+    def __init__(self, max_jobs: int = 1000, ttl: float = 3600):
+        self.max_jobs = max_jobs
+        self.ttl = ttl
+        self._jobs: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def create(self, query: str) -> Job:
+        """
+        Registers a new pending job.
+
+        Parameters
+        ----------
+        query : str
+            Name of the query.
+
+        Returns
+        -------
+        Job
+            The job, with a random identifier.
+
+        Raises
+        ------
+        JobStoreFullError
+            If `max_jobs` jobs are still pending or running.
+        """
+        job = Job(uuid.uuid4().hex, query)
+        with self._lock:
+            self._evict()
+            if sum(not other.is_finished() for other in self._jobs.values()) >= self.max_jobs:
+                raise JobStoreFullError(f"{self.max_jobs} jobs are still running")
+            self._jobs[job.job_id] = job
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        """
+        Returns a job by its identifier.
+
+        Parameters
+        ----------
+        job_id : str
+            Identifier of the job.
+
+        Returns
+        -------
+        Job, optional
+            The job, or None if it does not exist or expired.
+        """
+        with self._lock:
+            self._evict()
+            return self._jobs.get(job_id)
+
+    def _evict(self) -> None:
+        now = time.time()
+        for job in [job for job in self._jobs.values() if job.is_finished() and now - job.finished_at > self.ttl]:
+            del self._jobs[job.job_id]
+        excess = len(self._jobs) - self.max_jobs + 1
+        if excess > 0:
+            for job in [job for job in self._jobs.values() if job.is_finished()][:excess]:
+                del self._jobs[job.job_id]
+
+def format_event(event: str, data: Any) -> str:
+    """
+    Formats a server-sent event with a JSON payload.
+
+    Parameters
+    ----------
+    event : str
+        Name of the event.
+    data : Any
+        Payload; dates and other values not supported by JSON are converted to
+        strings.
+
+    Returns
+    -------
+    str
+        The event in the text/event-stream format.
+    """
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+async def stream_events(job: Job, interval: float = 0.5) -> AsyncIterator[str]:
+    """
+    Streams the changes of a job as server-sent events until it finishes.
+
+    A 'status' event is sent first and on every status change, a 'progress'
+    event on every new progress report and a final 'done' event with the result
+    or 'failed' event with the error.
+
+    Parameters
+    ----------
+    job : Job
+        Job to follow.
+    interval : float, optional
+        Seconds between checks for changes (default is 0.5).
+
+    Yields
+    ------
+    str
+        Server-sent events.
+    """
+    version, status, progress = None, None, None
+    while True:
+        if job.version != version:
+            version = job.version
+            state = job.to_dict()
+            if state['status'] != status:
+                status = state['status']
+                yield format_event('status', {'job_id': job.job_id, 'status': status})
+            if state['progress'] is not None and state['progress'] is not progress:
+                progress = state['progress']
+                yield format_event('progress', progress)
+            if status == DONE:
+                yield format_event('done', state['result'])
+                return
+            if status == FAILED:
+                yield format_event('failed', {'error': state['error']})
+                return
+        await asyncio.sleep(interval)
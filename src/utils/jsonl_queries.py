@@ -0,0 +1,214 @@
+import datetime
+import logging
+import os
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+from utils.aggregation import QUESTIONS, TweetAggregates, top_answers, top_counts, top_dates_with_users
+from utils.data_conversion import iter_record_batches
+from utils.filters import DateInput, TweetFilter, resolve_filter
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 50_000
+
+def aggregate_jsonl(
+    file_path: str,
+    questions: List[str],
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    tweet_filter: Optional[TweetFilter] = None
+) -> TweetAggregates:
+    """
+    Streams a JSONL file of tweets once and aggregates the fields needed by some questions.
+
+    Only the fields of the requested questions are projected into the Arrow
+    batches, and only `batch_size` rows are held at a time, so memory is bounded
+    by the size of the aggregates rather than the size of the file. Rows outside
+    the filter are dropped from each batch before aggregating.
+
+    Parameters
+    ----------
+    file_path : str
+        Path to the JSONL file.
+    questions : List[str]
+        Questions to aggregate, among 'q1', 'q2' and 'q3'.
+    batch_size : int, optional
+        Number of rows parsed per batch (default is 50000).
+    tweet_filter : TweetFilter, optional
+        Tweets to aggregate (default is every tweet).
+
+    Returns
+    -------
+    TweetAggregates
+        Aggregates with the counters of the requested questions filled.
+
+    Raises
+    ------
+    FileNotFoundError
+        If the specified file does not exist.
+    ValueError
+        If a line of the file is not valid JSON.
+    """
+    if not os.path.exists(file_path):
+        raise FileNotFoundError(f"File not found: {file_path}")
+
+    tweet_filter = tweet_filter or TweetFilter()
+    columns = [column for question in questions for column in QUESTIONS[question][0]]
+    columns += [column for column in tweet_filter.columns() if column not in columns]
+    updaters = [QUESTIONS[question][1] for question in questions]
+    aggregates = TweetAggregates()
+    processed_rows = 0
+
+    for batch in iter_record_batches(file_path, batch_size, columns):
+        batch = tweet_filter.apply(batch)
+        for update in updaters:
+            update(batch, aggregates)
+        processed_rows += batch.num_rows
+
+    logger.info(f"Processed {processed_rows:,} JSONL records")
+    return aggregates
+
+def q1_json(
+    file_path: str,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    n: int = 10,
+    start_date: DateInput = None,
+    end_date: DateInput = None,
+    usernames: Union[str, Iterable[str], None] = None
+) -> List[Tuple[datetime.date, str]]:
+    """
+    Returns the top `n` dates with the most tweets and, for each one, the user with
+    the most tweets, streaming a JSONL file instead of reading its Parquet conversion.
+
+    Parameters
+    ----------
+    file_path : str
+        Path to the JSONL file.
+    batch_size : int, optional
+        Number of rows parsed per batch (default is 50000).
+    n : int, optional
+        Number of dates to return (default is 10).
+    start_date : datetime.date or str, optional
+        First day of the tweets considered (default is no lower bound).
+    end_date : datetime.date or str, optional
+        Last day of the tweets considered (default is no upper bound).
+    usernames : str or Iterable[str], optional
+        Only consider the tweets of these users (default is every user).
+
+    Returns
+    -------
+    List[Tuple[datetime.date, str]]
+        A list of tuples containing:
+            - Date (datetime.date)
+            - Username (str) with the highest number of tweets on that date.
+    """
+    tweet_filter = resolve_filter(start_date, end_date, usernames)
+    return top_dates_with_users(aggregate_jsonl(file_path, ['q1'], batch_size, tweet_filter), n)
+
+def q2_json(
+    file_path: str,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    n: int = 10,
+    start_date: DateInput = None,
+    end_date: DateInput = None,
+    usernames: Union[str, Iterable[str], None] = None
+) -> List[Tuple[str, int]]:
+    """
+    Returns the top `n` most used emojis and their counts, streaming a JSONL file
+    instead of reading its Parquet conversion.
+
+    Parameters
+    ----------
+    file_path : str
+        Path to the JSONL file.
+    batch_size : int, optional
+        Number of rows parsed per batch (default is 50000).
+    n : int, optional
+        Number of emojis to return (default is 10).
+    start_date : datetime.date or str, optional
+        First day of the tweets considered (default is no lower bound).
+    end_date : datetime.date or str, optional
+        Last day of the tweets considered (default is no upper bound).
+    usernames : str or Iterable[str], optional
+        Only consider the tweets of these users (default is every user).
+
+    Returns
+    -------
+    List[Tuple[str, int]]
+        A list of tuples containing:
+            - Emoji (str)
+            - Count (int)
+    """
+    tweet_filter = resolve_filter(start_date, end_date, usernames)
+    return aggregate_jsonl(file_path, ['q2'], batch_size, tweet_filter).emoji_counts.most_common(n)
+
+def q3_json(
+    file_path: str,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    n: int = 10,
+    start_date: DateInput = None,
+    end_date: DateInput = None,
+    usernames: Union[str, Iterable[str], None] = None
+) -> List[Tuple[str, int]]:
+    """
+    Returns the top `n` most mentioned users and their mention counts, streaming a
+    JSONL file instead of reading its Parquet conversion.
+
+    Parameters
+    ----------
+    file_path : str
+        Path to the JSONL file.
+    batch_size : int, optional
+        Number of rows parsed per batch (default is 50000).
+    n : int, optional
+        Number of users to return (default is 10).
+    start_date : datetime.date or str, optional
+        First day of the tweets considered (default is no lower bound).
+    end_date : datetime.date or str, optional
+        Last day of the tweets considered (default is no upper bound).
+    usernames : str or Iterable[str], optional
+        Only consider the tweets of these users (default is every user).
+
+    Returns
+    -------
+    List[Tuple[str, int]]
+        A list of tuples containing:
+            - Username (str)
+            - Number of mentions (int)
+    """
+    tweet_filter = resolve_filter(start_date, end_date, usernames)
+    return top_counts(aggregate_jsonl(file_path, ['q3'], batch_size, tweet_filter).mention_counts, n)
+
+def report_json(
+    file_path: str,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    n: int = 10,
+    start_date: DateInput = None,
+    end_date: DateInput = None,
+    usernames: Union[str, Iterable[str], None] = None
+) -> Dict[str, List[Tuple]]:
+    """
+    Answers q1, q2 and q3 from a single streaming pass over a JSONL file of tweets.
+
+    Parameters
+    ----------
+    file_path : str
+        Path to the JSONL file.
+    batch_size : int, optional
+        Number of rows parsed per batch (default is 50000).
+    n : int, optional
+        Number of items per answer to return (default is 10).
+    start_date : datetime.date or str, optional
+        First day of the tweets considered (default is no lower bound).
+    end_date : datetime.date or str, optional
+        Last day of the tweets considered (default is no upper bound).
+    usernames : str or Iterable[str], optional
+        Only consider the tweets of these users (default is every user).
+
+    Returns
+    -------
+    Dict[str, List[Tuple]]
+        A dictionary with the 'q1', 'q2' and 'q3' answers, as in `report.report`.
+    """
+    tweet_filter = resolve_filter(start_date, end_date, usernames)
+    return top_answers(aggregate_jsonl(file_path, list(QUESTIONS), batch_size, tweet_filter), QUESTIONS, n)
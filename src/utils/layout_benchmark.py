@@ -0,0 +1,157 @@
+import argparse
+import datetime
+import logging
+import os
+import tempfile
+import pyarrow.parquet as pq
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from utils.data_conversion import write_layout
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+Q1_COLUMNS = ['date', 'username']
+
+# Hive partition values written for rows whose partition column is null.
+NULL_PARTITIONS = ('NULL', '__HIVE_DEFAULT_PARTITION__')
+
+def _parquet_files(path: str) -> Iterator[str]:
+   if os.path.isfile(path):
+       yield path
+       return
+   for root, dirs, files in os.walk(path):
+       dirs.sort()
+       for name in sorted(files):
+           if name.endswith('.parquet'):
+               yield os.path.join(root, name)
+
+def _day_partition(file_path: str) -> Tuple[bool, Optional[datetime.date]]:
+   for part in file_path.split(os.sep):
+       if part.startswith('day='):
+           value = part[len('day='):]
+           return True, None if value in NULL_PARTITIONS else datetime.date.fromisoformat(value)
+   return False, None
+
+def _as_datetime(value: datetime.date, end: bool = False) -> datetime.datetime:
+   day = datetime.datetime.combine(value, datetime.time.min)
+   return day + datetime.timedelta(days=1) if end else day
+
+def scan_bytes(
+   path: str,
+   columns: List[str],
+   start_date: Optional[datetime.date] = None,
+   end_date: Optional[datetime.date] = None
+) -> int:
+   """
+   Computes the compressed bytes a reader has to scan to read some columns of the
+   tweets between two dates, skipping what the Parquet metadata allows to skip.
+
+   Hive 'day=' directories outside the range are skipped by path and row groups
+   whose `date` min/max statistics do not intersect the range are skipped by stats.
+   The directory of tweets without a date ('day=NULL') is only read by full scans.
+
+   Parameters
+   ----------
+   path : str
+       Path to a Parquet file or to a directory of Parquet files.
+   columns : List[str]
+       Columns to read.
+   start_date : datetime.date, optional
+       First day to read (default is None, no lower bound).
+   end_date : datetime.date, optional
+       Last day to read, inclusive (default is None, no upper bound).
+
+   Returns
+   -------
+   int
+       Total compressed size in bytes of the column chunks that must be read.
+   """
+   lower = _as_datetime(start_date) if start_date else None
+   upper = _as_datetime(end_date, end=True) if end_date else None
+   total = 0
+
+   for file_path in _parquet_files(path):
+       partitioned, day = _day_partition(file_path)
+       if partitioned and day is None and (start_date or end_date):
+           continue
+       if day and ((start_date and day < start_date) or (end_date and day > end_date)):
+           continue
+
+       metadata = pq.ParquetFile(file_path).metadata
+       names = [metadata.schema.column(index).path.split('.')[0] for index in range(metadata.num_columns)]
+       for row_group_index in range(metadata.num_row_groups):
+           row_group = metadata.row_group(row_group_index)
+           stats = row_group.column(names.index('date')).statistics
+           if stats is not None and stats.has_min_max:
+               if (lower and stats.max < lower) or (upper and stats.min >= upper):
+                   continue
+           total += sum(
+               row_group.column(index).total_compressed_size
+               for index, name in enumerate(names) if name in columns
+           )
+
+   return total
+
+def compare_layouts(
+   input_parquet_path: str,
+   start_date: datetime.date,
+   end_date: datetime.date,
+   row_group_size: int = 100_000,
+   work_dir: Optional[str] = None
+) -> Dict[str, Dict[str, int]]:
+   """
+   Rewrites a Parquet file of tweets in each layout and reports the bytes scanned
+   by q1 over the whole file and over a date range, before and after the rewrite.
+
+   Parameters
+   ----------
+   input_parquet_path : str
+       Path to the Parquet file in the default layout.
+   start_date : datetime.date
+       First day of the date-restricted scan.
+   end_date : datetime.date
+       Last day of the date-restricted scan, inclusive.
+   row_group_size : int, optional
+       Number of rows per row group of the rewritten files (default is 100000).
+   work_dir : str, optional
+       Directory where the rewritten layouts are kept (default is a temporary
+       directory removed afterwards).
+
+   Returns
+   -------
+   Dict[str, Dict[str, int]]
+       For each layout, the bytes scanned by a full scan ('full') and by the
+       date-restricted scan ('range').
+   """
+   with tempfile.TemporaryDirectory() as temp_dir:
+       work_dir = work_dir or temp_dir
+       paths = {
+           'default': input_parquet_path,
+           'sorted': os.path.join(work_dir, 'sorted.parquet'),
+           'partitioned': os.path.join(work_dir, 'partitioned'),
+       }
+       results = {}
+       for layout, path in paths.items():
+           if layout != 'default':
+               logger.info(f"Writing {layout} layout to {path}")
+               write_layout(input_parquet_path, path, layout, row_group_size)
+           results[layout] = {
+               'full': scan_bytes(path, Q1_COLUMNS),
+               'range': scan_bytes(path, Q1_COLUMNS, start_date, end_date),
+           }
+       return results
+
+if __name__ == '__main__':
+   parser = argparse.ArgumentParser(description='Compares the bytes scanned by q1 on each Parquet layout.')
+   parser.add_argument('file_path', help='Parquet file in the default layout')
+   parser.add_argument('start_date', type=datetime.date.fromisoformat)
+   parser.add_argument('end_date', type=datetime.date.fromisoformat)
+   parser.add_argument('--row-group-size', type=int, default=100_000)
+   parser.add_argument('--work-dir', default=None)
+   args = parser.parse_args()
+
+   results = compare_layouts(args.file_path, args.start_date, args.end_date, args.row_group_size, args.work_dir)
+   print(f"{'layout':<12} {'full scan':>14} {'range scan':>14}")
+   for layout, scanned in results.items():
+       print(f"{layout:<12} {scanned['full']:>14,} {scanned['range']:>14,}")
@@ -1,16 +1,21 @@
-import duckdb
 import datetime
 from typing import List, Tuple
 
-def q1_memory_json(file_path: str) -> List[Tuple[datetime.date, str]]:
+from utils.jsonl_queries import DEFAULT_BATCH_SIZE, q1_json
+
+def q1_memory_json(file_path: str, batch_size: int = DEFAULT_BATCH_SIZE) -> List[Tuple[datetime.date, str]]:
    """
    Processes a JSONL file containing tweet data to find the users with the most tweets
-   for each of the top 10 days by tweet volume. Uses memory optimization through chunked processing.
+   for each of the top 10 days by tweet volume. The file is streamed once, projecting
+   only the date and username of each tweet, so memory stays bounded by the number of
+   distinct (day, user) pairs.
 
    Parameters
    ----------
    file_path : str
        Path to the JSONL file.
+   batch_size : int, optional
+       Number of rows parsed per batch (default is 50000).
 
    Returns
    -------
@@ -25,75 +30,7 @@ def q1_memory_json(file_path: str) -> List[Tuple[datetime.date, str]]:
    ------
    FileNotFoundError
        If the specified file does not exist.
-   duckdb.BinderException
-       If there is an error in the file structure or SQL queries.
-   duckdb.Error
-       If there are issues with database operations.
    ValueError
-       If the date format in the JSON file is invalid.
-   MemoryError
-       If there is insufficient memory to process the data chunks.
-   Exception
-       If an unexpected error occurs during processing.
+       If a line of the file is not valid JSON.
    """
-   con = duckdb.connect(database=':memory:')
-
-   con.execute("""
-   CREATE TABLE IF NOT EXISTS tweets (
-       tweet_date DATE,
-       username VARCHAR
-   );
-   """)
-
-   try:
-       offset = 0
-       chunk_size = 200000 
-       while True:
-           query = f"""
-           INSERT INTO tweets
-           SELECT
-               date_trunc('day', CAST(date AS TIMESTAMP))::DATE AS tweet_date,
-               user->>'username' AS username
-           FROM read_json_auto('{file_path}', maximum_object_size=1000000)
-           LIMIT {chunk_size} OFFSET {offset};
-           """
-           con.execute(query)
-
-           if con.execute("SELECT COUNT(*) FROM tweets;").fetchone()[0] < offset + chunk_size:
-               break
-           offset += chunk_size
-
-       top_dates = con.execute("""
-       SELECT
-           tweet_date,
-           COUNT(*) AS tweet_count
-       FROM tweets
-       GROUP BY tweet_date
-       ORDER BY tweet_count DESC
-       LIMIT 10;
-       """).fetchall()
-
-       results = []
-       for row in top_dates:
-           tweet_date = row[0]
-           top_user = con.execute(f"""
-           SELECT
-               username,
-               COUNT(*) AS user_tweet_count
-           FROM tweets
-           WHERE tweet_date = '{tweet_date}'
-           GROUP BY username
-           ORDER BY user_tweet_count DESC
-           LIMIT 1;
-           """).fetchone()
-           results.append((tweet_date, top_user[0]))
-
-   except duckdb.BinderException:
-       con.close()
-       return []
-   except Exception as e:
-       con.close()
-       raise e
-
-   con.close()
-   return results
+   return q1_json(file_path, batch_size)
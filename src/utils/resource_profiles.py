@@ -0,0 +1,115 @@
+import logging
+import multiprocessing
+import os
+import tempfile
+from dataclasses import dataclass, replace
+from typing import Dict, Optional, Union
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+SPILL_DIRECTORY = os.environ.get('DUCKDB_SPILL_DIRECTORY', os.path.join(tempfile.gettempdir(), 'duckdb_spill'))
+
+@dataclass(frozen=True)
+class ResourceProfile:
+    """
+    DuckDB resources granted to a query.
+
+    Attributes
+    ----------
+    threads : int, optional
+        Number of DuckDB threads (None keeps DuckDB's default, one per core).
+    memory_limit : str, optional
+        Maximum memory of the buffer manager, e.g. '256MB'. Beyond it, sorts,
+        aggregates and temporary tables spill to `temp_directory` (None keeps
+        DuckDB's default of 80% of the RAM).
+    temp_directory : str, optional
+        Directory where DuckDB spills to disk (None keeps DuckDB's default).
+    enable_object_cache : bool
+        Whether to cache the Parquet metadata of the files read.
+    preserve_insertion_order : bool
+        Whether results must keep the order of the input; disabling it lets
+        DuckDB stream aggregations with less memory.
+    """
+    threads: Optional[int] = None
+    memory_limit: Optional[str] = None
+    temp_directory: Optional[str] = None
+    enable_object_cache: bool = True
+    preserve_insertion_order: bool = True
+
+    def settings(self) -> Dict:
+        """
+        Returns the profile as DuckDB configuration options.
+
+        Returns
+        -------
+        Dict
+            Options accepted by `duckdb.connect(config=...)` and `duckdb_pool.connection`.
+        """
+        return {
+            'threads': self.threads,
+            'memory_limit': self.memory_limit,
+            'temp_directory': self.temp_directory,
+            'enable_object_cache': self.enable_object_cache,
+            'preserve_insertion_order': self.preserve_insertion_order,
+        }
+
+PROFILES: Dict[str, ResourceProfile] = {
+    # Interactive requests on small and medium files: every core, metadata cached.
+    'latency': ResourceProfile(
+        threads=int(os.environ.get('DUCKDB_LATENCY_THREADS', multiprocessing.cpu_count())),
+    ),
+    # Hard memory cap for constrained containers: one thread, spilling early.
+    'low-memory': ResourceProfile(
+        threads=int(os.environ.get('DUCKDB_LOW_MEMORY_THREADS', 1)),
+        memory_limit=os.environ.get('DUCKDB_LOW_MEMORY_LIMIT', '256MB'),
+        temp_directory=SPILL_DIRECTORY,
+        enable_object_cache=False,
+        preserve_insertion_order=False,
+    ),
+    # Large one-off scans: every core, a bounded budget and spilling to disk.
+    'batch': ResourceProfile(
+        threads=int(os.environ.get('DUCKDB_BATCH_THREADS', multiprocessing.cpu_count())),
+        memory_limit=os.environ.get('DUCKDB_BATCH_MEMORY_LIMIT', '4GB'),
+        temp_directory=SPILL_DIRECTORY,
+        enable_object_cache=False,
+        preserve_insertion_order=False,
+    ),
+}
+
+def resolve_profile(
+    profile: Union[str, ResourceProfile, None],
+    default: str,
+    **overrides
+) -> ResourceProfile:
+    """
+    Resolves a profile name or instance, applying explicit per-call overrides.
+
+    Parameters
+    ----------
+    profile : str or ResourceProfile, optional
+        Name of a profile in PROFILES, a ResourceProfile, or None for `default`.
+    default : str
+        Name of the profile used when `profile` is None.
+    **overrides
+        Fields of the profile to replace; None values are ignored.
+
+    Returns
+    -------
+    ResourceProfile
+        The resolved profile.
+
+    Raises
+    ------
+    ValueError
+        If the profile name is unknown.
+    """
+    if profile is None:
+        profile = default
+    if isinstance(profile, str):
+        if profile not in PROFILES:
+            raise ValueError(f"Unknown resource profile {profile!r}, expected one of {list(PROFILES)}")
+        profile = PROFILES[profile]
+
+    overrides = {name: value for name, value in overrides.items() if value is not None}
+    return replace(profile, **overrides) if overrides else profile
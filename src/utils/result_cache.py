@@ -0,0 +1,247 @@
+import asyncio
+import hashlib
+import logging
+import os
+import pickle
+import struct
+import threading
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+PARQUET_MAGIC = b'PAR1'
+
+_MISSING = object()
+
+def file_fingerprint(file_path: str) -> Tuple:
+    """
+    Builds a fingerprint that changes whenever the content of a file may have changed.
+
+    The fingerprint holds the absolute path, size and modification time of the file
+    and, for Parquet files, a hash of the footer, which also catches rewrites that
+    keep the same size and modification time.
+
+    Parameters
+    ----------
+    file_path : str
+        Path to the file.
+
+    Returns
+    -------
+    Tuple
+        A hashable fingerprint of the file.
+
+    Raises
+    ------
+    FileNotFoundError
+        If the specified file does not exist.
+    """
+    stat = os.stat(file_path)
+    footer_hash = None
+    if stat.st_size >= 12:
+        with open(file_path, 'rb') as file:
+            file.seek(-8, os.SEEK_END)
+            footer_length, magic = struct.unpack('<I4s', file.read(8))
+            if magic == PARQUET_MAGIC and footer_length <= stat.st_size - 12:
+                file.seek(-8 - footer_length, os.SEEK_END)
+                footer_hash = hashlib.sha1(file.read(footer_length)).hexdigest()
+    return os.path.abspath(file_path), stat.st_size, stat.st_mtime_ns, footer_hash
+
+class ResultCache:
+    """
+    LRU cache of query results with an optional on-disk tier and single-flight
+    de-duplication of concurrent computations of the same key.
+
+    The on-disk tier is also LRU: reading an entry back from disk refreshes its
+    modification time, and the entries with the oldest one are removed first.
+    In `get_or_compute`, disk reads and writes run in the default executor so
+    they never block the event loop.
+
+    Parameters
+    ----------
+    max_entries : int, optional
+        Maximum number of results kept in memory (default is 256).
+    disk_dir : str, optional
+        Directory where results are also pickled, so they survive restarts and
+        in-memory evictions (default is None, memory only).
+    max_disk_entries : int, optional
+        Maximum number of results kept on disk (default is 4096).
+    """
+
+    def __init__(self, max_entries: int = 256, disk_dir: Optional[str] = None, max_disk_entries: int = 4096):
+        self.max_entries = max_entries
+        self.disk_dir = disk_dir
+        self.max_disk_entries = max_disk_entries
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """
+        Returns the cached result for a key, looking in memory first and then on disk.
+
+        Parameters
+        ----------
+        key : Hashable
+            Cache key.
+        default : Any, optional
+            Value returned when the key is not cached (default is None).
+
+        Returns
+        -------
+        Any
+            The cached result, or `default`.
+        """
+        value = self._get_memory(key)
+        if value is not _MISSING:
+            return value
+
+        value = self._read_disk(key)
+        if value is _MISSING:
+            return default
+        self._put_memory(key, value)
+        return value
+
+    def put(self, key: Hashable, value: Any) -> None:
+        """
+        Stores a result in memory and, if configured, on disk.
+
+        Parameters
+        ----------
+        key : Hashable
+            Cache key.
+        value : Any
+            Picklable result to store.
+        """
+        self._put_memory(key, value)
+        self._write_disk(key, value)
+
+    def clear(self) -> None:
+        """
+        Removes every result kept in memory.
+        """
+        with self._lock:
+            self._entries.clear()
+
+    async def get_or_compute(
+        self,
+        key: Hashable,
+        compute: Callable[[], Awaitable[Any]],
+        single_flight: bool = True
+    ) -> Any:
+        """
+        Returns the cached result for a key, computing it once if it is missing.
+
+        Concurrent calls with the same key while the result is being computed wait
+        for the same computation instead of starting their own. Failed computations
+        are not cached. The result is returned as soon as it is computed; its copy
+        on disk is written in the background.
+
+        Parameters
+        ----------
+        key : Hashable
+            Cache key.
+        compute : Callable[[], Awaitable[Any]]
+            Coroutine function computing the result.
+        single_flight : bool, optional
+            Whether to share the computation with concurrent calls for the same
+            key (default is True). With False, the call neither joins nor can be
+            joined by another computation, but its result is still cached.
+
+        Returns
+        -------
+        Any
+            The cached or freshly computed result.
+        """
+        value = self._get_memory(key)
+        if value is not _MISSING:
+            return value
+        if not single_flight:
+            return await self._load_or_compute(key, compute)
+
+        future = self._inflight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(self._load_or_compute(key, compute))
+            self._inflight[key] = future
+            future.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await asyncio.shield(future)
+
+    async def _load_or_compute(self, key: Hashable, compute: Callable[[], Awaitable[Any]]) -> Any:
+        loop = asyncio.get_running_loop()
+        if self.disk_dir:
+            value = await loop.run_in_executor(None, self._read_disk, key)
+            if value is not _MISSING:
+                self._put_memory(key, value)
+                return value
+
+        value = await compute()
+        self._put_memory(key, value)
+        if self.disk_dir:
+            loop.run_in_executor(None, self._write_disk, key, value)
+        return value
+
+    def _get_memory(self, key: Hashable) -> Any:
+        with self._lock:
+            if key not in self._entries:
+                return _MISSING
+            self._entries.move_to_end(key)
+            return self._entries[key]
+
+    def _put_memory(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _disk_path(self, key: Hashable) -> str:
+        digest = hashlib.sha256(repr(key).encode('utf-8')).hexdigest()
+        return os.path.join(self.disk_dir, f'{digest}.pkl')
+
+    def _read_disk(self, key: Hashable) -> Any:
+        if not self.disk_dir:
+            return _MISSING
+        path = self._disk_path(key)
+        try:
+            with open(path, 'rb') as file:
+                stored_key, value = pickle.load(file)
+        except FileNotFoundError:
+            return _MISSING
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable cache entry: {e}")
+            return _MISSING
+        if stored_key != key:
+            return _MISSING
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return value
+
+    def _write_disk(self, key: Hashable, value: Any) -> None:
+        if not self.disk_dir:
+            return
+        path = self._disk_path(key)
+        temp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        try:
+            with open(temp_path, 'wb') as file:
+                pickle.dump((key, value), file)
+            os.replace(temp_path, path)
+            self._evict_disk()
+        except OSError as e:
+            logger.warning(f"Could not write cache entry to disk: {e}")
+
+    def _evict_disk(self) -> None:
+        entries = [entry for entry in os.scandir(self.disk_dir) if entry.name.endswith('.pkl')]
+        if len(entries) <= self.max_disk_entries:
+            return
+        entries.sort(key=lambda entry: entry.stat().st_mtime_ns)
+        for entry in entries[:len(entries) - self.max_disk_entries]:
+            try:
+                os.remove(entry.path)
+            except FileNotFoundError:
+                pass
@@ -0,0 +1,150 @@
+import heapq
+import itertools
+import math
+from typing import Dict, Hashable, Iterable, List, Tuple
+
+DEFAULT_EPSILON = 1e-4
+
+def capacity_for_error(epsilon: float) -> int:
+    """
+    Returns the number of counters a Space-Saving sketch needs so that no count is
+    overestimated by more than `epsilon` times the total weight of the stream.
+
+    Parameters
+    ----------
+    epsilon : float
+        Maximum error, as a fraction of the total weight (0 < epsilon <= 1).
+
+    Returns
+    -------
+    int
+        Number of counters.
+
+    Raises
+    ------
+    ValueError
+        If epsilon is not in (0, 1].
+    """
+    if not 0 < epsilon <= 1:
+        raise ValueError(f"epsilon must be in (0, 1], got {epsilon}")
+    return math.ceil(1 / epsilon)
+
+class SpaceSaving:
+    """
+    Space-Saving sketch of the heaviest items of a weighted stream, in fixed memory.
+
+    At most `capacity` items are monitored. When a new item arrives and the sketch
+    is full, the item with the smallest count is replaced and the new item inherits
+    that count as its error. For every monitored item the true count lies in
+    [count - error, count], and errors never exceed total / capacity, so every
+    item heavier than that bound is guaranteed to be monitored.
+
+    Parameters
+    ----------
+    capacity : int
+        Maximum number of monitored items.
+    """
+
+    def __init__(self, capacity: int):
+        if capacity < 1:
+            raise ValueError(f"capacity must be positive, got {capacity}")
+        self.capacity = capacity
+        self.total = 0
+        self.counts: Dict[Hashable, int] = {}
+        self.errors: Dict[Hashable, int] = {}
+        # Lazy min-heap of (count, sequence, item): entries whose count is stale
+        # are skipped when popped, and the heap is rebuilt when it grows too much.
+        self._heap: List[Tuple[int, int, Hashable]] = []
+        self._sequence = itertools.count()
+
+    def update(self, item: Hashable, weight: int = 1) -> None:
+        """
+        Adds `weight` occurrences of an item to the sketch.
+
+        Parameters
+        ----------
+        item : Hashable
+            Item seen in the stream.
+        weight : int, optional
+            Number of occurrences (default is 1).
+        """
+        self.total += weight
+        counts = self.counts
+        if item in counts:
+            counts[item] += weight
+        elif len(counts) < self.capacity:
+            counts[item] = weight
+            self.errors[item] = 0
+        else:
+            min_count, min_item = self._pop_min()
+            del counts[min_item]
+            del self.errors[min_item]
+            counts[item] = min_count + weight
+            self.errors[item] = min_count
+
+        heapq.heappush(self._heap, (counts[item], next(self._sequence), item))
+        if len(self._heap) > 8 * self.capacity + 1024:
+            self._rebuild_heap()
+
+    def update_counts(self, counts: Iterable[Tuple[Hashable, int]]) -> None:
+        """
+        Adds pre-aggregated (item, weight) pairs, e.g. the value counts of a batch.
+
+        Parameters
+        ----------
+        counts : Iterable[Tuple[Hashable, int]]
+            Items with their number of occurrences.
+        """
+        for item, weight in counts:
+            self.update(item, weight)
+
+    def max_error(self) -> int:
+        """
+        Returns the largest possible overestimation of any count in the sketch.
+
+        Returns
+        -------
+        int
+            Zero while the sketch is not full, otherwise the smallest monitored count.
+        """
+        if len(self.counts) < self.capacity:
+            return 0
+        return self._peek_min()
+
+    def top(self, n: int = 10) -> List[Tuple[Hashable, int, int]]:
+        """
+        Returns the items with the highest estimated counts.
+
+        Parameters
+        ----------
+        n : int, optional
+            Number of items to return (default is 10).
+
+        Returns
+        -------
+        List[Tuple[Hashable, int, int]]
+            A list of tuples containing:
+                - Item
+                - Estimated count, an upper bound of the true count
+                - Error: the true count is at least count - error
+        """
+        ranked = heapq.nsmallest(n, self.counts.items(), key=lambda item: (-item[1], self.errors[item[0]]))
+        return [(item, count, self.errors[item]) for item, count in ranked]
+
+    def _peek_min(self) -> int:
+        while self._heap:
+            count, _, item = self._heap[0]
+            if self.counts.get(item) == count:
+                return count
+            heapq.heappop(self._heap)
+        return 0
+
+    def _pop_min(self) -> Tuple[int, Hashable]:
+        while True:
+            count, _, item = heapq.heappop(self._heap)
+            if self.counts.get(item) == count:
+                return count, item
+
+    def _rebuild_heap(self) -> None:
+        self._heap = [(count, next(self._sequence), item) for item, count in self.counts.items()]
+        heapq.heapify(self._heap)
@@ -0,0 +1,155 @@
+import atexit
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Optional
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_WORKERS = int(os.environ.get('WORKER_POOL_SIZE', min(multiprocessing.cpu_count(), 16)))
+DEFAULT_MAX_PENDING = int(os.environ.get('WORKER_POOL_MAX_PENDING', DEFAULT_MAX_WORKERS * 4))
+# Workers are never forked from the API process, which by the time the pool starts
+# has threads, held locks and open DuckDB databases a forked child would inherit.
+START_METHOD = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+
+class PoolSaturatedError(RuntimeError):
+    """
+    Raised when a task cannot be queued because the worker pool is saturated.
+    """
+
+_lock = threading.Lock()
+_pool: Optional[ProcessPoolExecutor] = None
+_slots: Optional[threading.BoundedSemaphore] = None
+_max_workers = DEFAULT_MAX_WORKERS
+
+def warm_up_worker() -> None:
+    """
+    Initializes a worker process by importing pyarrow and building the emoji tables,
+    so the first task served by the worker does not pay for it.
+    """
+    import pyarrow.parquet  # noqa: F401
+    from utils.emoji_counter import extract_emojis
+
+    extract_emojis('warm up 😀')
+
+def start_pool(
+    max_workers: int = DEFAULT_MAX_WORKERS,
+    max_pending: int = DEFAULT_MAX_PENDING
+) -> ProcessPoolExecutor:
+    """
+    Starts the process-wide worker pool, if it is not already running.
+
+    Workers are started with the START_METHOD start method, so they begin from a
+    clean interpreter instead of a copy of the calling process.
+
+    Parameters
+    ----------
+    max_workers : int, optional
+        Number of worker processes (default is the number of CPUs, up to 16,
+        or the WORKER_POOL_SIZE environment variable).
+    max_pending : int, optional
+        Maximum number of tasks queued or running at the same time (default is
+        four per worker, or the WORKER_POOL_MAX_PENDING environment variable).
+
+    Returns
+    -------
+    ProcessPoolExecutor
+        The running worker pool.
+    """
+    global _pool, _slots, _max_workers
+    with _lock:
+        if _pool is None:
+            logger.info(f"Starting worker pool with {max_workers} processes")
+            _pool = ProcessPoolExecutor(max_workers=max_workers, initializer=warm_up_worker,
+                                        mp_context=multiprocessing.get_context(START_METHOD))
+            _slots = threading.BoundedSemaphore(max(max_pending, 1))
+            _max_workers = max_workers
+        return _pool
+
+def get_pool() -> ProcessPoolExecutor:
+    """
+    Returns the process-wide worker pool, starting it with the default settings if needed.
+
+    Returns
+    -------
+    ProcessPoolExecutor
+        The running worker pool.
+    """
+    return _pool if _pool is not None else start_pool()
+
+def pool_size() -> int:
+    """
+    Returns the number of worker processes of the pool.
+
+    Returns
+    -------
+    int
+        Number of worker processes.
+    """
+    return _max_workers
+
+def shutdown_pool(wait: bool = True) -> None:
+    """
+    Shuts down the process-wide worker pool, if it is running.
+
+    Parameters
+    ----------
+    wait : bool, optional
+        Whether to wait for the running tasks to finish (default is True).
+    """
+    global _pool, _slots
+    with _lock:
+        pool, _pool, _slots = _pool, None, None
+    if pool is not None:
+        logger.info("Shutting down worker pool")
+        pool.shutdown(wait=wait, cancel_futures=not wait)
+
+def submit(function: Callable, *args, timeout: Optional[float] = None) -> Future:
+    """
+    Submits a task to the worker pool, waiting for a free slot when it is saturated.
+
+    Parameters
+    ----------
+    function : Callable
+        Picklable function to run in a worker process.
+    *args
+        Arguments for the function.
+    timeout : float, optional
+        Maximum number of seconds to wait for a free slot (default is to wait
+        indefinitely; 0 fails immediately when the pool is saturated).
+
+    Returns
+    -------
+    Future
+        Future with the result of the task.
+
+    Raises
+    ------
+    PoolSaturatedError
+        If no slot becomes free within the timeout.
+    """
+    start_pool()
+    with _lock:
+        pool, slots = _pool, _slots
+    if not slots.acquire(timeout=timeout):
+        raise PoolSaturatedError("Worker pool is saturated")
+
+    try:
+        future = pool.submit(function, *args)
+    except BrokenProcessPool:
+        slots.release()
+        logger.warning("Worker pool is broken, restarting it")
+        shutdown_pool(wait=False)
+        return submit(function, *args, timeout=timeout)
+    except Exception:
+        slots.release()
+        raise
+
+    future.add_done_callback(lambda _: slots.release())
+    return future
+
+atexit.register(shutdown_pool)
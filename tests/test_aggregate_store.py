@@ -0,0 +1,99 @@
+import pytest
+import pyarrow.parquet as pq
+from src.aggregate_store import AggregateStore
+from src.q1_time import q1_time
+from src.q2_time import q2_time
+from src.q3_time import q3_time
+
+test_parquet_file_path = 'tests/resources/small_tweets.parquet'
+
+def test_aggregate_store_incremental_ingest(tmp_path):
+    """
+    Tests that ingesting a file split into hourly parts answers the three questions
+    like the standalone queries over the whole file, before and after compaction
+    and after reopening the store, whatever the order of ingestion. The store
+    breaks emoji ties by emoji rather than by first appearance.
+
+    Parameters
+    ----------
+    tmp_path : pathlib.Path
+        Temporary directory provided by pytest.
+
+    Returns
+    -------
+    None
+        Test passes if all assertions are successful.
+
+    Raises
+    ------
+    AssertionError
+        If the accumulated results differ from q1_time, q2_time and q3_time or an
+        unchanged file is ingested twice.
+    """
+    table = pq.read_table(test_parquet_file_path)
+    part_paths = []
+    for index, offset in enumerate((0, 2, 4)):
+        part_path = str(tmp_path / f'part-{index}.parquet')
+        pq.write_table(table.slice(offset, 2), part_path)
+        part_paths.append(part_path)
+
+    expected_q2 = sorted(q2_time(test_parquet_file_path), key=lambda item: (-item[1], item[0]))
+    expected = (q1_time(test_parquet_file_path), expected_q2, q3_time(test_parquet_file_path))
+    database_path = str(tmp_path / 'aggregates.duckdb')
+
+    with AggregateStore(database_path) as store:
+        assert all(store.ingest(part_path) for part_path in part_paths[:2])
+        assert store.q3() == [('user2', 1), ('user3', 1), ('user4', 1), ('user5', 1)]
+
+        assert store.ingest(part_paths[2]), "New file must be ingested"
+        assert not store.ingest(part_paths[0]), "Unchanged file must not be ingested twice"
+        assert (store.q1(), store.q2(), store.q3()) == expected
+
+        store.compact()
+        assert (store.q1(), store.q2(), store.q3()) == expected
+
+    with AggregateStore(database_path) as store:
+        assert (store.q1(), store.q2(), store.q3()) == expected
+        assert store.q2(n=1) == [('🤔', 2)]
+
+    with AggregateStore(str(tmp_path / 'reversed.duckdb')) as store:
+        for part_path in reversed(part_paths):
+            store.ingest(part_path)
+        assert (store.q1(), store.q2(), store.q3()) == expected, "Results must not depend on the ingestion order"
+
+def test_changed_compacted_file_is_rejected(tmp_path):
+    """
+    Tests that a file that changes after being compacted is rejected, since its
+    aggregates can no longer be removed, while a file that changes before
+    compaction has its aggregates replaced.
+
+    Parameters
+    ----------
+    tmp_path : pathlib.Path
+        Temporary directory provided by pytest.
+
+    Returns
+    -------
+    None
+        Test passes if all assertions are successful.
+
+    Raises
+    ------
+    AssertionError
+        If a changed file is counted twice or a compacted one is accepted.
+    """
+    table = pq.read_table(test_parquet_file_path)
+    part_path = str(tmp_path / 'part.parquet')
+    pq.write_table(table.slice(0, 2), part_path)
+
+    with AggregateStore(str(tmp_path / 'aggregates.duckdb')) as store:
+        store.ingest(part_path)
+        pq.write_table(table, part_path)
+        assert store.ingest(part_path)
+        assert store.q3() == q3_time(test_parquet_file_path), "A changed file must replace its aggregates"
+
+        store.compact()
+        pq.write_table(table.slice(0, 2), part_path)
+        with pytest.raises(ValueError, match="compacted"):
+            store.ingest(part_path)
+        assert store.q3() == q3_time(test_parquet_file_path)
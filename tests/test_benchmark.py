@@ -0,0 +1,117 @@
+import pytest
+import copy
+import pyarrow.parquet as pq
+from src.utils.benchmark import compare_to_baseline, generate_dataset, load_results, parse_scale, run_benchmarks, save_results
+from src.utils.data_conversion import SCHEMA
+
+@pytest.fixture
+def synthetic_path(tmp_path):
+    return generate_dataset(str(tmp_path / 'tweets.parquet'), 5000, emoji_density=1.0, mention_density=1.0,
+                            row_group_size=1000)
+
+def test_generate_dataset(synthetic_path, tmp_path):
+    """
+    Tests that the synthetic datasets have the tweets schema, the requested size
+    and densities, and are reproducible from their seed.
+
+    Parameters
+    ----------
+    synthetic_path : str
+        Path to a synthetic dataset of 5000 tweets.
+    tmp_path : pathlib.Path
+        Temporary directory.
+
+    Returns
+    -------
+    None
+        Test passes if all assertions are successful.
+
+    Raises
+    ------
+    AssertionError
+        If the dataset differs from what was requested.
+    """
+    table = pq.read_table(synthetic_path)
+    assert table.schema.equals(SCHEMA)
+    assert table.num_rows == 5000
+    assert pq.ParquetFile(synthetic_path).num_row_groups == 5
+
+    mentions = sum(len(users) for users in table['mentionedUsers'].to_pylist())
+    assert 0.7 < mentions / table.num_rows < 1.3, "The mention density must be close to the requested one"
+
+    same_seed = generate_dataset(str(tmp_path / 'same.parquet'), 5000, emoji_density=1.0, mention_density=1.0,
+                                 row_group_size=1000)
+    assert pq.read_table(same_seed).equals(table)
+    no_emojis = generate_dataset(str(tmp_path / 'plain.parquet'), 100, emoji_density=0)
+    assert all(content.isascii() for content in pq.read_table(no_emojis)['content'].to_pylist())
+
+    assert parse_scale('10k') == 10_000
+    assert parse_scale('100M') == 100_000_000
+    assert parse_scale('2500') == 2500
+    with pytest.raises(ValueError):
+        parse_scale('big')
+
+def test_run_benchmarks(synthetic_path, tmp_path):
+    """
+    Tests that every run reports its metrics and that the results survive a
+    round trip through JSON.
+
+    Parameters
+    ----------
+    synthetic_path : str
+        Path to a synthetic dataset of 5000 tweets.
+    tmp_path : pathlib.Path
+        Temporary directory.
+
+    Returns
+    -------
+    None
+        Test passes if all assertions are successful.
+
+    Raises
+    ------
+    AssertionError
+        If a metric is missing or invalid.
+    """
+    results = run_benchmarks({'5k': synthetic_path}, ['q1_time', 'q3_memory'], repeat=2)
+
+    for implementation in ('q1_time', 'q3_memory'):
+        summary = results['results']['5k'][implementation]
+        assert len(summary['runs']) == 2
+        assert summary['wall_time'] > 0 and summary['cpu_time'] >= 0
+        assert summary['peak_rss_mb'] > 0
+        assert all(run['num_results'] == 10 for run in summary['runs'])
+
+    output_path = str(tmp_path / 'results' / 'baseline.json')
+    save_results(results, output_path)
+    assert load_results(output_path) == results
+
+def test_compare_to_baseline():
+    """
+    Tests that only the increases above the threshold of the metrics checked for
+    each variant are reported as regressions.
+
+    Returns
+    -------
+    None
+        Test passes if all assertions are successful.
+
+    Raises
+    ------
+    AssertionError
+        If a regression is missed or wrongly reported.
+    """
+    baseline = {'results': {'1m': {
+        'q2_time': {'wall_time': 10.0, 'cpu_time': 40.0, 'peak_rss_mb': 500.0, 'bytes_read': 100},
+        'q2_memory': {'wall_time': 20.0, 'cpu_time': 20.0, 'peak_rss_mb': 100.0, 'bytes_read': 100},
+    }}}
+    current = copy.deepcopy(baseline)
+    current['results']['1m']['q2_time'].update(wall_time=10.5, peak_rss_mb=900.0)
+    current['results']['1m']['q2_memory'].update(peak_rss_mb=120.0, cpu_time=30.0)
+    current['results']['10m'] = {'q2_time': {'wall_time': 99.0}}
+
+    regressions = compare_to_baseline(current, baseline, threshold=0.1)
+    assert [(item['implementation'], item['metric']) for item in regressions] == [('q2_memory', 'peak_rss_mb')]
+    assert regressions[0]['change'] == pytest.approx(0.2)
+    assert compare_to_baseline(current, baseline, threshold=0.25) == []
+    assert len(compare_to_baseline(current, baseline, threshold=0.01)) == 2
@@ -0,0 +1,317 @@
+import pytest
+import datetime
+import json
+import pyarrow.parquet as pq
+from src.utils.data_conversion import SCHEMA, extract_relevant_data
+
+tweets = [
+    {'date': '2021-02-24T09:23:35+00:00', 'user': {'username': 'user1'},
+     'content': 'First tweet 🤫', 'mentionedUsers': [{'username': 'user2'}]},
+    {'date': '2021-02-24T10:00:00Z', 'user': {'username': 'user1'},
+     'content': 'Second tweet', 'mentionedUsers': None},
+    {'date': 'not a date', 'user': {'username': 'user5'},
+     'content': 'Third tweet', 'mentionedUsers': [{'username': 'user6'}, {'username': 'user7'}]},
+]
+
+def test_extract_relevant_data_streaming(tmp_path):
+    """
+    Tests that extract_relevant_data streams the JSONL file into row groups of the
+    requested size, keeping the schema and values of the original conversion.
+
+    Parameters
+    ----------
+    tmp_path : pathlib.Path
+        Temporary directory provided by pytest.
+
+    Returns
+    -------
+    None
+        Test passes if all assertions are successful.
+
+    Raises
+    ------
+    AssertionError
+        If the schema, the number of row groups or the converted values don't match.
+    """
+    jsonl_path = tmp_path / 'tweets.json'
+    jsonl_path.write_text('\n'.join(json.dumps(tweet) for tweet in tweets) + '\n\n', encoding='utf-8')
+    parquet_path = str(tmp_path / 'tweets.parquet')
+
+    extract_relevant_data(str(jsonl_path), parquet_path, row_group_size=2)
+
+    parquet_file = pq.ParquetFile(parquet_path)
+    assert parquet_file.schema_arrow == SCHEMA, "Schema must not change"
+    assert parquet_file.num_row_groups == 2, "Rows must be written in row groups of the requested size"
+
+    table = parquet_file.read()
+    assert table['date'].to_pylist() == [datetime.datetime(2021, 2, 24, 9, 23, 35), datetime.datetime(2021, 2, 24, 10), None]
+    assert table['username'].to_pylist() == ['user1', 'user1', 'user5']
+    assert table['content'].to_pylist() == ['First tweet 🤫', 'Second tweet', 'Third tweet']
+    assert table['mentionedUsers'].to_pylist() == [['user2'], [], ['user6', 'user7']]
+
+def test_extract_relevant_data_empty_file(tmp_path):
+    """
+    Tests that converting an empty JSONL file produces an empty Parquet file with
+    the expected schema.
+
+    Parameters
+    ----------
+    tmp_path : pathlib.Path
+        Temporary directory provided by pytest.
+
+    Returns
+    -------
+    None
+        Test passes if all assertions are successful.
+
+    Raises
+    ------
+    AssertionError
+        If the output is not an empty table with the expected schema.
+    """
+    jsonl_path = tmp_path / 'empty.json'
+    jsonl_path.write_text('', encoding='utf-8')
+    parquet_path = str(tmp_path / 'empty.parquet')
+
+    extract_relevant_data(str(jsonl_path), parquet_path)
+
+    table = pq.read_table(parquet_path)
+    assert table.schema == SCHEMA and table.num_rows == 0, "Empty input must produce an empty table"
+
+
+@pytest.mark.parametrize("partitioned", [False, True])
+def test_extract_relevant_data_parallel(tmp_path, partitioned):
+    """
+    Tests that the parallel conversion by byte ranges produces the same rows, in the
+    same order, as the sequential conversion.
+
+    Parameters
+    ----------
+    tmp_path : pathlib.Path
+        Temporary directory provided by pytest.
+    partitioned : bool
+        Whether to write a dataset of part files or a single merged file.
+
+    Returns
+    -------
+    None
+        Test passes if all assertions are successful.
+
+    Raises
+    ------
+    AssertionError
+        If the parallel output differs from the sequential one.
+    """
+    from src.utils.data_conversion import extract_relevant_data_parallel, split_byte_ranges
+
+    jsonl_path = tmp_path / 'tweets.json'
+    lines = [json.dumps(dict(tweets[index % 3], content=f'tweet {index} 🤔')) for index in range(50)]
+    jsonl_path.write_text('\n'.join(lines) + '\n', encoding='utf-8')
+
+    ranges = split_byte_ranges(str(jsonl_path), 4)
+    assert ranges[0][0] == 0 and ranges[-1][1] == jsonl_path.stat().st_size
+    assert all(end == start for (_, end), (start, _) in zip(ranges, ranges[1:])), "Ranges must be contiguous"
+
+    sequential_path = str(tmp_path / 'sequential.parquet')
+    parallel_path = str(tmp_path / ('dataset' if partitioned else 'parallel.parquet'))
+    extract_relevant_data(str(jsonl_path), sequential_path)
+    num_rows = extract_relevant_data_parallel(str(jsonl_path), parallel_path, num_workers=4,
+                                              row_group_size=8, partitioned=partitioned)
+
+    assert num_rows == 50
+    expected = pq.read_table(sequential_path)
+    if partitioned:
+        import os
+        parts = sorted(os.listdir(parallel_path))
+        assert len(parts) == len(ranges), "One part file per byte range"
+        results = pq.read_table([os.path.join(parallel_path, part) for part in parts])
+    else:
+        results = pq.read_table(parallel_path)
+    assert results.equals(expected), "Parallel conversion must keep rows and order"
+
+def _write_shuffled_tweets(path, num_days=10, tweets_per_day=1024):
+    import random
+    import pyarrow as pa
+
+    rows = [
+        (datetime.datetime(2021, 2, 1 + day, index % 24), f'user{index % 7}', f'tweet {day} {index}', [f'user{index % 5}'])
+        for day in range(num_days) for index in range(tweets_per_day)
+    ]
+    random.Random(0).shuffle(rows)
+    table = pa.Table.from_pylist(
+        [dict(zip(SCHEMA.names, row)) for row in rows], schema=SCHEMA
+    )
+    pq.write_table(table, path, row_group_size=2048)
+    return table
+
+@pytest.mark.parametrize("layout", ['sorted', 'partitioned'])
+def test_write_layout(tmp_path, layout):
+    """
+    Tests that the sorted and partitioned layouts keep every row, sort the rows by
+    date with non-overlapping row group statistics, and give the same q1 answer.
+
+    Parameters
+    ----------
+    tmp_path : pathlib.Path
+        Temporary directory provided by pytest.
+    layout : str
+        Layout to write.
+
+    Returns
+    -------
+    None
+        Test passes if all assertions are successful.
+
+    Raises
+    ------
+    AssertionError
+        If rows are lost, the statistics overlap or the q1 result changes.
+    """
+    import os
+    from src.q1_time import q1_time
+    from src.utils.data_conversion import write_layout
+
+    input_path = str(tmp_path / 'tweets.parquet')
+    table = _write_shuffled_tweets(input_path)
+    output_path = str(tmp_path / layout)
+    write_layout(input_path, output_path, layout, row_group_size=2048)
+
+    if layout == 'partitioned':
+        days = sorted(os.listdir(output_path))
+        assert days == [f'day=2021-02-{day:02d}' for day in range(1, 11)], "One directory per day"
+        files = [os.path.join(output_path, day, name) for day in days for name in sorted(os.listdir(os.path.join(output_path, day)))]
+    else:
+        files = [output_path]
+
+    bounds = []
+    for file_path in files:
+        metadata = pq.ParquetFile(file_path).metadata
+        assert pq.ParquetFile(file_path).schema_arrow == SCHEMA, "Schema must not change"
+        for index in range(metadata.num_row_groups):
+            stats = metadata.row_group(index).column(0).statistics
+            bounds.append((stats.min, stats.max))
+    assert all(previous[1] <= current[0] for previous, current in zip(bounds, bounds[1:])), "Row groups must not overlap"
+
+    results = pq.read_table(files)
+    assert results['date'].to_pylist() == sorted(table['date'].to_pylist()), "Rows must be sorted by date"
+    assert sorted(results['content'].to_pylist()) == sorted(table['content'].to_pylist()), "No row may be lost"
+    if layout == 'sorted':
+        assert q1_time(output_path) == q1_time(input_path), "q1 must not depend on the layout"
+
+def test_scan_bytes_prunes_sorted_layout(tmp_path):
+    """
+    Tests that a one-day scan reads far fewer bytes on the sorted and partitioned
+    layouts than on a file in arrival order, while a full scan reads everything.
+
+    Parameters
+    ----------
+    tmp_path : pathlib.Path
+        Temporary directory provided by pytest.
+
+    Returns
+    -------
+    None
+        Test passes if all assertions are successful.
+
+    Raises
+    ------
+    AssertionError
+        If the date range is not pruned.
+    """
+    from src.utils.layout_benchmark import compare_layouts, scan_bytes
+
+    input_path = str(tmp_path / 'tweets.parquet')
+    _write_shuffled_tweets(input_path)
+    day = datetime.date(2021, 2, 5)
+
+    assert scan_bytes(input_path, ['date'], day, day) == scan_bytes(input_path, ['date']), \
+        "Shuffled row groups cover every day"
+
+    results = compare_layouts(input_path, day, day, row_group_size=2048)
+    for layout in ('sorted', 'partitioned'):
+        assert results[layout]['range'] * 3 < results['default']['range'], f"{layout} must prune row groups"
+        assert results[layout]['full'] > results[layout]['range']
+
+def test_layouts_with_null_dates(tmp_path):
+    """
+    Tests that tweets without a date are kept in their own partition, which full
+    scans read and date-restricted scans skip, and that paths with quotes are
+    written correctly.
+
+    Parameters
+    ----------
+    tmp_path : pathlib.Path
+        Temporary directory provided by pytest.
+
+    Returns
+    -------
+    None
+        Test passes if all assertions are successful.
+
+    Raises
+    ------
+    AssertionError
+        If a row is lost or the null partition is scanned wrongly.
+    """
+    import os
+    import pyarrow as pa
+    from src.utils.data_conversion import write_layout
+    from src.utils.layout_benchmark import scan_bytes
+
+    directory = tmp_path / "o'brien"
+    directory.mkdir()
+    input_path = str(directory / 'tweets.parquet')
+    rows = [(datetime.datetime(2021, 2, 1 + index % 3, index), f'user{index}', 'text', []) for index in range(6)]
+    rows.append((None, 'undated', 'text', []))
+    pq.write_table(pa.Table.from_pylist([dict(zip(SCHEMA.names, row)) for row in rows], schema=SCHEMA), input_path)
+
+    output_path = str(directory / 'partitioned')
+    write_layout(input_path, output_path, 'partitioned')
+    null_dirs = [name for name in os.listdir(output_path) if name in ('day=NULL', 'day=__HIVE_DEFAULT_PARTITION__')]
+    assert len(null_dirs) == 1, "Tweets without a date must get their own partition"
+    null_bytes = scan_bytes(os.path.join(output_path, null_dirs[0]), ['date'])
+    assert null_bytes > 0
+
+    full = scan_bytes(output_path, ['date'])
+    day = datetime.date(2021, 2, 2)
+    assert full == sum(scan_bytes(os.path.join(output_path, name), ['date']) for name in os.listdir(output_path))
+    assert scan_bytes(output_path, ['date'], day, day) == scan_bytes(os.path.join(output_path, 'day=2021-02-02'), ['date'])
+    assert pq.read_table(output_path)['username'].to_pylist().count('undated') == 1
+
+    write_layout(input_path, str(directory / 'sorted.parquet'), 'sorted')
+    assert pq.read_table(str(directory / 'sorted.parquet')).num_rows == len(rows)
+
+def test_extract_relevant_data_with_emojis(tmp_path):
+    """
+    Tests that the conversion can write the precomputed `emojis` column, with the
+    same semantics as `emoji.emoji_list`, and that the layouts keep it.
+
+    Parameters
+    ----------
+    tmp_path : pathlib.Path
+        Temporary directory provided by pytest.
+
+    Returns
+    -------
+    None
+        Test passes if all assertions are successful.
+
+    Raises
+    ------
+    AssertionError
+        If the column is missing or its values are wrong.
+    """
+    import emoji
+    from src.utils.data_conversion import EMOJI_SCHEMA
+
+    jsonl_path = tmp_path / 'tweets.json'
+    jsonl_path.write_text('\n'.join(json.dumps(tweet) for tweet in tweets), encoding='utf-8')
+
+    for layout in ('default', 'sorted'):
+        parquet_path = str(tmp_path / f'{layout}.parquet')
+        extract_relevant_data(str(jsonl_path), parquet_path, layout=layout, with_emojis=True)
+        table = pq.read_table(parquet_path)
+        assert table.schema == EMOJI_SCHEMA, "The emojis column must be written"
+        assert table['emojis'].to_pylist() == [
+            [match['emoji'] for match in emoji.emoji_list(content)] for content in table['content'].to_pylist()
+        ]
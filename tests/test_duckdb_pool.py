@@ -0,0 +1,94 @@
+import pytest
+import duckdb
+from src.utils import duckdb_pool
+
+test_parquet_file_path = 'tests/resources/small_tweets.parquet'
+
+def test_connection_reuses_cursors_per_settings():
+    """
+    Tests that cursors are returned to the pool and handed out again for the same
+    settings, and that each combination of settings gets its own database.
+
+    Parameters
+    ----------
+    None
+
+    Returns
+    -------
+    None
+        Test passes if all assertions are successful.
+
+    Raises
+    ------
+    AssertionError
+        If cursors are not reused or the settings are not applied.
+    """
+    with duckdb_pool.connection(threads=1, memory_limit='128MB') as first:
+        settings = first.execute(
+            "SELECT current_setting('threads'), current_setting('enable_object_cache')"
+        ).fetchone()
+    with duckdb_pool.connection(memory_limit='128MB', threads=1) as second:
+        pass
+    with duckdb_pool.connection(threads=2) as other:
+        other_threads = other.execute("SELECT current_setting('threads')").fetchone()[0]
+
+    assert settings == (1, True), "Settings and object cache must be applied"
+    assert second is first, "The idle cursor must be reused"
+    assert other is not first and other_threads == 2, "Other settings must use another database"
+
+def test_connection_discards_failed_cursors():
+    """
+    Tests that a cursor that raised an error is closed instead of being reused,
+    and that temporary tables do not leak between callers.
+
+    Parameters
+    ----------
+    None
+
+    Returns
+    -------
+    None
+        Test passes if all assertions are successful.
+
+    Raises
+    ------
+    AssertionError
+        If a failed cursor is reused or a temporary table is visible to others.
+    """
+    with pytest.raises(duckdb.Error):
+        with duckdb_pool.connection(threads=3) as failed:
+            failed.execute("CREATE TEMP TABLE leftover AS SELECT 1 AS value")
+            failed.execute("SELECT * FROM missing_table")
+
+    with duckdb_pool.connection(threads=3) as cursor:
+        assert cursor is not failed, "Failed cursors must not be reused"
+        with pytest.raises(duckdb.CatalogException):
+            cursor.execute("SELECT * FROM leftover")
+
+def test_queries_on_pooled_cursors_are_repeatable():
+    """
+    Tests that the DuckDB-based questions return the same results when they run
+    repeatedly on pooled cursors.
+
+    Parameters
+    ----------
+    None
+        Uses global test_parquet_file_path for testing.
+
+    Returns
+    -------
+    None
+        Test passes if all assertions are successful.
+
+    Raises
+    ------
+    AssertionError
+        If consecutive calls return different results.
+    """
+    from src.q1_memory import q1_memory
+    from src.q1_time import q1_time
+    from src.q3_memory import q3_memory
+    from src.q3_time import q3_time
+
+    for function in (q1_time, q1_memory, q3_time, q3_memory):
+        assert function(test_parquet_file_path) == function(test_parquet_file_path)
@@ -0,0 +1,71 @@
+import pytest
+import emoji
+import pyarrow as pa
+from collections import Counter
+from src.utils.emoji_counter import count_emojis, extract_emojis
+
+tricky_contents = [
+    "This is a tweet without emojis",
+    "ਪੈਟਰੋਲ ਦੀਆਂ ਕੀਮਤਾਂ 🤫🤫🤔🤔",
+    "ZWJ sequence 👨‍💻 and non RGI 👨‍😀",
+    "Skin tones 👍🏽👍🏿 and a lonely 🏻",
+    "Flags 🇨🇱🇦🇷 and a broken 🇺 flag",
+    "Subdivision 🏴󠁧󠁢󠁳󠁣󠁴󠁿 and black flag 🏴",
+    "Keycaps 1️⃣ #️⃣ and digits 2021",
+    "Variation selectors ❤️❤ ☺︎",
+    "Family 👨‍👩‍👧‍ trailing joiner",
+    "©®™ niño",
+]
+
+def test_extract_emojis_matches_emoji_list():
+    """
+    Tests that extract_emojis returns exactly the same emojis as `emoji.emoji_list`
+    on contents with ZWJ sequences, skin tones, flags, keycaps and variation selectors.
+
+    Parameters
+    ----------
+    None
+        Uses global tricky_contents for testing.
+
+    Returns
+    -------
+    None
+        Test passes if all assertions are successful.
+
+    Raises
+    ------
+    AssertionError
+        If the emojis extracted from any content differ from `emoji.emoji_list`.
+    """
+    for content in tricky_contents:
+        expected = [d['emoji'] for d in emoji.emoji_list(content)]
+        assert extract_emojis(content) == expected, f"Mismatch for {content!r}"
+
+def test_count_emojis_arrow_array():
+    """
+    Tests that count_emojis counts the emojis of an Arrow array in first-seen order
+    and ignores null contents.
+
+    Parameters
+    ----------
+    None
+        Uses global tricky_contents for testing.
+
+    Returns
+    -------
+    None
+        Test passes if all assertions are successful.
+
+    Raises
+    ------
+    AssertionError
+        If the counter differs from the one built with `emoji.emoji_list`.
+    """
+    expected = Counter()
+    for content in tricky_contents:
+        expected.update(d['emoji'] for d in emoji.emoji_list(content))
+
+    results = count_emojis(pa.chunked_array([tricky_contents[:5], [None] + tricky_contents[5:]]))
+
+    assert results == expected, "Counts do not match emoji.emoji_list"
+    assert list(results) == list(expected), "Emojis must be kept in first-seen order"
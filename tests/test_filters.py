@@ -0,0 +1,164 @@
+import pytest
+import datetime
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from fastapi.testclient import TestClient
+from src.main import app
+from src.q1_memory import q1_memory
+from src.q1_time import q1_time
+from src.q2_memory import q2_memory
+from src.q2_time import q2_time
+from src.q3_memory import q3_memory
+from src.q3_time import q3_time
+from src.report import report
+from src.utils.data_conversion import SCHEMA, add_emoji_column
+from src.utils.filters import resolve_filter
+
+EMOJIS = ['😀', '🐍', '🚀', '🎉', '🇨🇱', '👨‍💻']
+USERS = ['ana', 'beto', 'carla', 'diego', "o'neil"]
+
+@pytest.fixture
+def tweets(tmp_path):
+    first_day = datetime.datetime(2021, 2, 1, 8)
+    rows = []
+    for day in range(20):
+        for index in range(5 + (day * 7) % 11):
+            user = USERS[(day + index) % len(USERS)] if index % 3 else USERS[day % len(USERS)]
+            content = ' '.join(EMOJIS[(day * index + step) % len(EMOJIS)] for step in range(index % 4))
+            mentions = [USERS[(index + step) % len(USERS)] for step in range(day % 3)]
+            rows.append((first_day + datetime.timedelta(days=day, minutes=index), user, content, mentions))
+    table = pa.Table.from_pylist(
+        [dict(zip(SCHEMA.names, row)) for row in rows], schema=SCHEMA)
+
+    full_path = str(tmp_path / 'full.parquet')
+    pq.write_table(table, full_path, row_group_size=16)
+    precomputed_path = str(tmp_path / 'precomputed.parquet')
+    pq.write_table(pa.Table.from_batches([add_emoji_column(batch) for batch in table.to_batches()]),
+                   precomputed_path, row_group_size=16)
+    return table, full_path, precomputed_path
+
+def write_filtered(table, tmp_path, start_date, end_date, usernames):
+    mask = pc.and_(
+        pc.and_(pc.greater_equal(table['date'], pa.scalar(datetime.datetime.combine(start_date, datetime.time.min))),
+                pc.less(table['date'], pa.scalar(datetime.datetime.combine(end_date, datetime.time.min)
+                                                 + datetime.timedelta(days=1)))),
+        pc.is_in(table['username'], value_set=pa.array(usernames)))
+    filtered_path = str(tmp_path / 'filtered.parquet')
+    pq.write_table(table.filter(mask), filtered_path)
+    return filtered_path
+
+def test_filters_match_prefiltered_file(tweets, tmp_path):
+    """
+    Tests that every query with `n`, a date range and usernames gives the same
+    answer as the unfiltered query over a file holding only the matching tweets.
+
+    Parameters
+    ----------
+    tweets : Tuple[pa.Table, str, str]
+        The tweets, the path to their Parquet file and the path to a copy with
+        the precomputed emojis column.
+    tmp_path : pathlib.Path
+        Temporary directory.
+
+    Returns
+    -------
+    None
+        Test passes if all assertions are successful.
+
+    Raises
+    ------
+    AssertionError
+        If a filtered answer differs from the prefiltered one.
+    """
+    table, full_path, precomputed_path = tweets
+    start_date, end_date = datetime.date(2021, 2, 4), datetime.date(2021, 2, 15)
+    usernames = ['ana', 'carla', "o'neil"]
+    filtered_path = write_filtered(table, tmp_path, start_date, end_date, usernames)
+    filters = {'start_date': start_date, 'end_date': end_date, 'usernames': usernames}
+
+    for function in (q1_time, q1_memory, q2_time, q2_memory, q3_time, q3_memory, report):
+        expected = function(filtered_path, n=3)
+        assert expected, f"{function.__name__} must find tweets in the range"
+        assert function(full_path, n=3, **filters) == expected, f"{function.__name__} must apply the filters"
+
+    assert q2_time(precomputed_path, n=3, **filters) == q2_time(filtered_path, n=3)
+    assert q2_memory(precomputed_path, n=3, **filters) == q2_memory(filtered_path, n=3)
+    assert q1_time(full_path, start_date='2030-01-01') == []
+    assert len(q3_time(full_path, n=2)) == 2
+
+def test_row_group_pruning(tweets):
+    """
+    Tests that only the row groups whose statistics overlap the date range are
+    selected and that the SQL predicate is written with literals.
+
+    Parameters
+    ----------
+    tweets : Tuple[pa.Table, str, str]
+        The tweets, the path to their Parquet file and the path to a copy with
+        the precomputed emojis column.
+
+    Returns
+    -------
+    None
+        Test passes if all assertions are successful.
+
+    Raises
+    ------
+    AssertionError
+        If a row group is selected or pruned wrongly.
+    """
+    _, full_path, _ = tweets
+    parquet_file = pq.ParquetFile(full_path)
+    tweet_filter = resolve_filter('2021-02-10', '2021-02-10')
+
+    selected = tweet_filter.row_groups(parquet_file)
+    assert 0 < len(selected) < parquet_file.num_row_groups, "Row groups outside the range must be pruned"
+    for row_group in range(parquet_file.num_row_groups):
+        days = {value.date() for value in parquet_file.read_row_group(row_group, columns=['date'])['date'].to_pylist()}
+        assert (datetime.date(2021, 2, 10) in days) == (row_group in selected)
+
+    predicate = resolve_filter(None, '2021-02-10', ["o'neil", 'ana']).sql_predicate()
+    assert "date < TIMESTAMP '2021-02-11 00:00:00'" in predicate
+    assert "username IN ('ana', 'o''neil')" in predicate
+    assert resolve_filter().sql_predicate() == 'TRUE'
+
+    with pytest.raises(ValueError):
+        resolve_filter('2021-02-10', '2021-02-01')
+
+def test_api_filters(tweets):
+    """
+    Tests that the endpoints accept `n`, the date range and repeated `username`
+    parameters, and reject inverted ranges.
+
+    Parameters
+    ----------
+    tweets : Tuple[pa.Table, str, str]
+        The tweets, the path to their Parquet file and the path to a copy with
+        the precomputed emojis column.
+
+    Returns
+    -------
+    None
+        Test passes if all assertions are successful.
+
+    Raises
+    ------
+    AssertionError
+        If a response is wrong.
+    """
+    _, full_path, _ = tweets
+    params = {'file_path': full_path, 'n': 2, 'start_date': '2021-02-04', 'end_date': '2021-02-15',
+              'username': ['ana', 'carla']}
+
+    with TestClient(app) as client:
+        response = client.get('/q3/memory', params=params)
+        assert response.status_code == 200
+        assert response.json() == [list(item) for item in q3_time(
+            full_path, n=2, start_date='2021-02-04', end_date='2021-02-15', usernames=['ana', 'carla'])]
+
+        report_response = client.get('/report', params=params).json()
+        assert all(len(report_response[question]) <= 2 for question in ('q1', 'q2', 'q3'))
+
+        inverted = {**params, 'start_date': '2021-02-15', 'end_date': '2021-02-04'}
+        assert client.get('/q1/time', params=inverted).status_code == 422
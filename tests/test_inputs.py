@@ -0,0 +1,199 @@
+import pytest
+import datetime
+import os
+import pyarrow as pa
+import pyarrow.parquet as pq
+from fastapi.testclient import TestClient
+from src.main import app
+from src.q1_memory import q1_memory
+from src.q1_time import q1_time
+from src.q2_memory import q2_memory
+from src.q2_time import q2_time
+from src.q3_memory import q3_memory
+from src.q3_time import q3_time
+from src.report import report
+import src.utils.inputs
+from src.utils.inputs import open_parquet, prune_files_for_top_dates, resolve_input, sql_file_list
+
+test_parquet_file_path = 'tests/resources/small_tweets.parquet'
+
+@pytest.fixture
+def dataset(tmp_path):
+    table = pq.read_table(test_parquet_file_path)
+    table = pa.concat_tables([table] * 40)
+    whole_path = str(tmp_path / 'whole.parquet')
+    pq.write_table(table, whole_path, row_group_size=16)
+
+    directory = tmp_path / 'dataset'
+    for index, offset in enumerate(range(0, table.num_rows, 20)):
+        part_directory = directory / f'part={index // 2}'
+        part_directory.mkdir(parents=True, exist_ok=True)
+        pq.write_table(table.slice(offset, 20), str(part_directory / f'{index:03d}.parquet'), row_group_size=16)
+    return whole_path, str(directory)
+
+@pytest.fixture
+def daily_files(tmp_path):
+    first_day = datetime.datetime(2021, 2, 1)
+    file_paths = []
+    for day in range(15):
+        num_rows = (day + 1) * 3
+        table = pa.table({
+            'date': pa.array([first_day + datetime.timedelta(days=day, minutes=row) for row in range(num_rows)],
+                             type=pa.timestamp('ms')),
+            'username': [f'user{row % (day + 2)}' for row in range(num_rows)],
+            'content': ['hola'] * num_rows,
+            'mentionedUsers': pa.array([[]] * num_rows, type=pa.list_(pa.string())),
+        })
+        file_path = str(tmp_path / f'day-{day:02d}.parquet')
+        pq.write_table(table, file_path)
+        file_paths.append(file_path)
+    return file_paths
+
+def test_resolve_input(dataset):
+    """
+    Tests that globs, directories and lists resolve to the same sorted files and
+    that inputs matching nothing raise FileNotFoundError.
+
+    Parameters
+    ----------
+    dataset : Tuple[str, str]
+        Path to the whole file and to a hive-style directory with its slices.
+
+    Returns
+    -------
+    None
+        Test passes if all assertions are successful.
+
+    Raises
+    ------
+    AssertionError
+        If the resolved files differ between input kinds.
+    """
+    whole_path, directory = dataset
+
+    from_directory = resolve_input(directory)
+    assert len(from_directory) == 10, "Every file of the partitions must be found"
+    assert resolve_input(os.path.join(directory, '**', '*.parquet')) == from_directory
+    assert resolve_input([whole_path, whole_path]) == [whole_path], "Duplicates must be dropped"
+    assert resolve_input([whole_path, directory]) == [whole_path] + from_directory
+
+    with pytest.raises(FileNotFoundError):
+        resolve_input(os.path.join(directory, '*.csv'))
+    with pytest.raises(FileNotFoundError):
+        resolve_input('tests/resources/missing.parquet')
+
+    assert sql_file_list(["it's.parquet", 'b.parquet']) == "['it''s.parquet', 'b.parquet']"
+
+def test_multi_file_inputs_match_single_file(dataset):
+    """
+    Tests that every query gives the same answer over a directory of slices as
+    over the concatenated file.
+
+    Parameters
+    ----------
+    dataset : Tuple[str, str]
+        Path to the whole file and to a hive-style directory with its slices.
+
+    Returns
+    -------
+    None
+        Test passes if all assertions are successful.
+
+    Raises
+    ------
+    AssertionError
+        If any multi-file answer differs from the single-file one.
+    """
+    whole_path, directory = dataset
+
+    for function in (q1_time, q1_memory, q2_time, q2_memory, q3_time, q3_memory, report):
+        assert function(directory) == function(whole_path), f"{function.__name__} must not depend on the split"
+
+def test_prune_files_for_top_dates(daily_files):
+    """
+    Tests that the files of days that cannot reach the top 10 are pruned using
+    only their statistics, without changing the q1 answers.
+
+    Parameters
+    ----------
+    daily_files : List[str]
+        Paths to one file per day, with more tweets on later days.
+
+    Returns
+    -------
+    None
+        Test passes if all assertions are successful.
+
+    Raises
+    ------
+    AssertionError
+        If a needed file is pruned or a prunable file is kept.
+    """
+    kept = prune_files_for_top_dates(daily_files)
+    assert kept == daily_files[5:], "Only the 5 smallest days must be pruned"
+    assert prune_files_for_top_dates(daily_files[:9]) == daily_files[:9], "Nothing can be pruned with fewer than 10 days"
+
+    whole = pa.concat_tables([pq.read_table(file_path) for file_path in daily_files])
+    expected = q1_time(daily_files)
+    assert len(expected) == 10
+    assert q1_memory(daily_files) == expected
+    assert [day for day, _ in expected] == sorted({value.date() for value in whole['date'].to_pylist()},
+                                                   reverse=True)[:10]
+
+def test_api_accepts_globs_and_lists(dataset):
+    """
+    Tests that the API accepts repeated `file_path` parameters and globs.
+
+    Parameters
+    ----------
+    dataset : Tuple[str, str]
+        Path to the whole file and to a hive-style directory with its slices.
+
+    Returns
+    -------
+    None
+        Test passes if all assertions are successful.
+
+    Raises
+    ------
+    AssertionError
+        If a response differs from the single-file one.
+    """
+    whole_path, directory = dataset
+    file_paths = resolve_input(directory)
+
+    with TestClient(app) as client:
+        expected = client.get('/q3/time', params={'file_path': whole_path}).json()
+        assert client.get('/q3/time', params={'file_path': file_paths}).json() == expected
+        assert client.get('/q3/time', params={'file_path': os.path.join(directory, '*', '*.parquet')}).json() == expected
+        assert client.get('/q3/time', params={'file_path': os.path.join(directory, '*.csv')}).status_code == 404
+
+def test_memory_mapped_reads(dataset, monkeypatch):
+    """
+    Tests that memory-mapped reads, requested per call or through the
+    PARQUET_MEMORY_MAP setting, give the same answers as buffered reads.
+
+    Parameters
+    ----------
+    dataset : Tuple[str, str]
+        Path to the whole file and to a hive-style directory with its slices.
+    monkeypatch : pytest.MonkeyPatch
+        Fixture used to change the default setting.
+
+    Returns
+    -------
+    None
+        Test passes if all assertions are successful.
+
+    Raises
+    ------
+    AssertionError
+        If a memory-mapped answer differs from the buffered one.
+    """
+    whole_path, directory = dataset
+    expected = report(whole_path)
+    assert report(directory, memory_map=True) == expected
+
+    monkeypatch.setattr(src.utils.inputs, 'MEMORY_MAP', True)
+    mapped = open_parquet(whole_path)
+    assert mapped.read(columns=['content']).equals(open_parquet(whole_path, memory_map=False).read(columns=['content']))
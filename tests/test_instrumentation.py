@@ -0,0 +1,139 @@
+import pytest
+import shutil
+import pyarrow.parquet as pq
+from fastapi.testclient import TestClient
+from src.main import app, instrumentation
+from src.q1_time import q1_time
+from src.q2_memory import q2_memory
+from src.q3_memory import q3_memory
+from src.report import report
+from src.utils.instrumentation import MetricsRegistry, QueryMetrics
+
+test_parquet_file_path = 'tests/resources/small_tweets.parquet'
+
+def test_query_metrics(monkeypatch):
+    """
+    Tests that each call of a query function records its stages, rows, memory
+    and DuckDB profile, including failed calls.
+
+    Parameters
+    ----------
+    monkeypatch : pytest.MonkeyPatch
+        Fixture used to profile every DuckDB query.
+
+    Returns
+    -------
+    None
+        Test passes if all assertions are successful.
+
+    Raises
+    ------
+    AssertionError
+        If a call is not recorded or its metrics are wrong.
+    """
+    monkeypatch.setattr(instrumentation, 'DUCKDB_PROFILE_RATE', 1.0)
+    num_rows = pq.ParquetFile(test_parquet_file_path).metadata.num_rows
+
+    with instrumentation.recorded() as calls:
+        q1_time(test_parquet_file_path)
+        q2_memory(test_parquet_file_path)
+        q3_memory(test_parquet_file_path, approximate=True)
+        report(test_parquet_file_path)
+        with pytest.raises(FileNotFoundError):
+            q1_time('tests/resources/missing.parquet')
+
+    assert [metrics.function for metrics in calls] == ['q1_time', 'q2_memory', 'q3_memory', 'report', 'q1_time']
+    duckdb_call, arrow_call, sketch_call, report_call, failed_call = calls
+
+    assert {'plan', 'query'} <= set(duckdb_call.stages)
+    assert len(duckdb_call.duckdb_profiles) == 1
+    assert 'TABLE_SCAN' in duckdb_call.operator_timings()
+    assert duckdb_call.rows == 2 * num_rows, "Both scans of the file must be counted"
+
+    assert {'read', 'tokenize', 'rank'} <= set(arrow_call.stages)
+    assert arrow_call.rows == num_rows and arrow_call.bytes > 0
+    assert {'read', 'aggregate', 'rank'} <= set(sketch_call.stages)
+    assert {'read', 'aggregate', 'rank'} <= set(report_call.stages)
+
+    for metrics in calls:
+        assert metrics.duration >= sum(metrics.stages.values())
+        assert metrics.peak_rss_mb > 0
+    assert failed_call.error == 'FileNotFoundError'
+    assert instrumentation.registry.recent('report')[-1] is report_call
+
+def test_render_prometheus():
+    """
+    Tests the Prometheus text format of the registry: cumulative histogram
+    buckets, counters per stage and operator, and escaped label values.
+
+    Returns
+    -------
+    None
+        Test passes if all assertions are successful.
+
+    Raises
+    ------
+    AssertionError
+        If a sample is missing or wrong.
+    """
+    registry = MetricsRegistry(max_recent=1)
+    profile = {'children': [{'operator_type': 'HASH_GROUP_BY', 'operator_timing': 0.25,
+                             'children': [{'operator_type': 'TABLE_SCAN', 'operator_timing': 0.5}]}]}
+    registry.record(QueryMetrics('q3_time', duration=0.2, stages={'query': 0.15}, rows=10,
+                                 peak_rss_mb=1.0, duckdb_profiles=[profile]))
+    registry.record(QueryMetrics('q3_time', duration=2.0, stages={'query': 1.5, 'plan': 0.1}, rows=5,
+                                 error='ValueError'))
+    registry.record(QueryMetrics('odd "name"\\', duration=0.001))
+
+    lines = registry.render_prometheus().splitlines()
+    assert '# TYPE tweets_query_duration_seconds histogram' in lines
+    assert 'tweets_query_duration_seconds_bucket{function="q3_time",le="0.1"} 0' in lines
+    assert 'tweets_query_duration_seconds_bucket{function="q3_time",le="0.25"} 1' in lines
+    assert 'tweets_query_duration_seconds_bucket{function="q3_time",le="2.5"} 2' in lines
+    assert 'tweets_query_duration_seconds_bucket{function="q3_time",le="+Inf"} 2' in lines
+    assert 'tweets_query_duration_seconds_count{function="q3_time"} 2' in lines
+    assert 'tweets_query_errors_total{function="q3_time"} 1' in lines
+    assert 'tweets_query_stage_seconds_total{function="q3_time",stage="query"} 1.65' in lines
+    assert 'tweets_query_stage_calls_total{function="q3_time",stage="plan"} 1' in lines
+    assert 'tweets_query_rows_total{function="q3_time"} 15' in lines
+    assert 'tweets_duckdb_operator_seconds_total{function="q3_time",operator="TABLE_SCAN"} 0.5' in lines
+    assert 'tweets_query_errors_total{function="odd \\"name\\"\\\\"} 0' in lines
+    assert any(line.startswith('process_peak_resident_memory_bytes ') for line in lines)
+    assert len(registry.recent()) == 1
+
+def test_metrics_endpoint(tmp_path):
+    """
+    Tests that `/metrics` reports the queries run by the API, including those
+    run in the worker processes.
+
+    Parameters
+    ----------
+    tmp_path : pathlib.Path
+        Temporary directory, used for a copy of the file that is not cached.
+
+    Returns
+    -------
+    None
+        Test passes if all assertions are successful.
+
+    Raises
+    ------
+    AssertionError
+        If a query is missing from the metrics.
+    """
+    file_path = str(tmp_path / 'tweets.parquet')
+    shutil.copy(test_parquet_file_path, file_path)
+    before = len(instrumentation.registry.recent('q2_memory'))
+
+    with TestClient(app) as client:
+        assert client.get('/q2/memory', params={'file_path': file_path}).status_code == 200
+        assert client.get('/q3/time', params={'file_path': file_path}).status_code == 200
+        response = client.get('/metrics')
+
+    assert response.status_code == 200
+    assert response.headers['content-type'].startswith('text/plain')
+    assert len(instrumentation.registry.recent('q2_memory')) == before + 1, \
+        "The metrics of the worker processes must reach the registry of the API"
+    for function in ('q2_memory', 'q3_time'):
+        assert f'tweets_query_duration_seconds_count{{function="{function}"}}' in response.text
+    assert 'tweets_query_stage_seconds_total{function="q2_memory",stage="tokenize"}' in response.text
@@ -0,0 +1,291 @@
+import pytest
+import datetime
+import json
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+import pyarrow.parquet as pq
+from fastapi.testclient import TestClient
+import src.main
+from src.main import app
+from src.q1_memory import approximate_top_users_for_top_dates
+from src.q2_memory import q2_memory
+from src.q2_time import q2_time, report_progress
+from src.report import report
+from src.utils.benchmark import generate_dataset
+from src.utils.jobs import JobStore, JobStoreFullError, format_event
+
+@pytest.fixture
+def tweets_path(tmp_path):
+    return generate_dataset(str(tmp_path / 'tweets.parquet'), 20_000, emoji_density=1.0, row_group_size=1000)
+
+def read_events(response):
+    events = []
+    for block in response.text.strip().split('\n\n'):
+        fields = dict(line.split(': ', 1) for line in block.splitlines())
+        events.append((fields['event'], json.loads(fields['data'])))
+    return events
+
+def test_progress_reports(tweets_path):
+    """
+    Tests that the long-running queries report increasing row counts and partial
+    answers, and that reporting progress does not change their results.
+
+    Parameters
+    ----------
+    tweets_path : str
+        Path to a synthetic file of 20000 tweets in 20 row groups.
+
+    Returns
+    -------
+    None
+        Test passes if all assertions are successful.
+
+    Raises
+    ------
+    AssertionError
+        If a progress report is missing or inconsistent.
+    """
+    num_rows = pq.ParquetFile(tweets_path).metadata.num_rows
+    calls = [
+        (q2_memory, {'batch_size': 500}),
+        (q2_memory, {'batch_size': 500, 'approximate': True}),
+        (q2_time, {}),
+        (report, {}),
+        (approximate_top_users_for_top_dates, {'epsilon': 0.01, 'batch_size': 500}),
+    ]
+
+    for function, kwargs in calls:
+        reports = []
+        result = function(tweets_path, progress=reports.append, **kwargs)
+        assert result == function(tweets_path, **kwargs), f"{function.__name__} must not depend on the reports"
+
+        assert reports, f"{function.__name__} must report its progress"
+        rows = [progress['rows'] for progress in reports]
+        assert rows == sorted(rows) and rows[-1] <= num_rows
+        assert all(progress['total_rows'] in (None, num_rows) for progress in reports)
+        assert reports[-1]['partial'], "Partial answers must not be empty"
+
+    reports = []
+    q2_memory(tweets_path, batch_size=500, n=3, progress=reports.append)
+    assert len(reports) == 4, "One report every 10 of the 40 batches"
+    assert reports[-1] == {'rows': num_rows, 'total_rows': num_rows,
+                           'partial': q2_memory(tweets_path, batch_size=500, n=3)}
+
+    reports = []
+    with ThreadPoolExecutor(2) as executor:
+        futures = [executor.submit(Counter, {'🙏': count, '🚜': 1}) for count in (1, 2, 3)]
+        report_progress(futures, [10, 20, 30], 1, reports.append)
+    assert [progress['rows'] for progress in reports][-1] == 60 and len(reports) == 3
+    assert reports[-1]['partial'] == [('🙏', 6)]
+
+def test_job_store():
+    """
+    Tests the life cycle of a job, the eviction of finished jobs and the cap on
+    unfinished ones.
+
+    Returns
+    -------
+    None
+        Test passes if all assertions are successful.
+
+    Raises
+    ------
+    AssertionError
+        If a job is in the wrong state, evicted too early or created over the cap.
+    """
+    store = JobStore(max_jobs=2)
+    first = store.create('q2_time')
+    assert first.to_dict()['status'] == 'pending'
+    first.start()
+    first.report({'rows': 10, 'total_rows': 20, 'partial': [('🙏', 3)]})
+    first.finish([('🙏', 5)])
+    assert first.to_dict()['result'] == [('🙏', 5)]
+    assert 'result' not in first.to_dict(include_result=False)
+
+    running = store.create('q1_time')
+    running.start()
+    third = store.create('q3_time')
+    assert store.get(first.job_id) is None, "The oldest finished job must be evicted"
+    assert store.get(running.job_id) is running and store.get(third.job_id) is third
+
+    with pytest.raises(JobStoreFullError):
+        store.create('report')
+    third.finish([])
+    assert store.create('report').status == 'pending', "Finished jobs must make room"
+
+    assert format_event('done', {'day': 1}) == 'event: done\ndata: {"day": 1}\n\n'
+
+def test_job_api(tweets_path, tmp_path, monkeypatch):
+    """
+    Tests submitting a job, following its server-sent events and fetching its
+    result, which must match the synchronous endpoint.
+
+    Parameters
+    ----------
+    tweets_path : str
+        Path to a synthetic file of 20000 tweets in 20 row groups.
+    tmp_path : pathlib.Path
+        Temporary directory.
+    monkeypatch : pytest.MonkeyPatch
+        Fixture used to fill the job store.
+
+    Returns
+    -------
+    None
+        Test passes if all assertions are successful.
+
+    Raises
+    ------
+    AssertionError
+        If a response is wrong.
+    """
+    not_parquet = tmp_path / 'tweets.txt'
+    not_parquet.write_text('not a parquet file')
+
+    with TestClient(app) as client:
+        submitted = client.post('/jobs/q2_memory', params={'file_path': tweets_path, 'batch_size': 500, 'n': 5})
+        assert submitted.status_code == 202
+        job = submitted.json()
+
+        with client.stream('GET', job['events_url']) as response:
+            assert response.headers['content-type'].startswith('text/event-stream')
+            response.read()
+            events = read_events(response)
+        assert events[0][0] == 'status'
+        assert events[-1][0] == 'done'
+        assert all(name in ('status', 'progress', 'done') for name, _ in events)
+
+        expected = client.get('/q2/memory', params={'file_path': tweets_path, 'batch_size': 500, 'n': 5}).json()
+        assert events[-1][1] == expected
+        assert client.get(job['result_url']).json() == expected
+        state = client.get(job['status_url']).json()
+        assert state['status'] == 'done'
+        assert state['progress']['rows'] > 0 and len(state['progress']['partial']) == 5
+
+        report_job = client.post('/jobs/report', params={'file_path': tweets_path, 'n': 3}).json()
+        with client.stream('GET', report_job['events_url']) as response:
+            response.read()
+        assert client.get(report_job['result_url']).json() == client.get(
+            '/report', params={'file_path': tweets_path, 'n': 3}).json()
+
+        failed = client.post('/jobs/q1_time', params={'file_path': str(not_parquet)}).json()
+        with client.stream('GET', failed['events_url']) as response:
+            response.read()
+            assert read_events(response)[-1][0] == 'failed'
+        assert client.get(failed['result_url']).status_code == 500
+
+        assert client.post('/jobs/q1_time', params={'file_path': str(tmp_path / 'missing.parquet')}).status_code == 404
+        assert client.post('/jobs/unknown', params={'file_path': tweets_path}).status_code == 422
+        assert client.get('/jobs/unknown').status_code == 404
+
+        monkeypatch.setattr(src.main.job_store, 'max_jobs', 0)
+        assert client.post('/jobs/q1_time', params={'file_path': tweets_path}).status_code == 503
+
+def test_job_does_not_share_computation_with_request(tweets_path, monkeypatch):
+    """
+    Tests that a job and an identical regular request running at the same time
+    compute separately, in both orders, so the job gets its progress and the
+    request keeps its own timeout.
+
+    Parameters
+    ----------
+    tweets_path : str
+        Path to a synthetic file of 20000 tweets in 20 row groups.
+    monkeypatch : pytest.MonkeyPatch
+        Fixture used to replace q1_time with a slow query.
+
+    Returns
+    -------
+    None
+        Test passes if all assertions are successful.
+
+    Raises
+    ------
+    AssertionError
+        If the job and the request share a computation.
+    """
+    calls = []
+
+    def slow_query(file_paths, n=10, start_date=None, end_date=None, usernames=None, profile=None, progress=None):
+        calls.append(progress)
+        if progress is not None:
+            progress({'rows': 1, 'total_rows': 1, 'partial': []})
+        time.sleep(0.5)
+        return [(datetime.date(2021, 2, 12), 'farmer')] * n
+
+    monkeypatch.setattr(src.main, 'q1_time', slow_query)
+    monkeypatch.setitem(src.main.JOB_QUERIES, 'q1_time', slow_query)
+
+    with TestClient(app) as client:
+        for n, job_first in ((3, True), (4, False)):
+            params = {'file_path': tweets_path, 'n': n}
+            calls.clear()
+            request = threading.Thread(target=lambda: client.get('/q1/time', params=params))
+            if not job_first:
+                request.start()
+                time.sleep(0.1)
+            job = client.post('/jobs/q1_time', params=params).json()
+            if job_first:
+                time.sleep(0.1)
+                request.start()
+            request.join()
+            with client.stream('GET', job['events_url']) as response:
+                response.read()
+                events = read_events(response)
+
+            assert len(calls) == 2, "The job and the request must not share a computation"
+            assert sum(progress is not None for progress in calls) == 1
+            assert ('progress', {'rows': 1, 'total_rows': 1, 'partial': []}) in events
+            assert events[-1] == ('done', [['2021-02-12', 'farmer']] * n)
+
+def test_jobs_have_their_own_limit(tweets_path, monkeypatch):
+    """
+    Tests that jobs wait for a slot of their own limit, staying pending until they
+    get it, and never take the slots of the synchronous endpoints.
+
+    Parameters
+    ----------
+    tweets_path : str
+        Path to a synthetic file of 20000 tweets in 20 row groups.
+    monkeypatch : pytest.MonkeyPatch
+        Fixture used to replace q2_time with a slow query and to limit jobs to one.
+
+    Returns
+    -------
+    None
+        Test passes if all assertions are successful.
+
+    Raises
+    ------
+    AssertionError
+        If a waiting job is reported as running or a job blocks /q2/time.
+    """
+    import asyncio
+
+    def slow_query(file_paths, timeout=None, n=10, start_date=None, end_date=None, usernames=None,
+                   profile=None, progress=None):
+        time.sleep(1.0 if progress is not None else 0)
+        return [('🔥', n)]
+
+    monkeypatch.setattr(src.main, 'q2_time', slow_query)
+    monkeypatch.setitem(src.main.JOB_QUERIES, 'q2_time', slow_query)
+
+    with TestClient(app) as client:
+        monkeypatch.setattr(src.main, 'job_limit', asyncio.Semaphore(1))
+        first = client.post('/jobs/q2_time', params={'file_path': tweets_path, 'n': 1}).json()
+        second = client.post('/jobs/q2_time', params={'file_path': tweets_path, 'n': 2}).json()
+        time.sleep(0.2)
+        assert client.get(first['status_url']).json()['status'] == 'running'
+        assert client.get(second['status_url']).json()['status'] == 'pending', \
+            "A job waiting for its slot must not be reported as running"
+
+        started = time.perf_counter()
+        assert client.get('/q2/time', params={'file_path': tweets_path, 'n': 3}).json() == [['🔥', 3]]
+        assert time.perf_counter() - started < 0.25, "Jobs must not take the synchronous q2_time slot"
+
+        with client.stream('GET', second['events_url']) as response:
+            response.read()
+            events = read_events(response)
+        assert [data['status'] for name, data in events if name == 'status'] == ['pending', 'running', 'done']
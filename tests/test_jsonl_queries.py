@@ -0,0 +1,87 @@
+import pytest
+import json
+from src.q1_memory import q1_memory
+from src.q1_time import q1_time
+from src.q2_memory import q2_memory
+from src.q3_time import q3_time
+from src.report import report
+from src.utils.data_conversion import extract_relevant_data
+from src.utils.jsonl_queries import q1_json, q2_json, q3_json, report_json
+
+def _write_tweets(path, null_dates=False):
+    lines = []
+    for index in range(300):
+        undated = null_dates and index % 3 == 0
+        lines.append(json.dumps({
+            'date': None if undated else f'2021-02-{10 + index % 7:02d}T{index % 24:02d}:00:00+00:00',
+            'user': {'username': f'user{index % 11}'},
+            'content': ['plain text', 'tie 😀 🐍', 'flag 🇨🇱 and 👨‍💻', 'ñandú 🐍🐍'][index % 4],
+            'mentionedUsers': [{'username': f'user{index % 5}'}, {'username': f'user{index % 3}'}] if index % 2 else None,
+            'unused': {'nested': list(range(5))},
+        }))
+    path.write_text('\n'.join(lines) + '\n', encoding='utf-8')
+
+@pytest.mark.parametrize("null_dates", [False, True])
+def test_jsonl_queries_match_parquet_path(tmp_path, null_dates):
+    """
+    Tests that the JSONL backend answers q1, q2 and q3 exactly as the Parquet
+    implementations do on the converted file, with small batches so that the
+    aggregation spans several of them, including dumps with tweets without a
+    date.
+
+    Parameters
+    ----------
+    tmp_path : pathlib.Path
+        Temporary directory provided by pytest.
+    null_dates : bool
+        Whether a third of the tweets have no date.
+
+    Returns
+    -------
+    None
+        Test passes if all assertions are successful.
+
+    Raises
+    ------
+    AssertionError
+        If any JSONL answer differs from the Parquet one.
+    """
+    jsonl_path = tmp_path / 'tweets.json'
+    _write_tweets(jsonl_path, null_dates)
+    parquet_path = str(tmp_path / 'tweets.parquet')
+    extract_relevant_data(str(jsonl_path), parquet_path)
+
+    assert q1_json(str(jsonl_path), batch_size=32) == q1_memory(parquet_path)
+    assert q1_json(str(jsonl_path), batch_size=32, n=7) == q1_time(parquet_path, n=7)
+    assert q2_json(str(jsonl_path), batch_size=32) == q2_memory(parquet_path)
+    assert q3_json(str(jsonl_path), batch_size=32) == q3_time(parquet_path)
+    assert report_json(str(jsonl_path), batch_size=32) == report(parquet_path)
+
+def test_q1_memory_json(tmp_path):
+    """
+    Tests that q1_memory_json streams the JSONL file and returns the q1 answer, and
+    that missing files raise FileNotFoundError.
+
+    Parameters
+    ----------
+    tmp_path : pathlib.Path
+        Temporary directory provided by pytest.
+
+    Returns
+    -------
+    None
+        Test passes if all assertions are successful.
+
+    Raises
+    ------
+    AssertionError
+        If the result differs from q1_json or no error is raised.
+    """
+    from src.utils.q1_memory_json import q1_memory_json
+
+    jsonl_path = tmp_path / 'tweets.json'
+    _write_tweets(jsonl_path)
+
+    assert q1_memory_json(str(jsonl_path)) == q1_json(str(jsonl_path))
+    with pytest.raises(FileNotFoundError):
+        q1_memory_json(str(tmp_path / 'missing.json'))
@@ -0,0 +1,119 @@
+import pytest
+import shutil
+import time
+from fastapi.testclient import TestClient
+import src.main
+from src.main import ENDPOINT_CONCURRENCY, app
+
+test_parquet_file_path = 'tests/resources/small_tweets.parquet'
+
+class FailingExecutor:
+    def submit(self, function, *args):
+        raise RuntimeError("cannot schedule new futures after shutdown")
+
+def test_failed_submit_releases_endpoint_slot(tmp_path, monkeypatch):
+    """
+    Tests that a query whose submission to the thread pool fails gives back its
+    endpoint slot, so the endpoint keeps serving requests afterwards.
+
+    Parameters
+    ----------
+    tmp_path : pathlib.Path
+        Temporary directory, used for a copy of the file that is not cached.
+    monkeypatch : pytest.MonkeyPatch
+        Fixture used to make the submissions fail.
+
+    Returns
+    -------
+    None
+        Test passes if all assertions are successful.
+
+    Raises
+    ------
+    AssertionError
+        If a slot is lost or the endpoint stops answering.
+    """
+    file_path = str(tmp_path / 'tweets.parquet')
+    shutil.copy(test_parquet_file_path, file_path)
+
+    with TestClient(app) as client:
+        executor = src.main.query_executor
+        monkeypatch.setattr(src.main, 'query_executor', FailingExecutor())
+        for _ in range(ENDPOINT_CONCURRENCY['q1_time']):
+            assert client.get('/q1/time', params={'file_path': file_path}).status_code == 500
+        assert src.main.endpoint_limits['q1_time']._value == ENDPOINT_CONCURRENCY['q1_time'], \
+            "Failed submissions must release their slot"
+
+        monkeypatch.setattr(src.main, 'query_executor', executor)
+        assert client.get('/q1/time', params={'file_path': file_path}).status_code == 200
+
+def test_invalid_batch_size_is_rejected():
+    """
+    Tests that a batch size below 1 is rejected as an invalid parameter instead
+    of failing inside the query.
+
+    Returns
+    -------
+    None
+        Test passes if all assertions are successful.
+
+    Raises
+    ------
+    AssertionError
+        If an invalid batch size is not answered with 422.
+    """
+    with TestClient(app) as client:
+        for batch_size in (0, -5):
+            params = {'file_path': test_parquet_file_path, 'batch_size': batch_size}
+            assert client.get('/q2/memory', params=params).status_code == 422
+            assert client.post('/jobs/q2_memory', params=params).status_code == 422
+        assert client.get('/q2/memory', params={'file_path': test_parquet_file_path, 'batch_size': 2}).status_code == 200
+
+def test_timeout_covers_wait_and_query(tmp_path, monkeypatch):
+    """
+    Tests that the request timeout bounds the wait for an endpoint slot and the
+    query together, instead of applying to each of them in full.
+
+    Parameters
+    ----------
+    tmp_path : pathlib.Path
+        Temporary directory, used for copies of the file that are not cached.
+    monkeypatch : pytest.MonkeyPatch
+        Fixture used to replace q1_time with a slow query and shorten the timeout.
+
+    Returns
+    -------
+    None
+        Test passes if all assertions are successful.
+
+    Raises
+    ------
+    AssertionError
+        If a request waits longer than its timeout.
+    """
+    import threading
+
+    def slow_query(file_paths, n=10, start_date=None, end_date=None, usernames=None, profile=None):
+        time.sleep(0.6)
+        return []
+
+    monkeypatch.setattr(src.main, 'q1_time', slow_query)
+    monkeypatch.setattr(src.main, 'REQUEST_TIMEOUT', 1.0)
+    monkeypatch.setitem(src.main.ENDPOINT_CONCURRENCY, 'q1_time', 1)
+
+    paths = []
+    for index in range(2):
+        paths.append(str(tmp_path / f'tweets{index}.parquet'))
+        shutil.copy(test_parquet_file_path, paths[-1])
+
+    with TestClient(app) as client:
+        first = threading.Thread(target=lambda: client.get('/q1/time', params={'file_path': paths[0]}))
+        first.start()
+        time.sleep(0.1)
+        started = time.perf_counter()
+        response = client.get('/q1/time', params={'file_path': paths[1]})
+        elapsed = time.perf_counter() - started
+        first.join()
+
+    assert response.status_code == 504
+    assert elapsed < 1.1, "The wait for the slot must count against the request timeout"
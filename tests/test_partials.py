@@ -0,0 +1,89 @@
+import pytest
+import json
+import pyarrow as pa
+import pyarrow.parquet as pq
+from concurrent.futures import ProcessPoolExecutor
+from src.partials import map_partial, map_reduce, plan_tasks, reduce_partials
+from src.report import report
+from src.utils.aggregation import aggregates_from_dict, aggregates_to_dict
+
+test_parquet_file_path = 'tests/resources/small_tweets.parquet'
+
+@pytest.fixture
+def split_files(tmp_path):
+    table = pq.read_table(test_parquet_file_path)
+    table = pa.concat_tables([table] * 40)
+    whole_path = str(tmp_path / 'whole.parquet')
+    pq.write_table(table, whole_path, row_group_size=16)
+
+    file_paths = []
+    for index, offset in enumerate(range(0, table.num_rows, 70)):
+        file_path = str(tmp_path / f'part-{index}.parquet')
+        pq.write_table(table.slice(offset, 70), file_path, row_group_size=16)
+        file_paths.append(file_path)
+    return whole_path, file_paths
+
+def test_map_reduce_matches_single_file(split_files):
+    """
+    Tests that mapping row group ranges of several files in a process pool and
+    reducing the partial states gives the same answers as a single scan of the
+    concatenated file.
+
+    Parameters
+    ----------
+    split_files : Tuple[str, List[str]]
+        Path to the whole file and paths to its consecutive slices.
+
+    Returns
+    -------
+    None
+        Test passes if all assertions are successful.
+
+    Raises
+    ------
+    AssertionError
+        If the map/reduce answers differ from the single-file report.
+    """
+    whole_path, file_paths = split_files
+
+    tasks = plan_tasks(file_paths, 8)
+    assert [file_path for file_path, _ in tasks] == sorted(
+        [file_path for file_path, _ in tasks], key=file_paths.index), "Tasks must keep file order"
+    assert sum(len(row_groups) for _, row_groups in tasks) == sum(
+        pq.ParquetFile(file_path).num_row_groups for file_path in file_paths), "Every row group must be mapped once"
+
+    with ProcessPoolExecutor(max_workers=2) as executor:
+        results = map_reduce(file_paths, num_tasks=8, executor=executor)
+
+    assert results == report(whole_path), "Map/reduce must match a single scan"
+
+def test_partial_states_are_serializable(split_files):
+    """
+    Tests that partial states survive a JSON round trip and that merging the
+    deserialized states answers a single question as the full scan does.
+
+    Parameters
+    ----------
+    split_files : Tuple[str, List[str]]
+        Path to the whole file and paths to its consecutive slices.
+
+    Returns
+    -------
+    None
+        Test passes if all assertions are successful.
+
+    Raises
+    ------
+    AssertionError
+        If a state changes through serialization or the merged answer differs.
+    """
+    whole_path, file_paths = split_files
+
+    partials = [map_partial(file_path, questions=['q2']) for file_path in file_paths]
+    payloads = [json.dumps(aggregates_to_dict(partial)) for partial in partials]
+    restored = [aggregates_from_dict(json.loads(payload)) for payload in payloads]
+
+    assert [aggregates_to_dict(state) for state in restored] == [aggregates_to_dict(state) for state in partials], \
+        "States must survive a JSON round trip"
+    assert not restored[0].date_counts, "Only the requested questions are aggregated"
+    assert reduce_partials(restored).emoji_counts.most_common(10) == report(whole_path)['q2']
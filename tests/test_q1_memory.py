@@ -63,4 +63,108 @@ def test_q1_memory_empty_file():
         If the function doesn't return an empty list when processing an empty file.
     """
     results = q1_memory(empty_parquet_file_path)
-    assert len(results) == 0, "Empty file should return an empty list"
\ No newline at end of file
+    assert len(results) == 0, "Empty file should return an empty list"
+
+def test_q1_memory_tie_break(tmp_path):
+    """
+    Tests that q1_memory breaks ties between users by username ascending and
+    agrees with q1_time on a file with several tied days and users, and with
+    tweets without a date.
+
+    Parameters
+    ----------
+    tmp_path : pathlib.Path
+        Temporary directory provided by pytest.
+
+    Returns
+    -------
+    None
+        Test passes if all assertions are successful.
+
+    Raises
+    ------
+    AssertionError
+        If the results don't match the expected output or q1_time.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    from src.q1_time import q1_time
+
+    rows = [
+        (datetime.datetime(2021, 2, 20, 8), 'zoe'),
+        (datetime.datetime(2021, 2, 20, 9), 'ana'),
+        (datetime.datetime(2021, 2, 21, 8), 'bob'),
+        (datetime.datetime(2021, 2, 21, 9), 'bob'),
+        (datetime.datetime(2021, 2, 21, 10), 'ana'),
+        (datetime.datetime(2021, 2, 22, 8), 'carl'),
+        (datetime.datetime(2021, 2, 22, 9), 'ana'),
+        (None, 'nil'),
+        (None, 'nil'),
+        (None, 'nil'),
+    ]
+    file_path = str(tmp_path / 'ties.parquet')
+    pq.write_table(pa.table({
+        'date': pa.array([row[0] for row in rows], type=pa.timestamp('ms')),
+        'username': [row[1] for row in rows],
+    }), file_path, row_group_size=2)
+
+    results = q1_memory(file_path)
+
+    expected_results = [
+        (datetime.date(2021, 2, 21), 'bob'),
+        (datetime.date(2021, 2, 20), 'ana'),
+        (datetime.date(2021, 2, 22), 'ana'),
+    ]
+    assert results == expected_results, "Results do not match expected output"
+    assert results == q1_time(file_path), "Results must match q1_time"
+    for n in range(1, 5):
+        assert q1_memory(file_path, n=n) == q1_time(file_path, n=n), "Tweets without a date must count the same"
+
+def test_q1_null_dates_match_across_backends(tmp_path):
+    """
+    Tests that every q1 path skips tweets without a date and returns `n` real
+    days, even when undated tweets outnumber every day.
+
+    Parameters
+    ----------
+    tmp_path : pathlib.Path
+        Temporary directory provided by pytest.
+
+    Returns
+    -------
+    None
+        Test passes if all assertions are successful.
+
+    Raises
+    ------
+    AssertionError
+        If a path counts the undated tweets or returns fewer days.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    from src.aggregate_store import AggregateStore
+    from src.partials import map_reduce
+    from src.q1_time import q1_time
+    from src.report import report
+    from src.utils.data_conversion import SCHEMA
+
+    days = [None] * 5 + [datetime.datetime(2021, 2, 1 + index % 3, index) for index in range(9)]
+    users = ['nil'] * 5 + [f'u{index % 2}' for index in range(9)]
+    file_path = str(tmp_path / 'nulls.parquet')
+    pq.write_table(pa.table({
+        'date': days,
+        'username': users,
+        'content': ['🚜'] * len(days),
+        'mentionedUsers': [[]] * len(days),
+    }, schema=SCHEMA), file_path, row_group_size=4)
+
+    with AggregateStore(str(tmp_path / 'store.duckdb')) as store:
+        store.ingest(file_path)
+        for n in (1, 2, 3):
+            expected = q1_time(file_path, n=n)
+            assert len(expected) == n and None not in [day for day, _ in expected]
+            assert q1_memory(file_path, n=n) == expected
+            assert [row[:2] for row in q1_memory(file_path, n=n, approximate=True)] == expected
+            assert report(file_path, n=n)['q1'] == expected
+            assert map_reduce([file_path], ['q1'], n=n)['q1'] == expected
+            assert store.q1(n) == expected
@@ -1,5 +1,11 @@
 import pytest
-from src.q2_memory import q2_memory
+import datetime
+import threading
+import time
+import pyarrow as pa
+import pyarrow.parquet as pq
+from src.q2_memory import BatchSizer, create_parquet_iterator, prefetch_batches, q2_memory
+from src.utils.data_conversion import SCHEMA
 
 empty_parquet_file_path = "tests/resources/empty_tweets.parquet"
 test_parquet_file_path = 'tests/resources/small_tweets.parquet'
@@ -62,4 +68,119 @@ def test_q2_memory_empty_file():
         If the function doesn't return an empty list when processing an empty file.
     """
     results = q2_memory(empty_parquet_file_path)
-    assert len(results) == 0, "Empty file should return an empty list"
\ No newline at end of file
+    assert len(results) == 0, "Empty file should return an empty list"
+
+def write_tweets(path, content, num_rows, row_group_size):
+    pq.write_table(pa.table({
+        'date': [datetime.datetime(2021, 2, 24)] * num_rows,
+        'username': ['farmer'] * num_rows,
+        'content': [content] * num_rows,
+        'mentionedUsers': [[]] * num_rows,
+    }, schema=SCHEMA), path, row_group_size=row_group_size)
+    return str(path)
+
+def test_q2_memory_adaptive_batches(tmp_path):
+    """
+    Tests that batches are sized by bytes: files of long tweets are read in fewer
+    rows per batch than files of short tweets, no batch is planned above the
+    memory ceiling, and the counts do not depend on the batch sizes.
+
+    Parameters
+    ----------
+    tmp_path : pathlib.Path
+        Temporary directory for the synthetic files.
+
+    Returns
+    -------
+    None
+        Test passes if all assertions are successful.
+
+    Raises
+    ------
+    AssertionError
+        If a batch is sized wrongly or the counts change.
+    """
+    short_path = write_tweets(tmp_path / 'short.parquet', 'Support farmers 🚜', 20_000, 5000)
+    long_path = write_tweets(tmp_path / 'long.parquet', 'Support farmers 🚜 ' + 'x' * 980, 20_000, 5000)
+
+    def batch_rows(path, **kwargs):
+        with create_parquet_iterator(path, **kwargs) as iterator:
+            return [batch.num_rows for batch in iterator]
+
+    short_rows = batch_rows(short_path, target_batch_bytes=100_000, max_batch_bytes=1_000_000)
+    long_rows = batch_rows(long_path, target_batch_bytes=100_000, max_batch_bytes=1_000_000)
+    assert sum(short_rows) == sum(long_rows) == 20_000
+    assert long_rows[0] == short_rows[0] == 1024, "The first batch must probe the size of the rows"
+    assert max(long_rows[10:]) < 150 < 2000 < max(short_rows[5:]), "Batches must hold about 100 KB"
+
+    single_path = write_tweets(tmp_path / 'single.parquet', 'Support farmers 🚜', 300_000, 300_000)
+    single_rows = batch_rows(single_path, target_batch_bytes=1_000_000)
+    assert sum(single_rows) == 300_000
+    assert single_rows[0] == 1024 and min(single_rows[1:-1]) > 10_000, \
+        "Batches must grow after the probe within a single row group"
+
+    capped_rows = batch_rows(long_path, batch_size=5000, max_batch_bytes=1_000_000)
+    assert max(capped_rows[5:]) < 1100, "A fixed batch size must still respect the memory ceiling"
+    assert batch_rows(short_path, batch_size=1000) == [1000] * 20
+
+    expected = [('🚜', 20_000)]
+    assert q2_memory(long_path, target_batch_bytes=100_000, max_batch_bytes=1_000_000) == expected
+    assert q2_memory(long_path, batch_size=700) == expected
+
+    sizer = BatchSizer(target_bytes=1000, max_bytes=4000)
+    assert sizer.plan(10) == 100
+    sizer.observe(pa.record_batch([pa.array(['x' * 38] * 10)], names=['content']), 10)
+    assert sizer.ratio == pytest.approx(sizer.observed_bytes / 100)
+    assert sizer.plan(10) == int(1000 / (10 * sizer.ratio))
+    with pytest.raises(ValueError):
+        BatchSizer(batch_size=0)
+
+def test_q2_memory_prefetch(tmp_path):
+    """
+    Tests that prefetching keeps the order of the batches, bounds the batches
+    read ahead, raises the errors of the reader and stops it when closed.
+
+    Parameters
+    ----------
+    tmp_path : pathlib.Path
+        Temporary directory for the synthetic file.
+
+    Returns
+    -------
+    None
+        Test passes if all assertions are successful.
+
+    Raises
+    ------
+    AssertionError
+        If a batch is lost, reordered or read too far ahead.
+    """
+    produced = []
+
+    def numbers(count):
+        for number in range(count):
+            produced.append(number)
+            yield number
+
+    assert list(prefetch_batches(numbers(100), depth=3)) == list(range(100))
+
+    produced.clear()
+    batches = prefetch_batches(numbers(100), depth=3)
+    assert next(batches) == 0
+    time.sleep(0.2)
+    assert len(produced) <= 5, "At most depth batches must wait, plus the one being read"
+    batches.close()
+    assert not any(thread.name == 'parquet-prefetch' for thread in threading.enumerate())
+
+    def failing():
+        yield 1
+        raise OSError("disk gone")
+
+    with pytest.raises(OSError, match="disk gone"):
+        list(prefetch_batches(failing()))
+
+    path = write_tweets(tmp_path / 'tweets.parquet', 'Support farmers 🚜🌾', 20_000, 1000)
+    for prefetch in (0, 1, 4):
+        assert q2_memory(path, batch_size=300, prefetch=prefetch) == [('🚜', 20_000), ('🌾', 20_000)]
+    with pytest.raises(ValueError):
+        q2_memory(path, prefetch=-1)
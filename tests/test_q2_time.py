@@ -62,4 +62,118 @@ def test_q2_time_empty_file():
         If the function doesn't return an empty list when processing an empty file.
     """
     results = q2_time(empty_parquet_file_path)
-    assert len(results) == 0, "Empty file should return an empty list"
\ No newline at end of file
+    assert len(results) == 0, "Empty file should return an empty list"
+
+def test_q2_time_invalid_file(tmp_path):
+    """
+    Tests that q2_time reports a file that is not valid Parquet as a ValueError.
+
+    Parameters
+    ----------
+    tmp_path : pathlib.Path
+        Temporary directory provided by pytest.
+
+    Returns
+    -------
+    None
+        Test passes if the expected exception is raised.
+
+    Raises
+    ------
+    AssertionError
+        If the invalid file is not reported as a ValueError.
+    """
+    invalid_path = tmp_path / 'tweets.parquet'
+    invalid_path.write_text('not a parquet file')
+    with pytest.raises(ValueError, match="Invalid or corrupted Parquet file"):
+        q2_time(str(invalid_path))
+
+@pytest.mark.parametrize("row_group_size", [1000, 100000])
+def test_q2_time_parallel_matches_q2_memory(tmp_path, monkeypatch, row_group_size):
+    """
+    Tests that q2_time returns the same results as q2_memory when the work is split
+    across processes, both by row group ranges and by slices of the staged Arrow file.
+
+    Parameters
+    ----------
+    tmp_path : pathlib.Path
+        Temporary directory provided by pytest.
+    monkeypatch : pytest.MonkeyPatch
+        Fixture used to lower the minimum number of rows per task.
+    row_group_size : int
+        Number of rows per row group of the generated file.
+
+    Returns
+    -------
+    None
+        Test passes if all assertions are successful.
+
+    Raises
+    ------
+    AssertionError
+        If the parallel results differ from q2_memory.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    import src.q2_time
+    from src.q2_memory import q2_memory
+
+    table = pq.read_table(test_parquet_file_path, columns=['content'])
+    contents = table['content'].to_pylist() * 2000 + [None, '😀 nulls are skipped']
+    file_path = str(tmp_path / 'tweets.parquet')
+    pq.write_table(pa.table({'content': contents}), file_path, row_group_size=row_group_size)
+
+    monkeypatch.setattr(src.q2_time, 'MIN_ROWS_PER_TASK', 1000)
+    results = q2_time(file_path)
+
+    assert results == q2_memory(file_path), "Results must match q2_memory"
+    assert results[0] == ('🤫', 4000), "Results do not match expected output"
+    assert q2_time(file_path, memory_map=True) == results, "Memory-mapped reads must not change the results"
+    assert q2_memory(file_path, memory_map=True) == results
+
+def test_q2_uses_precomputed_emojis_column(tmp_path):
+    """
+    Tests that q2_time and q2_memory answer from the precomputed `emojis` column,
+    with the same counts and first-seen tie order as tokenizing the contents.
+
+    Parameters
+    ----------
+    tmp_path : pathlib.Path
+        Temporary directory provided by pytest.
+
+    Returns
+    -------
+    None
+        Test passes if all assertions are successful.
+
+    Raises
+    ------
+    AssertionError
+        If the results differ from the ones computed from the contents.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    from src.q2_memory import q2_memory
+    from src.utils.data_conversion import EMOJI_SCHEMA, SCHEMA, add_emoji_column
+    from src.utils.emoji_counter import has_emoji_column
+
+    contents = ['😀 🐍 🐍', 'no emojis', None, '🚀😀 🐍🐍', '🇨🇱 👨‍💻 🚀', '🎉 🎉 🇨🇱 👨‍💻'] * 50
+    table = pa.table({
+        'date': pa.array([None] * len(contents), type=pa.timestamp('ms')),
+        'username': ['user'] * len(contents),
+        'content': contents,
+        'mentionedUsers': pa.array([[]] * len(contents), type=pa.list_(pa.string())),
+    }, schema=SCHEMA)
+    plain_path = str(tmp_path / 'plain.parquet')
+    pq.write_table(table, plain_path, row_group_size=64)
+    expected = q2_memory(plain_path)
+
+    batch = add_emoji_column(table.to_batches()[0])
+    precomputed = pa.Table.from_batches([batch]).set_column(2, 'content', pa.nulls(len(contents), pa.string()))
+    precomputed_path = str(tmp_path / 'precomputed.parquet')
+    pq.write_table(precomputed, precomputed_path, row_group_size=64)
+
+    assert precomputed.schema == EMOJI_SCHEMA and has_emoji_column(precomputed_path)
+    assert not has_emoji_column(plain_path)
+    assert q2_time(precomputed_path) == expected, "q2_time must use the emojis column"
+    assert q2_memory(precomputed_path) == expected, "q2_memory must use the emojis column"
@@ -0,0 +1,87 @@
+import pytest
+import datetime
+from src.report import report
+from src.q1_time import q1_time
+from src.q2_time import q2_time
+from src.q3_time import q3_time
+
+empty_parquet_file_path = "tests/resources/empty_tweets.parquet"
+test_parquet_file_path = 'tests/resources/small_tweets.parquet'
+
+def test_report_basic_functionality():
+    """
+    Tests the basic functionality of the report function by verifying that the
+    single-pass results match the expected output of each question.
+
+    Parameters
+    ----------
+    None
+        Uses global test_parquet_file_path for testing.
+
+    Returns
+    -------
+    None
+        Test passes if all assertions are successful.
+
+    Raises
+    ------
+    AssertionError
+        If any of the following conditions fail:
+        - Result is not a dictionary with the 'q1', 'q2' and 'q3' keys
+        - Any of the results don't match the expected output
+    """
+    results = report(test_parquet_file_path)
+
+    assert isinstance(results, dict), "Result must be a dictionary"
+    assert set(results) == {'q1', 'q2', 'q3'}, "Result must contain the three questions"
+
+    assert results['q1'] == [(datetime.date(2021, 2, 24), 'user1'), (datetime.date(2021, 2, 25), 'user5')]
+    assert results['q2'] == [('🤫', 2), ('🤔', 2), ('🚜', 1), ('🌾', 1), ('💪', 1)]
+    assert results['q3'] == [('user2', 1), ('user3', 1), ('user4', 1), ('user5', 1), ('user6', 1)]
+
+def test_report_matches_individual_queries():
+    """
+    Tests that the report function returns the same answers as q1_time, q2_time and q3_time.
+
+    Parameters
+    ----------
+    None
+        Uses global test_parquet_file_path for testing.
+
+    Returns
+    -------
+    None
+        Test passes if all assertions are successful.
+
+    Raises
+    ------
+    AssertionError
+        If any of the single-pass results differs from its standalone query.
+    """
+    results = report(test_parquet_file_path)
+
+    assert results['q1'] == q1_time(test_parquet_file_path)
+    assert results['q2'] == q2_time(test_parquet_file_path)
+    assert results['q3'] == q3_time(test_parquet_file_path)
+
+def test_report_empty_file():
+    """
+    Tests report function behavior when processing an empty Parquet file.
+
+    Parameters
+    ----------
+    None
+        Uses global empty_parquet_file_path for testing.
+
+    Returns
+    -------
+    None
+        Test passes if all assertions are successful.
+
+    Raises
+    ------
+    AssertionError
+        If any of the questions doesn't return an empty list when processing an empty file.
+    """
+    results = report(empty_parquet_file_path)
+    assert results == {'q1': [], 'q2': [], 'q3': []}, "Empty file should return empty lists"
@@ -0,0 +1,99 @@
+import pytest
+from src.utils import duckdb_pool
+from src.utils.resource_profiles import PROFILES, ResourceProfile, resolve_profile
+
+test_parquet_file_path = 'tests/resources/small_tweets.parquet'
+
+def test_resolve_profile():
+    """
+    Tests that profiles are resolved by name or instance, that explicit overrides
+    replace the profile fields, and that unknown names are rejected.
+
+    Parameters
+    ----------
+    None
+
+    Returns
+    -------
+    None
+        Test passes if all assertions are successful.
+
+    Raises
+    ------
+    AssertionError
+        If a profile is resolved incorrectly.
+    """
+    assert resolve_profile(None, 'low-memory') == PROFILES['low-memory']
+    assert resolve_profile('batch', 'low-memory') == PROFILES['batch']
+
+    custom = ResourceProfile(threads=2, memory_limit='64MB')
+    assert resolve_profile(custom, 'latency') is custom
+
+    overridden = resolve_profile(None, 'low-memory', threads=3, memory_limit=None)
+    assert overridden.threads == 3, "Explicit arguments must override the profile"
+    assert overridden.memory_limit == PROFILES['low-memory'].memory_limit, "None must keep the profile value"
+
+    with pytest.raises(ValueError):
+        resolve_profile('unknown', 'latency')
+
+def test_profile_settings_are_applied(tmp_path):
+    """
+    Tests that the settings of a profile configure the DuckDB database the query
+    runs on, including the memory limit and the spill directory.
+
+    Parameters
+    ----------
+    tmp_path : pathlib.Path
+        Temporary directory provided by pytest.
+
+    Returns
+    -------
+    None
+        Test passes if all assertions are successful.
+
+    Raises
+    ------
+    AssertionError
+        If the database settings don't match the profile.
+    """
+    profile = ResourceProfile(threads=1, memory_limit='100MB', temp_directory=str(tmp_path),
+                              enable_object_cache=False, preserve_insertion_order=False)
+
+    with duckdb_pool.connection(**profile.settings()) as con:
+        settings = con.execute("""
+        SELECT current_setting('threads'), current_setting('memory_limit'),
+               current_setting('temp_directory'), current_setting('enable_object_cache'),
+               current_setting('preserve_insertion_order')
+        """).fetchone()
+
+    assert settings[0] == 1 and settings[2] == str(tmp_path)
+    assert settings[1].startswith('95.3') and settings[3] is False and settings[4] is False
+
+@pytest.mark.parametrize("profile", list(PROFILES))
+def test_results_do_not_depend_on_profile(profile):
+    """
+    Tests that every DuckDB-based question returns the same results under every
+    resource profile.
+
+    Parameters
+    ----------
+    profile : str
+        Name of the resource profile.
+
+    Returns
+    -------
+    None
+        Test passes if all assertions are successful.
+
+    Raises
+    ------
+    AssertionError
+        If a result changes with the profile.
+    """
+    from src.q1_memory import q1_memory
+    from src.q1_time import q1_time
+    from src.q3_memory import q3_memory
+    from src.q3_time import q3_time
+
+    for function in (q1_time, q1_memory, q3_time, q3_memory):
+        assert function(test_parquet_file_path, profile=profile) == function(test_parquet_file_path)
@@ -0,0 +1,168 @@
+import pytest
+import asyncio
+import os
+import shutil
+import threading
+from src.utils.result_cache import ResultCache, file_fingerprint
+
+test_parquet_file_path = 'tests/resources/small_tweets.parquet'
+
+def test_result_cache_lru_and_disk_tier(tmp_path):
+    """
+    Tests that the result cache evicts the least recently used entries from memory
+    and serves them again from the on-disk tier.
+
+    Parameters
+    ----------
+    tmp_path : pathlib.Path
+        Temporary directory provided by pytest.
+
+    Returns
+    -------
+    None
+        Test passes if all assertions are successful.
+
+    Raises
+    ------
+    AssertionError
+        If evicted entries are kept in memory or can't be read back from disk.
+    """
+    memory_cache = ResultCache(max_entries=2)
+    memory_cache.put('a', 1)
+    memory_cache.put('b', 2)
+    memory_cache.get('a')
+    memory_cache.put('c', 3)
+
+    assert memory_cache.get('b') is None, "Least recently used entry must be evicted"
+    assert memory_cache.get('a') == 1 and memory_cache.get('c') == 3
+
+    disk_cache = ResultCache(max_entries=1, disk_dir=str(tmp_path / 'cache'))
+    disk_cache.put(('q2_time', 1), [('🤫', 2)])
+    disk_cache.put(('q2_time', 2), [('🤔', 2)])
+
+    assert disk_cache.get(('q2_time', 1)) == [('🤫', 2)], "Evicted entry must be read from disk"
+    assert ResultCache(disk_dir=str(tmp_path / 'cache')).get(('q2_time', 2)) == [('🤔', 2)]
+
+def test_file_fingerprint_changes_with_file(tmp_path):
+    """
+    Tests that the fingerprint of a file changes when the file is rewritten.
+
+    Parameters
+    ----------
+    tmp_path : pathlib.Path
+        Temporary directory provided by pytest.
+
+    Returns
+    -------
+    None
+        Test passes if all assertions are successful.
+
+    Raises
+    ------
+    AssertionError
+        If the fingerprint doesn't include the Parquet footer hash or doesn't change.
+    """
+    file_path = str(tmp_path / 'tweets.parquet')
+    shutil.copy(test_parquet_file_path, file_path)
+    fingerprint = file_fingerprint(file_path)
+
+    assert fingerprint == file_fingerprint(file_path), "Fingerprint must be stable"
+    assert fingerprint[-1] is not None, "Parquet footer must be hashed"
+
+    shutil.copy('tests/resources/empty_tweets.parquet', file_path)
+    os.utime(file_path, ns=(fingerprint[2], fingerprint[2]))
+    assert file_fingerprint(file_path) != fingerprint, "Rewritten file must change its fingerprint"
+
+    with pytest.raises(FileNotFoundError):
+        file_fingerprint(str(tmp_path / 'missing.parquet'))
+
+def test_result_cache_single_flight():
+    """
+    Tests that concurrent requests for the same key share a single computation and
+    that failed computations are not cached.
+
+    Parameters
+    ----------
+    None
+
+    Returns
+    -------
+    None
+        Test passes if all assertions are successful.
+
+    Raises
+    ------
+    AssertionError
+        If the computation runs more than once or a failure is cached.
+    """
+    cache = ResultCache()
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return 42
+
+    async def fail():
+        raise ValueError("boom")
+
+    async def run():
+        results = await asyncio.gather(*(cache.get_or_compute('key', compute) for _ in range(5)))
+        with pytest.raises(ValueError):
+            await cache.get_or_compute('failing', fail)
+        return results
+
+    assert asyncio.run(run()) == [42] * 5
+    assert len(calls) == 1, "Concurrent calls must share one computation"
+    assert cache.get('failing') is None, "Failures must not be cached"
+
+def test_result_cache_disk_tier_off_the_event_loop(tmp_path, monkeypatch):
+    """
+    Tests that `get_or_compute` reads and writes the disk tier in the default
+    executor, and that reading an entry back from disk protects it from the
+    eviction of the least recently used entries.
+
+    Parameters
+    ----------
+    tmp_path : pathlib.Path
+        Temporary directory provided by pytest.
+    monkeypatch : pytest.MonkeyPatch
+        Fixture used to record the threads doing disk I/O.
+
+    Returns
+    -------
+    None
+        Test passes if all assertions are successful.
+
+    Raises
+    ------
+    AssertionError
+        If the disk tier is used from the event loop or evicts the wrong entry.
+    """
+    disk_dir = str(tmp_path / 'cache')
+    cache = ResultCache(max_entries=1, disk_dir=disk_dir, max_disk_entries=2)
+    threads = []
+    for name in ('_read_disk', '_write_disk'):
+        original = getattr(cache, name)
+        monkeypatch.setattr(cache, name, lambda *args, original=original: (
+            threads.append(threading.current_thread()), original(*args))[1])
+
+    async def compute():
+        return 'fresh'
+
+    async def run():
+        assert await cache.get_or_compute('a', compute) == 'fresh'
+        await asyncio.sleep(0.1)
+        return threading.current_thread()
+
+    loop_thread = asyncio.run(run())
+    assert threads and loop_thread not in threads, "Disk I/O must not run on the event loop"
+    assert os.path.exists(cache._disk_path('a')), "The result must be written to disk"
+
+    cache.put('b', 2)
+    for age, key in enumerate(('a', 'b')):
+        os.utime(cache._disk_path(key), (1000 + age, 1000 + age))
+    assert ResultCache(disk_dir=disk_dir).get('a') == 'fresh'
+    cache.put('c', 3)
+    assert os.path.exists(cache._disk_path('a')), "An entry read from disk must be kept"
+    assert not os.path.exists(cache._disk_path('b')), "The least recently used entry must be evicted"
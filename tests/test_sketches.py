@@ -0,0 +1,153 @@
+import pytest
+import random
+from collections import Counter
+from src.utils.sketches import SpaceSaving, capacity_for_error
+
+test_parquet_file_path = 'tests/resources/small_tweets.parquet'
+
+def _skewed_stream(num_items=20000, num_distinct=5000, seed=0):
+    generator = random.Random(seed)
+    weights = [1 / (rank + 1) for rank in range(num_distinct)]
+    return generator.choices([f'user{rank}' for rank in range(num_distinct)], weights=weights, k=num_items)
+
+@pytest.mark.parametrize("weighted", [False, True])
+def test_space_saving_error_bounds(weighted):
+    """
+    Tests that the Space-Saving sketch brackets every true count between
+    count - error and count, that errors stay below total / capacity, and that
+    the heaviest items are all monitored.
+
+    Parameters
+    ----------
+    weighted : bool
+        Whether the stream is fed as per-batch (item, weight) pairs.
+
+    Returns
+    -------
+    None
+        Test passes if all assertions are successful.
+
+    Raises
+    ------
+    AssertionError
+        If any of the guarantees of the sketch is violated.
+    """
+    stream = _skewed_stream()
+    exact = Counter(stream)
+    sketch = SpaceSaving(capacity_for_error(0.005))
+
+    if weighted:
+        for start in range(0, len(stream), 1000):
+            sketch.update_counts(Counter(stream[start:start + 1000]).items())
+    else:
+        for item in stream:
+            sketch.update(item)
+
+    assert sketch.total == len(stream)
+    assert len(sketch.counts) <= sketch.capacity
+    assert sketch.max_error() <= len(stream) / sketch.capacity
+
+    for item, count, error in sketch.top(sketch.capacity):
+        assert count - error <= exact[item] <= count, f"Bounds of {item} must hold"
+    for item, count in exact.items():
+        if count > len(stream) / sketch.capacity:
+            assert item in sketch.counts, f"Heavy hitter {item} must be monitored"
+
+    top = sketch.top(5)
+    assert [item for item, _, _ in top] == [item for item, _ in exact.most_common(5)]
+
+def test_capacity_for_error():
+    """
+    Tests the number of counters derived from the error rate and the rejection of
+    invalid error rates.
+
+    Parameters
+    ----------
+    None
+
+    Returns
+    -------
+    None
+        Test passes if all assertions are successful.
+
+    Raises
+    ------
+    AssertionError
+        If the capacity is wrong or invalid rates are accepted.
+    """
+    assert capacity_for_error(0.01) == 100
+    assert capacity_for_error(1) == 1
+    with pytest.raises(ValueError):
+        capacity_for_error(0)
+
+def test_approximate_mode_matches_exact_without_evictions():
+    """
+    Tests that the approximate mode of q1_memory, q2_memory and q3_memory returns
+    the exact answers, with zero error, when the sketches never evict an item.
+
+    Parameters
+    ----------
+    None
+        Uses global test_parquet_file_path for testing.
+
+    Returns
+    -------
+    None
+        Test passes if all assertions are successful.
+
+    Raises
+    ------
+    AssertionError
+        If an approximate answer differs from the exact one.
+    """
+    from src.q1_memory import q1_memory
+    from src.q2_memory import q2_memory
+    from src.q3_memory import q3_memory
+
+    q1_results = q1_memory(test_parquet_file_path, approximate=True)
+    assert [(tweet_date, username) for tweet_date, username, _, _ in q1_results] == q1_memory(test_parquet_file_path)
+    assert all(error == 0 for *_, error in q1_results)
+
+    q2_results = q2_memory(test_parquet_file_path, approximate=True)
+    assert sorted((emoji, count) for emoji, count, _ in q2_results) == sorted(q2_memory(test_parquet_file_path))
+
+    q3_results = q3_memory(test_parquet_file_path, approximate=True)
+    assert sorted((user, count) for user, count, _ in q3_results) == sorted(q3_memory(test_parquet_file_path))
+    assert all(error == 0 for *_, error in q2_results + q3_results)
+
+def test_q3_memory_approximate_error_bars(tmp_path):
+    """
+    Tests that q3_memory in approximate mode with a small sketch reports error bars
+    that contain the exact mention counts.
+
+    Parameters
+    ----------
+    tmp_path : pathlib.Path
+        Temporary directory provided by pytest.
+
+    Returns
+    -------
+    None
+        Test passes if all assertions are successful.
+
+    Raises
+    ------
+    AssertionError
+        If an exact count falls outside its reported error bar.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    from src.q3_memory import q3_memory
+
+    stream = _skewed_stream(num_items=30000)
+    mentions = [stream[index:index + 3] for index in range(0, len(stream), 3)]
+    file_path = str(tmp_path / 'mentions.parquet')
+    pq.write_table(pa.table({'mentionedUsers': pa.array(mentions, type=pa.list_(pa.string()))}), file_path,
+                   row_group_size=1000)
+
+    exact = Counter(stream)
+    results = q3_memory(file_path, approximate=True, epsilon=0.01)
+    assert len(results) == 10
+    for username, count, error in results:
+        assert count - error <= exact[username] <= count
+        assert error <= len(stream) * 0.01
@@ -0,0 +1,95 @@
+import pytest
+import time
+from src.utils import worker_pool
+
+def test_worker_pool_is_reused():
+    """
+    Tests that the worker pool is created once and shared by every submitted task.
+
+    Parameters
+    ----------
+    None
+
+    Returns
+    -------
+    None
+        Test passes if all assertions are successful.
+
+    Raises
+    ------
+    AssertionError
+        If a new pool is created for each call or tasks don't return their result.
+    """
+    try:
+        pool = worker_pool.start_pool(max_workers=2, max_pending=4)
+
+        assert worker_pool.get_pool() is pool, "The running pool must be reused"
+        assert worker_pool.submit(abs, -3).result() == 3, "Task must return its result"
+        assert worker_pool.get_pool() is pool, "Submitting must not create a new pool"
+    finally:
+        worker_pool.shutdown_pool()
+
+def test_worker_pool_backpressure():
+    """
+    Tests that the worker pool rejects tasks when all of its slots are taken and
+    accepts them again once a slot is released.
+
+    Parameters
+    ----------
+    None
+
+    Returns
+    -------
+    None
+        Test passes if all assertions are successful.
+
+    Raises
+    ------
+    AssertionError
+        If a task is accepted while the pool is saturated.
+    """
+    try:
+        worker_pool.start_pool(max_workers=1, max_pending=1)
+        running = worker_pool.submit(time.sleep, 0.5)
+
+        with pytest.raises(worker_pool.PoolSaturatedError):
+            worker_pool.submit(abs, -1, timeout=0)
+
+        running.result()
+        assert worker_pool.submit(abs, -1, timeout=5).result() == 1
+    finally:
+        worker_pool.shutdown_pool()
+
+def count_databases() -> int:
+    from src.utils import duckdb_pool
+    return len(duckdb_pool._databases)
+
+def test_workers_do_not_inherit_the_api_process():
+    """
+    Tests that workers start from a clean interpreter rather than a fork of the
+    calling process, so they do not inherit its open DuckDB databases or locks.
+
+    Parameters
+    ----------
+    None
+
+    Returns
+    -------
+    None
+        Test passes if all assertions are successful.
+
+    Raises
+    ------
+    AssertionError
+        If a worker sees the DuckDB databases of the calling process.
+    """
+    from src.utils import duckdb_pool
+
+    duckdb_pool.get_database()
+    try:
+        pool = worker_pool.start_pool(max_workers=1, max_pending=2)
+        assert pool._mp_context.get_start_method() != 'fork'
+        assert count_databases() > 0
+        assert worker_pool.submit(count_databases).result() == 0, "Workers must not inherit DuckDB state"
+    finally:
+        worker_pool.shutdown_pool()